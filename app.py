@@ -1,76 +1,148 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, request, redirect, url_for, jsonify, Response, make_response, g
 from src.adaptador import evaluar_y_asignar
-from src.logger import registrar_evento
-from src.config import obtener_estado_adaptacion, establecer_estado_adaptacion
+from src.logger import registrar_eventos, finalizar_venta
+from src.estado_sesion import obtener_estado_terminal, contar_sesiones_terminal
+from src import notificador
+from src.cache_paginas import CachePaginas
+from src.cola_eventos import ColaEventos
+from src.terminales import terminal_de_peticion, normalizar_terminal, listar_terminales, COOKIE_TERMINAL
+from src.config import obtener_estado_adaptacion, establecer_estado_adaptacion, version_config, obtener_tiempo_max_evaluacion, obtener_server_timing
+from src.diario_eventos import numero, varianza_duracion
+from src.registro import obtener_registro, configurar_registro, banner
+from src import metricas, calentamiento
+from src.metricas import PETICIONES, LATENCIA_PETICIONES, TRANSICIONES, Medidor, tramo
+from concurrent.futures import TimeoutError as TiempoAgotado
 import os
-import pandas as pd
+import secrets
+import time
 
 app = Flask(__name__, template_folder='ui')
+# Las páginas se renderizan rara vez (caché de páginas): que Jinja recompile si la plantilla cambió
+app.config["TEMPLATES_AUTO_RELOAD"] = True
+paginas = CachePaginas(app)
 
-interfaz_actual = "novato"
+# Registro en cola (src/registro.py): el formato y la escritura no ocurren en el hilo de la petición
+configurar_registro()
+registro = obtener_registro("app")
+
+# Máximo de filas aceptadas por /api/clasificar-lote en una sola petición
+MAX_FILAS_LOTE = 50000
+
+# Máximo de eventos aceptados por /api/eventos en una sola petición
+MAX_EVENTOS_LOTE = 500
+
+# Las versiones de estado empiezan de cero en cada proceso: el ETag lleva un
+# identificador del proceso (arranque, pid y un valor aleatorio) para que un
+# worker nunca valide el ETag de otro
+def _nuevo_arranque():
+    global _ARRANQUE
+    _ARRANQUE = f"{int(time.time() * 1000):x}.{os.getpid():x}.{secrets.token_hex(4)}"
+
+_nuevo_arranque()
+# Con gunicorn --preload los workers se bifurcan del maestro después de importar app
+os.register_at_fork(after_in_child=_nuevo_arranque)
+
+def etiqueta_version(*partes):
+    """ETag a partir de las versiones en memoria (sin leer ni serializar el estado)"""
+    return "-".join([_ARRANQUE] + [str(p) for p in partes])
+
+def con_validacion(etag, generar):
+    """304 si el cliente ya tiene esta versión (If-None-Match); si no, genera la respuesta con su ETag"""
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag)
+        return respuesta
+    respuesta = make_response(generar())
+    if respuesta.status_code == 200:
+        respuesta.set_etag(etag)
+        respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_peticion = time.perf_counter()
+    # Modo Server-Timing: juntar los tramos de esta petición (src/metricas.py)
+    if obtener_server_timing():
+        g.tramos = metricas.iniciar_tramos()
+
+@app.after_request
+def medir_peticion(respuesta):
+    """Cuenta la petición y su latencia por ruta (la regla, no la URL: /static/<path:filename>)"""
+    inicio = g.pop("inicio_peticion", None)
+    if inicio is not None:
+        duracion = time.perf_counter() - inicio
+        ruta = request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+        LATENCIA_PETICIONES.observar(duracion, ruta, request.method)
+        PETICIONES.incrementar(ruta, request.method, str(respuesta.status_code))
+        tramos = g.pop("tramos", None)
+        if tramos is not None:
+            respuesta.headers["Server-Timing"] = metricas.cabecera_server_timing(tramos, duracion)
+    return respuesta
+
+@app.teardown_request
+def terminar_tramos(_error=None):
+    # El hilo puede atender otra petición: no arrastrar los tramos de esta
+    metricas.terminar_tramos()
+
+@app.after_request
+def recordar_terminal(respuesta):
+    """Con ?terminal=<id> en la URL la caja queda identificada por cookie en las siguientes peticiones"""
+    terminal = request.args.get("terminal")
+    if terminal:
+        terminal = normalizar_terminal(terminal)
+        if terminal != request.cookies.get(COOKIE_TERMINAL):
+            respuesta.set_cookie(COOKIE_TERMINAL, terminal, max_age=365 * 24 * 3600, samesite="Lax")
+    return respuesta
 
 @app.route("/")
 def home():
     """Página inicial - detecta nivel y redirige"""
-    global interfaz_actual
+    terminal = terminal_de_peticion(request)
+    # Estado de sesión de la terminal en memoria (se carga de disco solo la primera vez)
+    estado_sesion = _estado_al_dia(terminal).cargar()
     
     # 🔥 VERIFICAR ESTADO DE ADAPTACIÓN
     adaptacion_activa = obtener_estado_adaptacion()
     
     if not adaptacion_activa:
-        print(f"\n{'='*60}")
-        print(f"🔒 ADAPTACIÓN DESACTIVADA - Mostrando interfaz original")
-        print(f"{'='*60}")
-        interfaz_actual = "original"
+        banner(registro, "🔒 ADAPTACIÓN DESACTIVADA - Mostrando interfaz original")
+        estado_sesion.interfaz = "original"
         return redirect(url_for("original"))
     
-    archivo = "data/dataset_pos.csv"
-    
     # Verificar si es la primera vez (sin datos)
-    if not os.path.exists(archivo):
-        print(f"\n{'='*60}")
-        print(f"🆕 PRIMERA VEZ - Mostrando interfaz original")
-        print(f"{'='*60}")
+    if not estado_sesion.existe:
+        banner(registro, "🆕 PRIMERA VEZ - Mostrando interfaz original")
         return redirect(url_for("original"))
     
-    df = pd.read_csv(archivo)
-    
     # Verificar si hay datos reales (no solo encabezado)
-    if df.empty or len(df) == 0:
-        print(f"\n{'='*60}")
-        print(f"🆕 SIN DATOS - Mostrando interfaz original")
-        print(f"{'='*60}")
+    if estado_sesion.actual is None:
+        banner(registro, "🆕 SIN DATOS - Mostrando interfaz original")
         return redirect(url_for("original"))
     
-    # 🔥 CAMBIO AQUÍ: Leer TODAS las filas para encontrar la última con eventos
-    filas_con_eventos = df[(df['ErroresSesion'] > 0) | (df['TareasCompletadas'] > 0)]
-    
-    if filas_con_eventos.empty:
+    # 🔥 ¿Alguna sesión con eventos? (mantenido en memoria por registrar_evento)
+    if not estado_sesion.hay_eventos:
         # NO hay ninguna sesión con eventos - usuario nuevo
-        print(f"\n{'='*60}")
-        print(f"🆕 SIN EVENTOS - Mostrando interfaz original")
-        print(f"{'='*60}")
+        banner(registro, "🆕 SIN EVENTOS - Mostrando interfaz original")
         return redirect(url_for("original"))
     
     # Hay sesiones completadas - evaluar y redirigir a la interfaz correcta
-    print(f"\n{'='*60}")
-    print(f"🚀 HAY DATOS - Evaluando nivel...")
-    print(f"{'='*60}")
+    banner(registro, "🚀 HAY DATOS - Evaluando nivel...")
     
-    interfaz, nivel = evaluar_y_asignar()
+    with tramo("evaluacion"):
+        interfaz, nivel = evaluar_y_asignar(terminal=terminal)
     
     # Determinar ruta según nivel
     if nivel < 40:
-        interfaz_actual = "novato"
-        print(f"[REDIRIGIENDO] → /novato (nivel: {nivel:.2f})")
+        estado_sesion.interfaz = "novato"
+        registro.debug("[REDIRIGIENDO] → /novato (nivel: %.2f)", nivel)
         return redirect(url_for("novato"))
     elif 40 <= nivel < 70:
-        interfaz_actual = "intermedio"
-        print(f"[REDIRIGIENDO] → /intermedio (nivel: {nivel:.2f})")
+        estado_sesion.interfaz = "intermedio"
+        registro.debug("[REDIRIGIENDO] → /intermedio (nivel: %.2f)", nivel)
         return redirect(url_for("intermedio"))
     else:
-        interfaz_actual = "experto"
-        print(f"[REDIRIGIENDO] → /experto (nivel: {nivel:.2f})")
+        estado_sesion.interfaz = "experto"
+        registro.debug("[REDIRIGIENDO] → /experto (nivel: %.2f)", nivel)
         return redirect(url_for("experto"))
 
 @app.route("/evento", methods=["POST"])
@@ -81,106 +153,272 @@ def evento():
     # Redirigir a la API moderna
     return redirect(url_for("evento_api"))
 
-@app.route("/api/evento", methods=["POST"])
-def evento_api():
-    """Endpoint API para registrar eventos (AJAX)
-    Solo evalúa y cambia de interfaz cuando se completa una venta (compra_finalizada)
+def _respuesta_evento(terminal, estado_sesion, es_compra_finalizada, sesion_id, adaptacion_activa, evaluacion=None):
+    """Arma la respuesta de /api/evento y /api/eventos con la evaluación de la venta completada (si la hubo)
+
+    La venta ya se evaluó en finalizar_venta() (src/logger.py) cuando la adaptación está activa.
     """
-    global interfaz_actual
+    # SOLO evaluar y clasificar si se completó una venta Y la adaptación está activa
+    cambio = False
+    nueva_interfaz = estado_sesion.interfaz  # Valor por defecto
+    nivel = 0
     
-    try:
-        data = request.json
-        tipo_evento = data.get("tipo_evento", "accion_generica")
-        duracion = float(data.get("duracion", 0))
-        exito = data.get("exito", True)
-        tiempo_activo = data.get("tiempo_activo", None)
-
-        # Registrar el evento
-        resultado = registrar_evento(tipo_evento, duracion, exito, tiempo_activo)
-        es_compra_finalizada = resultado[0]
-        sesion_id = resultado[1]
-        datos_sesion_completada = resultado[2] if len(resultado) > 2 else None
-        
-        # 🔥 VERIFICAR ESTADO DE ADAPTACIÓN
-        adaptacion_activa = obtener_estado_adaptacion()
-        
-        # SOLO evaluar y clasificar si se completó una venta Y la adaptación está activa
-        cambio = False
-        nueva_interfaz = interfaz_actual  # Valor por defecto
-        nivel = 0
-        
-        if es_compra_finalizada:
-            if adaptacion_activa:
-                print(f"\n{'='*60}")
-                print(f"💰 VENTA COMPLETADA - Evaluando clasificación...")
-                print(f"   Sesión completada: {sesion_id}")
-                print(f"{'='*60}")
-                
-                # 🔥 GUARDAR INTERFAZ ANTERIOR ANTES DE EVALUAR
-                interfaz_anterior = interfaz_actual
-                
-                # Evaluar y clasificar usando lógica difusa
-                interfaz, nivel = evaluar_y_asignar()
-                
-                # 🔥 DETERMINAR NUEVA INTERFAZ BASADA EN EL NIVEL (SIN USAR interfaz_actual)
-                if nivel < 40:
-                    nueva_interfaz = "novato"
-                elif 40 <= nivel < 70:
-                    nueva_interfaz = "intermedio"
-                else:
-                    nueva_interfaz = "experto"
-                
-                # 🔥 ACTUALIZAR interfaz_actual INMEDIATAMENTE
-                interfaz_actual = nueva_interfaz
-                
-                # Verificar si hubo cambio
-                cambio = nueva_interfaz != interfaz_anterior
-                
-                if cambio:
-                    print(f"\n🔄 [CAMBIO DE INTERFAZ]")
-                    print(f"   {interfaz_anterior.upper()} → {nueva_interfaz.upper()}")
-                    print(f"   Nivel: {nivel:.2f}")
-                else:
-                    print(f"   ℹ️  Interfaz: {nueva_interfaz.upper()}")
-                    print(f"   Nivel: {nivel:.2f}")
-
-                print(f"{'='*60}\n")
+    if es_compra_finalizada:
+        if adaptacion_activa:
+            banner(registro, "💰 VENTA COMPLETADA - Evaluando clasificación...",
+                   f"   Sesión completada: {sesion_id} (terminal: {terminal})")
+            
+            # 🔥 GUARDAR INTERFAZ ANTERIOR ANTES DE EVALUAR
+            interfaz_anterior = estado_sesion.interfaz
+            
+            # Clasificación con lógica difusa hecha al finalizar la venta
+            interfaz, nivel = evaluacion
+            
+            # 🔥 DETERMINAR NUEVA INTERFAZ BASADA EN EL NIVEL (SIN USAR LA INTERFAZ ANTERIOR)
+            if nivel < 40:
+                nueva_interfaz = "novato"
+            elif 40 <= nivel < 70:
+                nueva_interfaz = "intermedio"
+            else:
+                nueva_interfaz = "experto"
+            
+            # 🔥 ACTUALIZAR LA INTERFAZ DE LA TERMINAL INMEDIATAMENTE
+            estado_sesion.interfaz = nueva_interfaz
+            
+            # Verificar si hubo cambio
+            cambio = nueva_interfaz != interfaz_anterior
+            TRANSICIONES.incrementar(interfaz_anterior, nueva_interfaz)
+            
+            if cambio:
+                banner(registro, "🔄 [CAMBIO DE INTERFAZ]",
+                       f"   {interfaz_anterior.upper()} → {nueva_interfaz.upper()}",
+                       f"   Nivel: {nivel:.2f}")
             else:
-                # Adaptación desactivada - siempre redirigir a original
-                print(f"\n{'='*60}")
-                print(f"💰 VENTA COMPLETADA - Adaptación desactivada")
-                print(f"   Redirigiendo a interfaz original")
-                print(f"{'='*60}\n")
-                nueva_interfaz = "original"
-                interfaz_actual = "original"
+                banner(registro, f"   ℹ️  Interfaz: {nueva_interfaz.upper()}", f"   Nivel: {nivel:.2f}")
+
+            registro.info("Venta evaluada", extra={"campos": {
+                "terminal": terminal, "sesion": sesion_id, "nivel": round(nivel, 2),
+                "interfaz": nueva_interfaz, "cambio": cambio,
+            }})
+        else:
+            # Adaptación desactivada - siempre redirigir a original
+            banner(registro, "💰 VENTA COMPLETADA - Adaptación desactivada",
+                   "   Redirigiendo a interfaz original")
+            registro.info("Venta completada sin adaptación", extra={"campos": {
+                "terminal": terminal, "sesion": sesion_id,
+            }})
+            nueva_interfaz = "original"
+            TRANSICIONES.incrementar(estado_sesion.interfaz, nueva_interfaz)
+            estado_sesion.interfaz = "original"
+    
+    respuesta = {
+        "status": "ok",
+        "nivel": round(nivel, 2) if (es_compra_finalizada and adaptacion_activa) else None,
+        "interfaz": nueva_interfaz,
+        "cambio_interfaz": cambio,
+        "sesion_id": sesion_id,
+        "adaptacion_activa": adaptacion_activa,
+        "mensaje": f"Evento registrado. {'Evaluación completada.' if (es_compra_finalizada and adaptacion_activa) else 'Esperando finalizar venta.' if not es_compra_finalizada else 'Adaptación desactivada - interfaz original.'}"
+    }
+    
+    # 🔥 SIEMPRE redirigir cuando se completa una venta
+    if es_compra_finalizada:
+        respuesta["redirigir"] = True
+        respuesta["url_redireccion"] = f"/{nueva_interfaz}"
+        registro.debug("[REDIRECCIÓN] → /%s", nueva_interfaz)
         
-        respuesta = {
-            "status": "ok",
-            "nivel": round(nivel, 2) if (es_compra_finalizada and adaptacion_activa) else None,
+        # Avisar a las demás páginas abiertas de la terminal (/api/stream)
+        notificador.publicar(terminal, "nivel", {
+            "nivel": respuesta["nivel"],
             "interfaz": nueva_interfaz,
             "cambio_interfaz": cambio,
             "sesion_id": sesion_id,
-            "adaptacion_activa": adaptacion_activa,
-            "mensaje": f"Evento registrado. {'Evaluación completada.' if (es_compra_finalizada and adaptacion_activa) else 'Esperando finalizar venta.' if not es_compra_finalizada else 'Adaptación desactivada - interfaz original.'}"
+        })
+    
+    return respuesta
+
+def _procesar_eventos(terminal, lote):
+    """Aplica un lote ordenado de eventos de la terminal (en un hilo de la cola de eventos)
+
+    El lote se corta después de cada venta: cada venta es una unidad de trabajo
+    (finalizar_venta: eventos, clasificación, nivel y sesión nueva en una sola
+    escritura). La respuesta es la del último evento, o la de la última venta.
+    """
+    estado_sesion = obtener_estado_terminal(terminal)
+    # Configuración leída una vez por lote
+    adaptacion_activa = obtener_estado_adaptacion()
+    respuesta = None
+    inicio = 0
+    for i, evento in enumerate(lote):
+        evaluacion = None
+        if evento["tipo_evento"] == "compra_finalizada":
+            resultados, evaluacion = finalizar_venta(lote[inicio:i + 1], terminal, adaptacion_activa)
+        elif i == len(lote) - 1:
+            with tramo("registro_eventos"):
+                resultados = registrar_eventos(lote[inicio:i + 1], terminal=terminal)
+        else:
+            continue
+        es_compra_finalizada, sesion_id, _ = resultados[-1]
+        if es_compra_finalizada or respuesta is None or not respuesta.get("redirigir"):
+            respuesta = _respuesta_evento(terminal, estado_sesion, es_compra_finalizada, sesion_id,
+                                          adaptacion_activa, evaluacion)
+        inicio = i + 1
+    respuesta["procesados"] = len(lote)
+    return respuesta
+
+cola_eventos = ColaEventos(_procesar_eventos)
+
+def _sesiones_almacenadas():
+    """Sesiones en el historial de cada terminal (al leer /metrics; contadas en memoria)"""
+    valores = {}
+    for terminal in listar_terminales():
+        sesiones = contar_sesiones_terminal(terminal)
+        if sesiones is not None:
+            valores[terminal] = sesiones
+    return valores
+
+Medidor("pos_sesiones_almacenadas", "Sesiones en el historial de cada terminal", _sesiones_almacenadas, ("terminal",))
+Medidor("pos_cola_profundidad", "Lotes de eventos esperando en la cola", cola_eventos.profundidad)
+Medidor("pos_listo", "1 cuando el proceso terminó el calentamiento", lambda: int(calentamiento.esta_listo()))
+
+def _estado_al_dia(terminal):
+    """Estado de la terminal después de procesar sus eventos ya encolados (lee sus propias escrituras)"""
+    with tramo("espera_cola"):
+        cola_eventos.esperar_terminal(terminal, obtener_tiempo_max_evaluacion())
+    # cargar(): en modo multiproceso recarga si otro proceso escribió
+    return obtener_estado_terminal(terminal).cargar()
+
+def _encolar_eventos(terminal, lote):
+    """Encola el lote; solo espera la respuesta si contiene una venta completada"""
+    estado_sesion = obtener_estado_terminal(terminal)
+    if not any(evento["tipo_evento"] == "compra_finalizada" for evento in lote):
+        cola_eventos.encolar(terminal, lote)
+        actual = estado_sesion.actual
+        return {
+            "status": "ok",
+            "nivel": None,
+            "interfaz": estado_sesion.interfaz,
+            "cambio_interfaz": False,
+            "sesion_id": actual.get("SesionID") if actual else None,
+            "adaptacion_activa": obtener_estado_adaptacion(),
+            "mensaje": "Evento registrado. Esperando finalizar venta.",
+            "encolado": True,
+            "procesados": len(lote),
         }
-        
-        # 🔥 SIEMPRE redirigir cuando se completa una venta
-        if es_compra_finalizada:
-            respuesta["redirigir"] = True
-            respuesta["url_redireccion"] = f"/{nueva_interfaz}"
-            print(f"[REDIRECCIÓN] → /{nueva_interfaz}")
-        
+    
+    futuro = cola_eventos.encolar(terminal, lote, esperar=True, tramos=g.get("tramos"))
+    try:
+        return futuro.result(timeout=obtener_tiempo_max_evaluacion())
+    except TiempoAgotado:
+        # La cola va atrasada: la venta se evaluará igual y el nivel llegará por /api/stream
+        cola_eventos.respaldos += 1
+        # Hasta que la página reciba la interfaz asignada, abrir la anterior no la pisa
+        estado_sesion.evaluacion_pendiente = True
+        registro.warning("Evaluación pendiente: la cola de eventos va atrasada", extra={"campos": {
+            "terminal": terminal, "profundidad": cola_eventos.profundidad(),
+        }})
+        return {
+            "status": "ok",
+            "nivel": None,
+            "interfaz": estado_sesion.interfaz,
+            "cambio_interfaz": False,
+            "sesion_id": None,
+            "adaptacion_activa": obtener_estado_adaptacion(),
+            "mensaje": "Evento registrado. Evaluación en curso.",
+            "encolado": True,
+            "evaluacion_pendiente": True,
+            "procesados": len(lote),
+        }
+
+@app.route("/api/evento", methods=["POST"])
+def evento_api():
+    """Endpoint API para registrar eventos (AJAX)
+    Los eventos se encolan y se responde de inmediato; solo compra_finalizada espera
+    la evaluación (hasta tiempo_max_evaluacion_s) y el posible cambio de interfaz.
+    Cada terminal (cabecera X-Terminal-ID o cookie terminal_id) tiene su propia sesión e interfaz
+    """
+    terminal = terminal_de_peticion(request)
+    
+    try:
+        data = request.json
+        lote = [{
+            "tipo_evento": data.get("tipo_evento", "accion_generica"),
+            "duracion": float(data.get("duracion", 0)),
+            "exito": data.get("exito", True),
+            "tiempo_activo": data.get("tiempo_activo", None),
+        }]
+        respuesta = _encolar_eventos(terminal, lote)
+        respuesta.pop("procesados", None)
         return jsonify(respuesta)
         
     except Exception as e:
-        print(f"❌ Error en evento_api: {e}")
-        import traceback
-        traceback.print_exc()
+        registro.exception("Error en evento_api: %s", e)
         return jsonify({
             "status": "error",
             "mensaje": f"Error al procesar evento: {str(e)}"
         }), 500
 
+@app.route("/api/eventos", methods=["POST"])
+def eventos_api():
+    """Registra un lote ordenado de eventos del POSTracker en una sola escritura
+
+    Cuerpo: {"eventos": [{"tipo_evento", "duracion", "exito", "tiempo_activo"}, ...]}
+    (o directamente la lista). También lo envía navigator.sendBeacon al salir de la
+    página, por eso se acepta sin Content-Type JSON. La respuesta es la de /api/evento
+    para el último evento (con la evaluación si el lote contiene compra_finalizada)
+    más "procesados".
+    """
+    terminal = terminal_de_peticion(request)
+    
+    data = request.get_json(force=True, silent=True)
+    eventos = data.get("eventos") if isinstance(data, dict) else data
+    if not isinstance(eventos, list) or not eventos:
+        return jsonify({"status": "error", "mensaje": "Se esperaba una lista de eventos"}), 400
+    if len(eventos) > MAX_EVENTOS_LOTE:
+        return jsonify({
+            "status": "error",
+            "mensaje": f"Máximo {MAX_EVENTOS_LOTE} eventos por lote"
+        }), 413
+    
+    try:
+        lote = [{
+            "tipo_evento": str(evento.get("tipo_evento", "accion_generica")),
+            "duracion": float(evento.get("duracion", 0)),
+            "exito": bool(evento.get("exito", True)),
+            "tiempo_activo": None if evento.get("tiempo_activo") is None else float(evento["tiempo_activo"]),
+        } for evento in eventos]
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "mensaje": f"Evento mal formado: {e}"}), 400
+    
+    try:
+        return jsonify(_encolar_eventos(terminal, lote))
+        
+    except Exception as e:
+        registro.exception("Error en eventos_api: %s", e)
+        return jsonify({
+            "status": "error",
+            "mensaje": f"Error al procesar eventos: {str(e)}"
+        }), 500
+
+@app.route("/api/cola", methods=["GET"])
+def api_cola():
+    """Profundidad y latencias de la cola de eventos"""
+    return jsonify({"status": "ok", **cola_eventos.metricas()})
+
+@app.route("/metrics", methods=["GET"])
+def api_metricas():
+    """Métricas en formato de texto de Prometheus (src/metricas.py)"""
+    return Response(metricas.exponer(), content_type=metricas.TIPO_CONTENIDO)
+
+@app.route("/healthz/ready", methods=["GET"])
+def listo():
+    """200 cuando el proceso terminó el calentamiento (src/calentamiento.py); 503 mientras tanto"""
+    if not calentamiento.esta_listo():
+        # Si nada lo inició (p. ej. servido sin gunicorn.conf.py), lo inicia la primera consulta
+        calentamiento.iniciar(app)
+        return jsonify({"status": "calentando", **calentamiento.resumen()}), 503
+    return jsonify({"status": "ok", **calentamiento.resumen()})
+
 @app.route("/api/toggle-adaptacion", methods=["POST"])
 def toggle_adaptacion():
     """Activa o desactiva la adaptación del sistema"""
@@ -193,10 +431,11 @@ def toggle_adaptacion():
         
         mensaje = "Adaptación activada" if nuevo_estado else "Adaptación desactivada"
         
-        print(f"\n{'='*60}")
-        print(f"🔧 TOGGLE ADAPTACIÓN: {estado_anterior} → {nuevo_estado}")
-        print(f"   {mensaje}")
-        print(f"{'='*60}\n")
+        # Efecto inmediato en todas las terminales conectadas
+        notificador.publicar_todos("adaptacion", {"adaptacion_activa": nuevo_estado})
+        
+        banner(registro, f"🔧 TOGGLE ADAPTACIÓN: {estado_anterior} → {nuevo_estado}", f"   {mensaje}")
+        registro.info(mensaje, extra={"campos": {"anterior": estado_anterior, "adaptacion_activa": nuevo_estado}})
         
         return jsonify({
             "status": "ok",
@@ -204,7 +443,7 @@ def toggle_adaptacion():
             "mensaje": mensaje
         })
     except Exception as e:
-        print(f"❌ Error en toggle_adaptacion: {e}")
+        registro.error("Error en toggle_adaptacion: %s", e)
         return jsonify({
             "status": "error",
             "mensaje": f"Error al cambiar estado: {str(e)}"
@@ -212,7 +451,10 @@ def toggle_adaptacion():
 
 @app.route("/api/estado-adaptacion", methods=["GET"])
 def api_obtener_estado_adaptacion():
-    """Obtiene el estado actual de la adaptación"""
+    """Obtiene el estado actual de la adaptación (con ETag)"""
+    return con_validacion(etiqueta_version("config", version_config()), _estado_adaptacion)
+
+def _estado_adaptacion():
     try:
         estado = obtener_estado_adaptacion()
         return jsonify({
@@ -228,11 +470,23 @@ def api_obtener_estado_adaptacion():
 
 @app.route("/api/estado", methods=["GET"])
 def obtener_estado():
-    """Obtiene el estado actual del sistema"""
-    archivo = "data/dataset_pos.csv"
+    """Obtiene el estado actual del sistema (de la terminal que consulta)
     
+    El ETag es la versión del estado de la terminal y de la configuración: con
+    If-None-Match vigente se responde 304 sin leer el estado ni generar JSON.
+    """
+    terminal = terminal_de_peticion(request)
+    estado_sesion = _estado_al_dia(terminal)
+    etag = etiqueta_version(terminal, estado_sesion.version, version_config())
+    def generar():
+        with tramo("estado_json"):
+            return _estado_terminal(terminal, estado_sesion)
+    return con_validacion(etag, generar)
+
+def _estado_terminal(terminal, estado_sesion):
     try:
-        if not os.path.exists(archivo):
+        estado_sesion.cargar()
+        if not estado_sesion.existe:
             return jsonify({
                 "eventos": 0,
                 "tiempo_promedio": 0,
@@ -242,8 +496,8 @@ def obtener_estado():
                 "interfaz": "original"
             })
         
-        df = pd.read_csv(archivo)
-        if df.empty or len(df) == 0:
+        filas = estado_sesion.ultimas_filas()
+        if len(filas) == 0:
             return jsonify({
                 "eventos": 0,
                 "tiempo_promedio": 0,
@@ -254,7 +508,7 @@ def obtener_estado():
             })
         
         # Verificar si hay datos válidos - leer la ÚLTIMA fila (sesión actual)
-        ultima_fila = df.iloc[-1]
+        ultima_fila = filas[-1]
         sesion_id = str(ultima_fila.get('SesionID', '')).strip()
         if not sesion_id or sesion_id == '' or sesion_id.lower() == 'nan':
             return jsonify({
@@ -267,9 +521,9 @@ def obtener_estado():
             })
         
         # Leer métricas de la última fila (sesión actual)
-        tiempo_prom = pd.to_numeric(ultima_fila.get('TiempoPromedioAccion(s)', 0), errors='coerce') or 0
-        errores = pd.to_numeric(ultima_fila.get('ErroresSesion', 0), errors='coerce') or 0
-        tareas = pd.to_numeric(ultima_fila.get('TareasCompletadas', 0), errors='coerce') or 0
+        tiempo_prom = numero(ultima_fila.get('TiempoPromedioAccion(s)', 0))
+        errores = numero(ultima_fila.get('ErroresSesion', 0))
+        tareas = numero(ultima_fila.get('TareasCompletadas', 0))
         nivel_texto = str(ultima_fila.get('NivelClasificado', 'Novato')) if 'NivelClasificado' in ultima_fila else "Novato"
         
         eventos_totales = int(errores) + int(tareas)
@@ -301,15 +555,17 @@ def obtener_estado():
         return jsonify({
             "eventos": eventos_totales,
             "tiempo_promedio": float(tiempo_prom),
+            "varianza_duracion": round(varianza_duracion(ultima_fila), 4),
             "errores": int(errores),
             "tareas": int(tareas),
             "nivel": nivel_texto,
             "interfaz": interfaz_actual,
-            "adaptacion_activa": adaptacion_activa
+            "adaptacion_activa": adaptacion_activa,
+            "terminal": terminal
         })
         
     except Exception as e:
-        print(f"❌ Error en obtener_estado: {e}")
+        registro.error("Error en obtener_estado: %s", e)
         return jsonify({
             "eventos": 0,
             "tiempo_promedio": 0,
@@ -320,68 +576,167 @@ def obtener_estado():
             "error": str(e)
         }), 500
 
+@app.route("/api/stream", methods=["GET"])
+def stream():
+    """Flujo Server-Sent Events con los cambios de nivel, interfaz y adaptación de la terminal"""
+    terminal = terminal_de_peticion(request)
+    estado_sesion = _estado_al_dia(terminal).cargar()
+    def estado_inicial():
+        # Sin ventas en la cola, este estado ya trae la interfaz asignada a la última
+        if not cola_eventos.pendientes(terminal):
+            estado_sesion.evaluacion_pendiente = False
+        filas = estado_sesion.ultimas_filas()
+        return {
+            "terminal": terminal,
+            "interfaz": estado_sesion.interfaz,
+            "nivel": filas[-1].get("NivelClasificado", "") if filas else "",
+            "adaptacion_activa": obtener_estado_adaptacion(),
+        }
+    return Response(
+        notificador.flujo(terminal, estado_inicial),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/api/clasificar-lote", methods=["POST"])
+def clasificar_lote_api():
+    """Clasifica muchas sesiones en una sola pasada vectorizada
+    
+    Acepta JSON en dos formatos:
+      - Por filas:    {"filas": [{"TiempoPromedioAccion(s)": 2.1, "ErroresSesion": 0, "TareasCompletadas": 12}, ...]}
+      - Por columnas: {"TiempoPromedioAccion(s)": [...], "ErroresSesion": [...], "TareasCompletadas": [...]}
+    En ambos casos "SesionID" es opcional y se devuelve tal cual.
+    """
+    # NumPy y el motor compilado solo se cargan si se usa la clasificación por lotes
+    from src.clasificacion_lote import clasificar_arreglos, nivel_texto, COLUMNAS_ENTRADA
+
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({
+                "status": "error",
+                "mensaje": "Se esperaba un objeto JSON"
+            }), 400
+        
+        if "filas" in data:
+            filas = data["filas"]
+            if not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+                return jsonify({
+                    "status": "error",
+                    "mensaje": "'filas' debe ser una lista de objetos"
+                }), 400
+            columnas = {c: [f.get(c, 0) for f in filas] for c in COLUMNAS_ENTRADA}
+            sesiones = [f.get("SesionID") for f in filas] if any("SesionID" in f for f in filas) else None
+        else:
+            faltantes = [c for c in COLUMNAS_ENTRADA if not isinstance(data.get(c), list)]
+            if faltantes:
+                return jsonify({
+                    "status": "error",
+                    "mensaje": f"Faltan columnas: {', '.join(faltantes)}"
+                }), 400
+            columnas = {c: data[c] for c in COLUMNAS_ENTRADA}
+            sesiones = data.get("SesionID")
+        
+        total = len(columnas[COLUMNAS_ENTRADA[0]])
+        if any(len(v) != total for v in columnas.values()) or (sesiones is not None and len(sesiones) != total):
+            return jsonify({
+                "status": "error",
+                "mensaje": "Todas las columnas deben tener la misma longitud"
+            }), 400
+        if total > MAX_FILAS_LOTE:
+            return jsonify({
+                "status": "error",
+                "mensaje": f"Máximo {MAX_FILAS_LOTE} filas por petición (recibidas: {total})"
+            }), 413
+        
+        niveles, interfaces = clasificar_arreglos(*(columnas[c] for c in COLUMNAS_ENTRADA))
+        
+        respuesta = {
+            "status": "ok",
+            "total": total,
+            "niveles": [round(float(n), 2) for n in niveles],
+            "interfaces": interfaces.tolist(),
+            "niveles_clasificados": nivel_texto(interfaces).tolist()
+        }
+        if sesiones is not None:
+            respuesta["sesiones"] = sesiones
+        return jsonify(respuesta)
+        
+    except Exception as e:
+        registro.error("Error en clasificar_lote_api: %s", e)
+        return jsonify({
+            "status": "error",
+            "mensaje": f"Error al clasificar lote: {str(e)}"
+        }), 500
+
+def _mostrar_interfaz(terminal, interfaz):
+    """Anota la interfaz que muestra la terminal, salvo que una venta suya se esté
+    evaluando en la cola: la interfaz que asigne llega a la página por /api/stream"""
+    estado_sesion = obtener_estado_terminal(terminal)
+    if estado_sesion.evaluacion_pendiente or cola_eventos.pendientes(terminal):
+        return
+    estado_sesion.interfaz = interfaz
+
 # Rutas para cada interfaz principal
 @app.route("/novato")
 def novato():
-    global interfaz_actual
     # Verificar si la adaptación está activa
     if not obtener_estado_adaptacion():
         return redirect(url_for("original"))
-    interfaz_actual = "novato"
-    return render_template("interfaz_novato/interfaz_novato.html", nivel_actual="novato")
+    _mostrar_interfaz(terminal_de_peticion(request), "novato")
+    return paginas.servir("interfaz_novato/interfaz_novato.html", nivel_actual="novato")
 
 @app.route("/intermedio")
 def intermedio():
-    global interfaz_actual
     # Verificar si la adaptación está activa
     if not obtener_estado_adaptacion():
         return redirect(url_for("original"))
-    interfaz_actual = "intermedio"
-    return render_template("interfaz_intermedio/interfaz_intermedio.html", nivel_actual="intermedio")
+    _mostrar_interfaz(terminal_de_peticion(request), "intermedio")
+    return paginas.servir("interfaz_intermedio/interfaz_intermedio.html", nivel_actual="intermedio")
 
 @app.route("/experto")
 def experto():
-    global interfaz_actual
     # Verificar si la adaptación está activa
     if not obtener_estado_adaptacion():
         return redirect(url_for("original"))
-    interfaz_actual = "experto"
-    return render_template("interfaz_experto/interfaz_experto.html", nivel_actual="experto")
+    _mostrar_interfaz(terminal_de_peticion(request), "experto")
+    return paginas.servir("interfaz_experto/interfaz_experto.html", nivel_actual="experto")
 
 # Rutas para pantallas de pago
 @app.route("/novato/pago")
 def novato_pago():
-    return render_template("interfaz_novato/interfaz_novato2.html", nivel_actual="novato")
+    return paginas.servir("interfaz_novato/interfaz_novato2.html", nivel_actual="novato")
 
 @app.route("/intermedio/pago")
 def intermedio_pago():
-    return render_template("interfaz_intermedio/interfaz_intermedio2.html", nivel_actual="intermedio")
+    return paginas.servir("interfaz_intermedio/interfaz_intermedio2.html", nivel_actual="intermedio")
 
 @app.route("/experto/pago")
 def experto_pago():
-    return render_template("interfaz_experto/interfaz_experto2.html", nivel_actual="experto")
+    return paginas.servir("interfaz_experto/interfaz_experto2.html", nivel_actual="experto")
 
 @app.route("/original")
 def original():
     """Interfaz original de Wally POS (pantalla inicial sin datos)"""
-    return render_template("interfaz_original.html")
+    return paginas.servir("interfaz_original.html")
 
 @app.route("/original/pago")
 def original_pago():
     """Pantalla de pago para la interfaz original"""
-    return render_template("interfaz_original_2.html")
+    return paginas.servir("interfaz_original_2.html")
 
 @app.route("/reset", methods=["POST", "GET"])
 def reset():
-    """Reinicia el sistema (borra datos acumulados)"""
-    global interfaz_actual
-    archivo = "data/dataset_pos.csv"
-    if os.path.exists(archivo):
-        os.remove(archivo)
-        print("\n" + "="*60)
-        print("🔄 SISTEMA REINICIADO - Datos borrados")
-        print("="*60 + "\n")
-        interfaz_actual = "original"
+    """Reinicia el sistema (borra los datos acumulados de la terminal)"""
+    terminal = terminal_de_peticion(request)
+    estado_sesion = _estado_al_dia(terminal).cargar()
+    existia = estado_sesion.existe
+    # Borra el historial y descarta el estado en memoria
+    estado_sesion.reiniciar()
+    if existia:
+        banner(registro, "🔄 SISTEMA REINICIADO - Datos borrados")
+        registro.info("Historial de la terminal reiniciado", extra={"campos": {"terminal": terminal}})
+        estado_sesion.interfaz = "original"
     # Redirigir a la interfaz original
     return redirect(url_for("original"))
 
@@ -395,6 +750,16 @@ if __name__ == "__main__":
     print("🎯 Columnas: SesionID | TiempoPromedioAccion(s) | ErroresSesion | TareasCompletadas | NivelClasificado")
     print("📍 URL: http://localhost:5000")
     print("🔄 Reset: http://localhost:5000/reset")
+    print("🧵 Varios procesos: \"multiproceso\": true en data/config.json y")
+    print("   gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 app:app (ver src/bloqueo.py)")
+    print("📝 Registro: \"nivel_registro\": \"DEBUG\" muestra el detalle de cada evaluación,")
+    print("   \"formato_registro\": \"json\" una línea JSON por registro (ver src/registro.py)")
+    print("🌡️  Listo para vender: GET /healthz/ready (200 después del calentamiento)")
     print("="*60 + "\n")
     
+    # Con debug=True este bloque corre también en el proceso que vigila los archivos
+    # (recargador): calentar solo el que atiende las peticiones
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        calentamiento.iniciar(app)
+    
     app.run(debug=True, port=5000)
\ No newline at end of file
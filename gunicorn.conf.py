@@ -0,0 +1,15 @@
+"""
+Configuración de gunicorn (se carga sola al ejecutarlo desde este directorio):
+
+    gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 app:app
+
+Cada proceso calienta (src/calentamiento.py) antes de aceptar peticiones, así
+que la primera venta después de un reinicio no paga la carga de pandas, la
+construcción del motor ni la compilación de las plantillas.
+"""
+
+
+def post_worker_init(worker):
+    from app import app
+    from src import calentamiento
+    calentamiento.calentar(app)
@@ -0,0 +1,14 @@
+"""
+Fixtures compartidas de las pruebas
+"""
+import pytest
+
+
+@pytest.fixture
+def directorio_temporal(tmp_path, monkeypatch):
+    """Ejecuta la prueba con data/ apuntando a un directorio temporal"""
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    # Terminar las escrituras en segundo plano antes de volver al directorio anterior
+    from src.estado_sesion import persistir_todo
+    persistir_todo()
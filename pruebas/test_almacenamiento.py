@@ -0,0 +1,127 @@
+"""
+Prueba de los almacenamientos del historial (CSV + diario y SQLite)
+Verifica que ambos produzcan el mismo dataset para la misma secuencia de
+eventos y que la importación/exportación conserve el formato Dataset_POS.csv
+"""
+import sys
+import os
+import json
+import pandas as pd
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.diario_eventos import COLUMNAS_DATASET, COLUMNAS_ALMACEN
+from src.logger import registrar_evento
+from src.estado_sesion import obtener_estado_sesion, obtener_estado_terminal, EstadoSesion
+from src.adaptador import actualizar_nivel_clasificado
+from src.almacenamiento import AlmacenamientoSQLite, crear_almacenamiento, importar_csv, exportar_csv
+
+ARCHIVO_PRUEBA = os.path.join(directorio_raiz, "data", "Dataset_POS_prueba.csv")
+
+
+def simular_ventas(almacenamiento, monkeypatch):
+    """Ejecuta la misma secuencia de eventos con el almacenamiento indicado (en un
+    subdirectorio propio del directorio temporal de la prueba) y devuelve sus filas"""
+    os.makedirs(os.path.join(almacenamiento, "data"))
+    monkeypatch.chdir(almacenamiento)
+    with open("data/config.json", "w", encoding="utf-8") as f:
+        json.dump({"adaptacion_activa": True, "almacenamiento": almacenamiento}, f)
+
+    for venta in range(3):
+        for duracion, exito in ((1.5, True), (2.5, venta == 1), (4.0, True)):
+            registrar_evento("agregar_producto", duracion, exito)
+        registrar_evento("compra_finalizada", 0.5, True)
+        actualizar_nivel_clasificado("Intermedio → Interfaz estándar", "data/dataset_pos.csv")
+    registrar_evento("agregar_producto", 3.0, True)
+
+    estado_sesion = obtener_estado_sesion()
+    assert estado_sesion.almacen.tipo == almacenamiento
+    estado_sesion.persistir()
+    estado_sesion.compactar_si_corresponde()
+
+    # Un estado nuevo, cargado desde disco, ve lo mismo que el de memoria
+    recargado = EstadoSesion(almacen=crear_almacenamiento()).cargar()
+    assert recargado.ultimas_filas() == [
+        {c: (float(f[c]) if c == "TiempoPromedioAccion(s)" else f[c]) for c in COLUMNAS_ALMACEN}
+        for f in estado_sesion.ultimas_filas()
+    ]
+    filas = recargado.almacen.filas()
+    monkeypatch.chdir("..")
+    return filas
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_sqlite_igual_a_csv(monkeypatch):
+    """La misma secuencia de eventos deja el mismo historial en ambos almacenamientos"""
+    filas_csv = simular_ventas("csv", monkeypatch)
+    filas_sqlite = simular_ventas("sqlite", monkeypatch)
+    assert len(filas_csv) == len(filas_sqlite) == 4
+    for fila_csv, fila_sqlite in zip(filas_csv, filas_sqlite):
+        for columna in COLUMNAS_ALMACEN[1:]:
+            assert fila_csv[columna] == fila_sqlite[columna], (columna, fila_csv, fila_sqlite)
+    assert filas_sqlite[-2]["NivelClasificado"] == "Intermedio"
+
+
+def test_importar_exportar_conserva_formato(tmp_path):
+    """Importar Dataset_POS_prueba.csv y exportarlo de nuevo da el mismo CSV"""
+    base_datos = str(tmp_path / "pos.db")
+    exportado = str(tmp_path / "Dataset_POS_export.csv")
+
+    total = importar_csv(ARCHIVO_PRUEBA, base_datos)
+    assert total == len(pd.read_csv(ARCHIVO_PRUEBA))
+    exportar_csv(AlmacenamientoSQLite(ARCHIVO_PRUEBA, base_datos), exportado)
+
+    original = pd.read_csv(ARCHIVO_PRUEBA)
+    copia = pd.read_csv(exportado)
+    assert list(copia.columns) == COLUMNAS_DATASET
+    pd.testing.assert_frame_equal(original, copia, check_dtype=False)
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_migracion_usa_el_diario_del_dataset():
+    """La migración automática a SQLite pliega el diario junto al dataset, no el de data/"""
+    # Un diario en data/ que no corresponde al dataset de la otra caja
+    os.makedirs("data")
+    with open("data/eventos_pos.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"tipo": "inicio_sesion", "sesion": "S_ajena"}) + "\n")
+
+    registrar_evento("agregar_producto", 1.5, True, terminal="caja-2")
+    estado_caja = obtener_estado_terminal("caja-2")
+    estado_caja.persistir()
+    esperadas = estado_caja.almacen.filas()
+
+    filas = AlmacenamientoSQLite(estado_caja.almacen.archivo_dataset).filas()
+    assert filas == esperadas and filas[-1]["TareasCompletadas"] == 1
+    assert all(f["SesionID"] != "S_ajena" for f in filas)
+
+
+def test_importar_csv_una_sola_vez(tmp_path):
+    """importar_csv lee e inserta el CSV una vez (sin la migración automática de conexion())"""
+    importaciones = []
+    importar = AlmacenamientoSQLite.importar
+    AlmacenamientoSQLite.importar = lambda self, filas, conexion=None: (
+        importaciones.append(len(filas)), importar(self, filas, conexion))[1]
+    try:
+        total = importar_csv(ARCHIVO_PRUEBA, str(tmp_path / "pos.db"))
+    finally:
+        AlmacenamientoSQLite.importar = importar
+    assert importaciones == [total]
+
+
+def test_cargar_sin_recorrer_la_tabla(tmp_path):
+    """La pregunta de cargar() por sesiones con eventos usa el índice parcial"""
+    almacen = AlmacenamientoSQLite(str(tmp_path / "dataset_pos.csv"))
+    plan = almacen.conexion().execute(
+        "EXPLAIN QUERY PLAN SELECT EXISTS (SELECT 1 FROM sesiones INDEXED BY idx_sesiones_con_eventos "
+        "WHERE errores > 0 OR tareas > 0)"
+    ).fetchall()
+    assert any("idx_sesiones_con_eventos" in paso[-1] for paso in plan), plan
+    assert almacen.cargar() == (None, None, None, False)
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Almacenamientos CSV y SQLite equivalentes")
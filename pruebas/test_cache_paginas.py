@@ -0,0 +1,74 @@
+"""
+Prueba de la caché de páginas de interfaz
+Verifica que las páginas se sirvan iguales al render original, comprimidas
+con gzip cuando se acepta, con 304 por ETag y renovadas si cambia la plantilla
+"""
+import sys
+import os
+import gzip
+import time
+import tempfile
+from flask import Flask, render_template
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import cache_paginas
+from src.cache_paginas import CachePaginas
+
+
+def test_paginas_iguales_al_render():
+    """La página cacheada (plana y gzip) es idéntica a render_template"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    for ruta, plantilla, contexto in (
+        ("/novato", "interfaz_novato/interfaz_novato.html", {"nivel_actual": "novato"}),
+        ("/experto/pago", "interfaz_experto/interfaz_experto2.html", {"nivel_actual": "experto"}),
+        ("/original", "interfaz_original.html", {}),
+    ):
+        with aplicacion.app.test_request_context():
+            esperado = render_template(plantilla, **contexto).encode("utf-8")
+
+        plana = cliente.get(ruta)
+        assert plana.status_code == 200 and plana.data == esperado
+
+        comprimida = cliente.get(ruta, headers={"Accept-Encoding": "gzip"})
+        assert comprimida.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(comprimida.data) == esperado
+        assert len(comprimida.data) < len(esperado) / 3
+
+        etag = comprimida.headers["ETag"]
+        revalidada = cliente.get(ruta, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert revalidada.status_code == 304 and revalidada.data == b""
+
+
+def test_plantilla_modificada_se_renueva():
+    """Al cambiar el archivo de la plantilla la página se vuelve a renderizar"""
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "pagina.html")
+        with open(archivo, "w", encoding="utf-8") as f:
+            f.write("<p>{{ nivel_actual }} v1</p>")
+
+        aplicacion = Flask(__name__, template_folder=directorio)
+        aplicacion.config["TEMPLATES_AUTO_RELOAD"] = True
+        paginas = CachePaginas(aplicacion)
+        aplicacion.add_url_rule("/p", "p", lambda: paginas.servir("pagina.html", nivel_actual="novato"))
+        cliente = aplicacion.test_client()
+
+        assert cliente.get("/p").data == b"<p>novato v1</p>"
+        primera = dict(paginas._paginas)
+
+        with open(archivo, "w", encoding="utf-8") as f:
+            f.write("<p>{{ nivel_actual }} versión 2</p>")
+        time.sleep(cache_paginas.INTERVALO_COMPROBACION_S + 0.05)
+
+        assert cliente.get("/p").data == "<p>novato versión 2</p>".encode("utf-8")
+        assert paginas._paginas != primera
+
+
+if __name__ == "__main__":
+    test_paginas_iguales_al_render()
+    test_plantilla_modificada_se_renueva()
+    print("✅ Caché de páginas correcta")
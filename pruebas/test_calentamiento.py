@@ -0,0 +1,107 @@
+"""
+Prueba del arranque rápido y del calentamiento (src/calentamiento.py)
+Verifica que importar app.py no cargue pandas, NumPy ni scikit-fuzzy, que las
+ventas (eventos, evaluación, estado y compactación) no carguen pandas, y que
+/healthz/ready responda 503 hasta que el calentamiento cargó el motor, el
+estado de cada terminal y las plantillas
+"""
+import sys
+import os
+import csv
+import subprocess
+import tempfile
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import calentamiento
+from src.diario_eventos import COLUMNAS_ALMACEN
+from src.estado_sesion import persistir_todo, obtener_estado_terminal
+from src.terminales import archivos_terminal
+
+
+def _crear_historial(terminal):
+    dataset, _ = archivos_terminal(terminal)
+    os.makedirs(os.path.dirname(dataset), exist_ok=True)
+    with open(dataset, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS_ALMACEN)
+        escritor.writerow(["S_20260101_090000", 2.5, 1, 12, "Intermedio", 32.5, 4.0])
+        escritor.writerow(["S_20260101_091500", 0, 0, 0, "Intermedio", 0.0, 0.0])
+
+
+def test_importar_app_sin_modulos_pesados():
+    """import app no carga pandas, NumPy, scikit-fuzzy ni scipy"""
+    salida = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, app; print(sorted(m for m in ('pandas', 'numpy', 'skfuzzy', 'scipy') if m in sys.modules))"],
+        cwd=directorio_raiz, capture_output=True, text=True, timeout=60,
+    )
+    assert salida.returncode == 0, salida.stderr
+    assert salida.stdout.strip().splitlines()[-1] == "[]", salida.stdout
+
+
+def test_ventas_sin_pandas():
+    """Eventos, evaluación, /api/estado y compactación no cargan pandas"""
+    programa = "\n".join([
+        "import sys, app",
+        "from src.estado_sesion import persistir_todo",
+        "cliente = app.app.test_client()",
+        "for _ in range(3):",
+        "    for tipo in ('agregar_producto', 'agregar_producto', 'error_pago', 'compra_finalizada'):",
+        "        assert cliente.post('/api/evento', json={'tipo_evento': tipo, 'duracion': 1.5, 'exito': tipo != 'error_pago'}).status_code == 200",
+        "assert cliente.get('/api/estado').status_code == 200",
+        "app.cola_eventos.esperar_todo()",
+        "persistir_todo()",
+        "print(len(app.obtener_estado_terminal(None).almacen.filas()), 'pandas' in sys.modules)",
+    ])
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = dict(os.environ, PYTHONPATH=directorio_raiz)
+        salida = subprocess.run(
+            [sys.executable, "-c", programa],
+            cwd=directorio, env=entorno, capture_output=True, text=True, timeout=120,
+        )
+    assert salida.returncode == 0, salida.stderr
+    assert salida.stdout.strip().splitlines()[-1] == "4 False", salida.stdout
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_listo_despues_de_calentar():
+    """/healthz/ready: 503 mientras calienta, 200 con todas las etapas después"""
+    import app as aplicacion
+    _crear_historial(None)
+    _crear_historial("caja-2")
+
+    # Estado del módulo como en un proceso recién arrancado
+    calentamiento._listo.clear()
+    calentamiento._hilo = None
+    calentamiento._resumen.update(etapas={}, errores={}, segundos=None)
+    cliente = aplicacion.app.test_client()
+
+    respuesta = cliente.get("/healthz/ready")
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()["status"] == "calentando"
+
+    assert calentamiento.esperar(timeout=60)
+    respuesta = cliente.get("/healthz/ready")
+    assert respuesta.status_code == 200
+    datos = respuesta.get_json()
+    assert datos["listo"] and datos["errores"] == {}, datos
+    assert set(datos["etapas"]) == {"modulos", "config", "motor", "estado", "plantillas"}
+
+    # El estado de cada terminal con historial quedó en memoria
+    for terminal in ("principal", "caja-2"):
+        estado = obtener_estado_terminal(terminal)
+        assert estado.cargado and estado.existe
+        assert estado.anterior["SesionID"] == "S_20260101_090000"
+
+    # Las plantillas de ui/ quedaron compiladas en la caché de Jinja
+    assert len(aplicacion.app.jinja_env.cache) >= len(aplicacion.app.jinja_env.list_templates(extensions=["html"]))
+    assert "\npos_listo 1\n" in cliente.get("/metrics").get_data(as_text=True)
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Arranque sin módulos pesados, ventas sin pandas y calentamiento antes de /healthz/ready")
@@ -0,0 +1,324 @@
+"""
+Generador de carga - Sistema POS Adaptativo
+Simula muchas terminales (cajas) vendiendo a la vez: cada terminal virtual es
+un hilo con su propia conexión keep-alive (requests.Session) que registra
+ventas completas con las secuencias de un cajero novato, intermedio o experto,
+al ritmo de llegada indicado (ventas por segundo entre todas las terminales,
+llegadas de Poisson).
+
+Informa rendimiento, tasa de errores, latencias p50/p95/p99/máx de eventos y
+ventas, la latencia de los cambios de interfaz y la evolución de todo ello por
+ventanas de tiempo. Guarda el resultado en pruebas/resultados/carga_<fecha>.json.
+
+Uso:
+    python pruebas/test_carga.py                      # en el proceso (cliente de pruebas de Flask)
+    python pruebas/test_carga.py --url http://localhost:5000 --terminales 30 --tasa 15 --duracion 60
+    python pruebas/test_carga.py --lotes              # eventos en un solo POST /api/eventos como POSTracker
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Agregar el directorio raíz al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+# Cajeros simulados (mismos perfiles que test_estabilidad.py)
+PERFILES = {
+    "novato": {"acciones": (5, 10), "tiempo": (6, 10), "prob_error": 0.4},
+    "intermedio": {"acciones": (10, 20), "tiempo": (3, 7), "prob_error": 0.2},
+    "experto": {"acciones": (15, 30), "tiempo": (1, 3), "prob_error": 0.05},
+}
+
+TIPOS_EVENTO = [
+    "agregar_producto_carrito", "eliminar_producto_carrito",
+    "aumentar_cantidad", "disminuir_cantidad", "ir_a_pago",
+]
+
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) por rango más cercano de una lista ordenada"""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def resumen_latencias(latencias):
+    """p50/p95/p99/máx en ms de una lista de latencias en segundos"""
+    ordenadas = sorted(latencias)
+    return {
+        "cantidad": len(ordenadas),
+        "p50_ms": round(percentil(ordenadas, 50) * 1000, 2),
+        "p95_ms": round(percentil(ordenadas, 95) * 1000, 2),
+        "p99_ms": round(percentil(ordenadas, 99) * 1000, 2),
+        "max_ms": round(ordenadas[-1] * 1000, 2) if ordenadas else 0.0,
+    }
+
+
+class ClienteHTTP:
+    """Conexión keep-alive de una terminal contra un servidor en marcha"""
+
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip("/")
+        self.sesion = requests.Session()
+        self.sesion.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def post(self, ruta, cuerpo, cabeceras):
+        respuesta = self.sesion.post(self.url + ruta, json=cuerpo, headers=cabeceras, timeout=10)
+        return respuesta.status_code, respuesta.json()
+
+    def cerrar(self):
+        self.sesion.close()
+
+
+class ClienteLocal:
+    """Cliente de pruebas de Flask: la aplicación en el mismo proceso, sin red"""
+
+    def __init__(self, aplicacion):
+        self.cliente = aplicacion.app.test_client()
+
+    def post(self, ruta, cuerpo, cabeceras):
+        respuesta = self.cliente.post(ruta, json=cuerpo, headers=cabeceras)
+        return respuesta.status_code, respuesta.get_json()
+
+    def cerrar(self):
+        pass
+
+
+class GeneradorCarga:
+    def __init__(self, url=None, terminales=30, tasa=10.0, duracion=30.0, lotes=False,
+                 pausa=0.0, rotacion=0.1, ventana=1.0, semilla=None):
+        self.url = url
+        self.terminales = terminales
+        self.tasa = tasa                # ventas por segundo entre todas las terminales
+        self.duracion = duracion
+        self.lotes = lotes              # True: toda la venta en un POST /api/eventos
+        self.pausa = pausa              # segundos entre eventos de una venta
+        self.rotacion = rotacion        # probabilidad de cambio de cajero entre ventas
+        self.ventana = ventana
+        self.aleatorio = random.Random(semilla)
+        self.muestras = []              # (instante, tipo, latencia, ok, cambio_interfaz)
+        self.retrasos = []              # atraso de cada venta respecto de su llegada programada
+        self._lock = threading.Lock()
+        self._aplicacion = None
+
+    def _cliente(self):
+        if self.url:
+            return ClienteHTTP(self.url)
+        return ClienteLocal(self._aplicacion)
+
+    def _registrar(self, instante, tipo, latencia, ok, cambio=False):
+        with self._lock:
+            self.muestras.append((instante - self._inicio, tipo, latencia, ok, cambio))
+
+    def _enviar(self, cliente, tipo, ruta, cuerpo, cabeceras):
+        inicio = time.perf_counter()
+        try:
+            estado, datos = cliente.post(ruta, cuerpo, cabeceras)
+            ok = estado == 200 and isinstance(datos, dict) and datos.get("status") == "ok"
+        except Exception:
+            datos, ok = None, False
+        latencia = time.perf_counter() - inicio
+        cambio = bool(ok and datos.get("cambio_interfaz"))
+        self._registrar(inicio, tipo, latencia, ok, cambio)
+        return datos
+
+    def _secuencia(self, perfil, aleatorio):
+        """Eventos de una venta con el perfil del cajero (la venta al final)"""
+        datos = PERFILES[perfil]
+        eventos = []
+        tiempo_activo = 0.0
+        for _ in range(aleatorio.randint(*datos["acciones"])):
+            duracion = round(aleatorio.uniform(*datos["tiempo"]), 2)
+            tiempo_activo += duracion
+            eventos.append({
+                "tipo_evento": aleatorio.choice(TIPOS_EVENTO),
+                "duracion": duracion,
+                "exito": aleatorio.random() > datos["prob_error"],
+                "tiempo_activo": round(tiempo_activo, 2),
+            })
+        eventos.append({"tipo_evento": "compra_finalizada", "duracion": 0.2, "exito": True, "tiempo_activo": None})
+        return eventos
+
+    def _terminal(self, numero):
+        """Hilo de una terminal virtual: ventas a su ritmo de llegada hasta agotar la duración"""
+        aleatorio = random.Random(self.aleatorio.random())
+        cabeceras = {"X-Terminal-ID": f"carga-{numero:03d}"}
+        perfil = list(PERFILES)[numero % len(PERFILES)]
+        tasa_terminal = self.tasa / self.terminales
+        cliente = self._cliente()
+        try:
+            llegada = self._inicio + aleatorio.expovariate(tasa_terminal)
+            while llegada < self._fin:
+                espera = llegada - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    with self._lock:
+                        self.retrasos.append(-espera)
+                if self.rotacion and aleatorio.random() < self.rotacion:
+                    perfil = aleatorio.choice(list(PERFILES))
+
+                eventos = self._secuencia(perfil, aleatorio)
+                if self.lotes:
+                    self._enviar(cliente, "venta", "/api/eventos", {"eventos": eventos}, cabeceras)
+                else:
+                    for evento in eventos[:-1]:
+                        self._enviar(cliente, "evento", "/api/evento", evento, cabeceras)
+                        if self.pausa:
+                            time.sleep(self.pausa)
+                    self._enviar(cliente, "venta", "/api/evento", eventos[-1], cabeceras)
+                llegada += aleatorio.expovariate(tasa_terminal)
+        finally:
+            cliente.cerrar()
+
+    def ejecutar(self):
+        print("\n" + "=" * 60)
+        print("🏪 GENERADOR DE CARGA - TERMINALES SIMULTÁNEAS")
+        print("=" * 60)
+        print(f"🎯 Destino: {self.url or 'cliente de pruebas de Flask (en el proceso)'}")
+        print(f"🧾 {self.terminales} terminales, {self.tasa} ventas/s, {self.duracion}s"
+              f"{', eventos en lote' if self.lotes else ''}")
+
+        if self.url:
+            return self._ejecutar_hilos()
+
+        # En el proceso: datos en un directorio temporal y sin registros informativos
+        import app as aplicacion
+        from src.estado_sesion import persistir_todo
+        from src.registro import configurar_registro
+        self._aplicacion = aplicacion
+        configurar_registro(nivel="WARNING")
+        anterior = os.getcwd()
+        with tempfile.TemporaryDirectory() as directorio:
+            os.chdir(directorio)
+            try:
+                return self._ejecutar_hilos()
+            finally:
+                aplicacion.cola_eventos.esperar_todo(timeout=30)
+                persistir_todo()
+                os.chdir(anterior)
+                configurar_registro()
+
+    def _ejecutar_hilos(self):
+        self._inicio = time.perf_counter()
+        self._fin = self._inicio + self.duracion
+        hilos = [threading.Thread(target=self._terminal, args=(n,), daemon=True) for n in range(self.terminales)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self._transcurrido = time.perf_counter() - self._inicio
+        return self.informe()
+
+    def informe(self):
+        """Totales, latencias por tipo, cambios de interfaz y series por ventana"""
+        muestras = sorted(self.muestras)
+        transcurrido = getattr(self, "_transcurrido", 0) or max((m[0] + m[2] for m in muestras), default=1)
+        errores = sum(1 for m in muestras if not m[3])
+        ventas = [m for m in muestras if m[1] == "venta"]
+        cambios = [m[2] for m in ventas if m[4]]
+
+        series = []
+        ventanas = int(transcurrido // self.ventana) + 1
+        for i in range(ventanas):
+            en_ventana = [m for m in muestras if i * self.ventana <= m[0] < (i + 1) * self.ventana]
+            if not en_ventana:
+                continue
+            series.append({
+                "desde_s": round(i * self.ventana, 2),
+                "peticiones": len(en_ventana),
+                "errores": sum(1 for m in en_ventana if not m[3]),
+                "ventas": sum(1 for m in en_ventana if m[1] == "venta"),
+                "p95_ms": round(percentil(sorted(m[2] for m in en_ventana), 95) * 1000, 2),
+                "cambios_interfaz": sum(1 for m in en_ventana if m[4]),
+                "p95_cambio_ms": round(percentil(sorted(m[2] for m in en_ventana if m[4]), 95) * 1000, 2),
+            })
+
+        informe = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "destino": self.url or "local",
+            "terminales": self.terminales,
+            "tasa_objetivo_ventas_s": self.tasa,
+            "duracion_s": round(transcurrido, 2),
+            "lotes": self.lotes,
+            "peticiones": len(muestras),
+            "peticiones_por_segundo": round(len(muestras) / transcurrido, 2) if transcurrido else 0.0,
+            "ventas_por_segundo": round(len(ventas) / transcurrido, 2) if transcurrido else 0.0,
+            "errores": errores,
+            "tasa_errores": round(errores / len(muestras), 4) if muestras else 0.0,
+            "latencia_eventos": resumen_latencias([m[2] for m in muestras if m[1] == "evento"]),
+            "latencia_ventas": resumen_latencias([m[2] for m in ventas]),
+            "latencia_cambio_interfaz": resumen_latencias(cambios),
+            "retraso_llegadas": resumen_latencias(self.retrasos),
+            "series": series,
+        }
+        self.mostrar(informe)
+        return informe
+
+    def mostrar(self, informe):
+        print(f"\n📊 {informe['peticiones']} peticiones en {informe['duracion_s']}s "
+              f"({informe['peticiones_por_segundo']} req/s, {informe['ventas_por_segundo']} ventas/s)")
+        print(f"❌ Errores: {informe['errores']} ({informe['tasa_errores']:.2%})")
+        for clave, titulo in (("latencia_eventos", "Eventos"), ("latencia_ventas", "Ventas"),
+                              ("latencia_cambio_interfaz", "Cambios de interfaz")):
+            datos = informe[clave]
+            print(f"   {titulo:<20} n={datos['cantidad']:<6} p50 {datos['p50_ms']:>8.2f} ms   "
+                  f"p95 {datos['p95_ms']:>8.2f} ms   p99 {datos['p99_ms']:>8.2f} ms   máx {datos['max_ms']:>8.2f} ms")
+        if informe["retraso_llegadas"]["cantidad"]:
+            print(f"⚠️  {informe['retraso_llegadas']['cantidad']} ventas empezaron tarde "
+                  f"(p95 {informe['retraso_llegadas']['p95_ms']} ms): la tasa supera lo que el servidor atiende")
+        print(f"\n{'t (s)':>7} {'req':>6} {'err':>5} {'ventas':>7} {'p95 ms':>9} {'cambios':>8} {'p95 cambio':>11}")
+        for fila in informe["series"]:
+            print(f"{fila['desde_s']:>7} {fila['peticiones']:>6} {fila['errores']:>5} {fila['ventas']:>7} "
+                  f"{fila['p95_ms']:>9.2f} {fila['cambios_interfaz']:>8} {fila['p95_cambio_ms']:>11.2f}")
+
+    def guardar(self, informe):
+        os.makedirs(os.path.join(directorio_raiz, "pruebas", "resultados"), exist_ok=True)
+        archivo = os.path.join(
+            directorio_raiz, "pruebas", "resultados", f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        with open(archivo, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en: {archivo}")
+        return archivo
+
+
+def test_carga_local():
+    """Carga corta en el proceso: todas las ventas se registran sin errores"""
+    generador = GeneradorCarga(terminales=6, tasa=12, duracion=2, lotes=False, semilla=7)
+    informe = generador.ejecutar()
+    assert informe["errores"] == 0, informe
+    assert informe["latencia_ventas"]["cantidad"] > 0
+    assert informe["latencia_eventos"]["cantidad"] > informe["latencia_ventas"]["cantidad"]
+    assert informe["latencia_cambio_interfaz"]["cantidad"] > 0
+    assert sum(fila["peticiones"] for fila in informe["series"]) == informe["peticiones"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generador de carga con terminales simultáneas")
+    parser.add_argument("--url", help="Servidor en marcha (p. ej. http://localhost:5000); sin --url, en el proceso")
+    parser.add_argument("--terminales", type=int, default=30)
+    parser.add_argument("--tasa", type=float, default=10.0, help="Ventas por segundo entre todas las terminales")
+    parser.add_argument("--duracion", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--lotes", action="store_true", help="Cada venta en un solo POST /api/eventos")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Segundos entre eventos de una venta")
+    parser.add_argument("--rotacion", type=float, default=0.1, help="Probabilidad de cambio de cajero entre ventas")
+    parser.add_argument("--ventana", type=float, default=1.0, help="Segundos por fila de la serie temporal")
+    parser.add_argument("--semilla", type=int)
+    argumentos = parser.parse_args()
+
+    generador = GeneradorCarga(
+        url=argumentos.url, terminales=argumentos.terminales, tasa=argumentos.tasa,
+        duracion=argumentos.duracion, lotes=argumentos.lotes, pausa=argumentos.pausa,
+        rotacion=argumentos.rotacion, ventana=argumentos.ventana, semilla=argumentos.semilla,
+    )
+    generador.guardar(generador.ejecutar())
@@ -0,0 +1,72 @@
+"""
+Prueba de la clasificación por lotes
+Compara la pasada vectorizada con la clasificación fila por fila de skfuzzy
+y verifica el endpoint /api/clasificar-lote
+"""
+import sys
+import os
+import pandas as pd
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.motor_difuso import crear_motor_difuso
+from src.motor_compilado import TOLERANCIA_NIVEL
+from src.asignador_interfaz import asignar_interfaz
+from src.clasificacion_lote import clasificar_lote
+
+ARCHIVO_PRUEBA = os.path.join(directorio_raiz, "data", "Dataset_POS_prueba.csv")
+
+
+def test_lote_igual_a_fila_por_fila():
+    """Cada fila del lote coincide con el motor de skfuzzy dentro de la tolerancia"""
+    df = pd.read_csv(ARCHIVO_PRUEBA)
+    resultado = clasificar_lote(df)
+    motor = crear_motor_difuso()
+
+    for fila, nivel in zip(df.itertuples(index=False), resultado['NivelUsuario']):
+        motor.input['TiempoPromedioAccion'] = min(getattr(fila, '_1'), 10.0)
+        motor.input['ErroresSesion'] = min(fila.ErroresSesion, 10)
+        motor.input['TareasCompletadas'] = min(fila.TareasCompletadas, 30)
+        motor.compute()
+        esperado = float(motor.output['NivelUsuario'])
+        assert abs(esperado - nivel) <= TOLERANCIA_NIVEL, f"{fila.SesionID}: {esperado:.4f} vs {nivel:.4f}"
+
+    assert list(resultado['Interfaz']) == [asignar_interfaz(n) for n in resultado['NivelUsuario']]
+
+
+def test_endpoint_clasificar_lote():
+    """El endpoint acepta filas y columnas y rechaza lotes mal formados"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    respuesta = cliente.post("/api/clasificar-lote", json={
+        "filas": [
+            {"SesionID": "A", "TiempoPromedioAccion(s)": 2.0, "ErroresSesion": 0, "TareasCompletadas": 25},
+            {"SesionID": "B", "TiempoPromedioAccion(s)": 8.0, "ErroresSesion": 7, "TareasCompletadas": 5},
+        ]
+    })
+    datos = respuesta.get_json()
+    assert respuesta.status_code == 200
+    assert datos["sesiones"] == ["A", "B"]
+    assert datos["niveles_clasificados"] == ["Experto", "Novato"]
+
+    respuesta = cliente.post("/api/clasificar-lote", json={
+        "TiempoPromedioAccion(s)": [5.0] * 3000,
+        "ErroresSesion": [3] * 3000,
+        "TareasCompletadas": [10] * 3000,
+    })
+    datos = respuesta.get_json()
+    assert respuesta.status_code == 200
+    assert datos["total"] == 3000
+    assert set(datos["niveles_clasificados"]) == {"Intermedio"}
+
+    respuesta = cliente.post("/api/clasificar-lote", json={"ErroresSesion": [1, 2]})
+    assert respuesta.status_code == 400
+
+
+if __name__ == "__main__":
+    test_lote_igual_a_fila_por_fila()
+    test_endpoint_clasificar_lote()
+    print("✅ Clasificación por lotes correcta")
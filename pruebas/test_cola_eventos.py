@@ -0,0 +1,153 @@
+"""
+Prueba de la cola de eventos (src/cola_eventos.py)
+Verifica que los eventos se respondan al encolarse, que cada terminal conserve
+su orden, que la venta espere su evaluación y que, si la cola va atrasada,
+la venta reciba una respuesta de respaldo sin perder el evento
+"""
+import sys
+import os
+import threading
+import time
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.cola_eventos import ColaEventos
+
+
+def test_orden_por_terminal():
+    """Los lotes de una terminal se procesan en el orden en que se encolaron"""
+    vistos = {}
+
+    def procesar(terminal, eventos):
+        vistos.setdefault(terminal, []).extend(eventos)
+        return len(vistos[terminal])
+
+    cola = ColaEventos(procesar, trabajadores=3)
+    for i in range(200):
+        cola.encolar(f"caja-{i % 5}", [i])
+    assert cola.encolar("caja-0", ["fin"], esperar=True).result(timeout=5) == 41
+    assert cola.esperar_todo(timeout=5)
+
+    for n in range(5):
+        assert vistos[f"caja-{n}"][:40] == list(range(n, 200, 5))
+    metricas = cola.metricas()
+    assert metricas["profundidad"] == 0
+    assert metricas["eventos_procesados"] == 201
+    assert metricas["latencia_procesamiento"]["contador"] == 201
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_eventos_encolados_y_venta_evaluada():
+    """Un evento común responde encolado; la venta responde con su evaluación"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+    cabeceras = {"X-Terminal-ID": "caja-cola"}
+
+    respuesta = cliente.post("/api/evento", headers=cabeceras,
+                             json={"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True}).get_json()
+    assert respuesta["encolado"] and not respuesta.get("redirigir")
+
+    venta = cliente.post("/api/evento", headers=cabeceras,
+                         json={"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True}).get_json()
+    assert venta["redirigir"] and venta["nivel"] is not None and "encolado" not in venta
+
+    cola = cliente.get("/api/cola").get_json()
+    assert cola["profundidad"] == 0 and cola["eventos_procesados"] >= 2
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_respaldo_si_la_cola_se_atrasa():
+    """Si la evaluación tarda más que tiempo_max_evaluacion_s se responde sin esperarla"""
+    import app as aplicacion
+    from src.config import guardar_config, cargar_config
+    from src.estado_sesion import obtener_estado_terminal
+
+    config = cargar_config()
+    config["tiempo_max_evaluacion_s"] = 0.1
+    guardar_config(config)
+
+    liberar = threading.Event()
+    procesar = aplicacion.cola_eventos.procesar
+    def procesar_lento(terminal, eventos):
+        liberar.wait(5)
+        return procesar(terminal, eventos)
+    aplicacion.cola_eventos.procesar = procesar_lento
+    try:
+        cliente = aplicacion.app.test_client()
+        inicio = time.perf_counter()
+        venta = cliente.post("/api/evento", headers={"X-Terminal-ID": "caja-lenta"},
+                             json={"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True}).get_json()
+        assert time.perf_counter() - inicio < 2
+        assert venta["evaluacion_pendiente"] and not venta.get("redirigir")
+    finally:
+        liberar.set()
+        aplicacion.cola_eventos.procesar = procesar
+    assert aplicacion.cola_eventos.esperar_todo(timeout=5)
+
+    # La venta se registró igual
+    assert obtener_estado_terminal("caja-lenta").anterior["TareasCompletadas"] == 1
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_pagina_anterior_no_pisa_la_evaluacion_pendiente():
+    """Tras una venta respondida sin evaluación, abrir la página anterior no pisa la
+    interfaz asignada y el estado inicial de /api/stream la trae"""
+    import json
+    import app as aplicacion
+    from src.config import guardar_config, cargar_config
+    from src.estado_sesion import obtener_estado_terminal
+
+    config = cargar_config()
+    config["tiempo_max_evaluacion_s"] = 0.1
+    guardar_config(config)
+    cabeceras = {"X-Terminal-ID": "caja-pendiente"}
+    estado_sesion = obtener_estado_terminal("caja-pendiente")
+
+    liberar = threading.Event()
+    procesar = aplicacion.cola_eventos.procesar
+    def procesar_lento(terminal, eventos):
+        liberar.wait(5)
+        return procesar(terminal, eventos)
+    aplicacion.cola_eventos.procesar = procesar_lento
+    try:
+        cliente = aplicacion.app.test_client()
+        eventos = [{"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True}] * 10
+        venta = cliente.post("/api/eventos", headers=cabeceras, json={"eventos": eventos + [
+            {"tipo_evento": "compra_finalizada", "duracion": 0.5, "exito": True}]}).get_json()
+        assert venta["evaluacion_pendiente"]
+        anterior = venta["interfaz"]
+        # La página de pago redirige a la interfaz anterior con la venta aún en la cola
+        cliente.get(f"/{anterior}", headers=cabeceras)
+        assert estado_sesion.interfaz == anterior
+    finally:
+        liberar.set()
+        aplicacion.cola_eventos.procesar = procesar
+    assert aplicacion.cola_eventos.esperar_todo(timeout=5)
+    asignada = estado_sesion.interfaz
+
+    # Otra interfaz abierta después de la evaluación, antes de conectar el flujo
+    otra = next(i for i in ("novato", "intermedio", "experto") if i != asignada)
+    cliente.get(f"/{otra}", headers=cabeceras)
+    assert estado_sesion.interfaz == asignada
+
+    respuesta = cliente.get("/api/stream", headers=cabeceras, buffered=False)
+    flujo = iter(respuesta.response)
+    while True:
+        fragmento = next(flujo).decode()
+        if fragmento.startswith("event: estado"):
+            break
+    estado = json.loads(fragmento.split("data: ", 1)[1])
+    respuesta.close()
+    assert estado["interfaz"] == asignada
+
+    # Ya entregada, la página vuelve a anotar la interfaz que muestra
+    cliente.get(f"/{otra}", headers=cabeceras)
+    assert estado_sesion.interfaz == otra
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Cola de eventos ordenada con respaldo por tiempo")
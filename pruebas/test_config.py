@@ -0,0 +1,62 @@
+"""
+Prueba de la caché de configuración
+Verifica que los cambios propios se vean al instante, los de otro proceso
+dentro del intervalo de comprobación, y que un archivo ilegible no se reescriba
+"""
+import sys
+import os
+import json
+import time
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import config
+from src.config import (
+    obtener_estado_adaptacion, establecer_estado_adaptacion, INTERVALO_COMPROBACION_S,
+)
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cambio_propio_inmediato():
+    """El toggle de este proceso se ve sin esperar y queda escrito en disco"""
+    assert obtener_estado_adaptacion() is True
+    establecer_estado_adaptacion(False)
+    assert obtener_estado_adaptacion() is False
+    with open(config.CONFIG_FILE, encoding="utf-8") as f:
+        assert json.load(f)["adaptacion_activa"] is False
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cambio_de_otro_proceso_acotado():
+    """Un cambio escrito por otro worker se ve como mucho tras el intervalo de comprobación"""
+    assert obtener_estado_adaptacion() is True
+    temporal = config.CONFIG_FILE + ".otro"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"adaptacion_activa": False}, f)
+    os.replace(temporal, config.CONFIG_FILE)
+
+    time.sleep(INTERVALO_COMPROBACION_S + 0.05)
+    assert obtener_estado_adaptacion() is False
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_archivo_ilegible_no_se_reescribe():
+    """Un config.json corrupto conserva el último valor válido y no se sobrescribe"""
+    establecer_estado_adaptacion(False)
+    with open(config.CONFIG_FILE, "w", encoding="utf-8") as f:
+        f.write("{corrupto")
+
+    time.sleep(INTERVALO_COMPROBACION_S + 0.05)
+    assert obtener_estado_adaptacion() is False  # último valor válido
+    config.invalidar_config()
+    assert obtener_estado_adaptacion() is True   # sin valor previo en caché: por defecto
+    with open(config.CONFIG_FILE, encoding="utf-8") as f:
+        assert f.read() == "{corrupto"
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Caché de configuración correcta")
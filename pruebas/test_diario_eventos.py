@@ -0,0 +1,223 @@
+"""
+Prueba del diario de eventos de solo anexado
+Verifica que cada evento sea una sola línea anexada, que la sesión en curso
+se reconstruya desde la cola y que la compactación deje el CSV en el formato
+de Dataset_POS.csv
+"""
+import sys
+import os
+import random
+import statistics
+import json
+import pandas as pd
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import diario_eventos
+from src.logger import registrar_evento
+from src.estado_sesion import obtener_estado_sesion
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_evento_es_una_linea_anexada():
+    """Cada evento ordinario añade exactamente una línea (al volcar la cola) y no reescribe el CSV"""
+    estado_sesion = obtener_estado_sesion()
+    registrar_evento("agregar_producto", 2.0, True)
+    estado_sesion.persistir()
+    csv_antes = open(diario_eventos.ARCHIVO_DATASET, encoding="utf-8").read()
+    lineas_antes = open(diario_eventos.ARCHIVO_DIARIO, encoding="utf-8").read().count("\n")
+
+    registrar_evento("agregar_producto", 3.0, False)
+    # El estado en memoria refleja el evento antes de que llegue al disco
+    assert estado_sesion.actual["ErroresSesion"] == 1
+    estado_sesion.persistir()
+
+    assert open(diario_eventos.ARCHIVO_DIARIO, encoding="utf-8").read().count("\n") == lineas_antes + 1
+    assert open(diario_eventos.ARCHIVO_DATASET, encoding="utf-8").read() == csv_antes
+
+    estado, _ = diario_eventos.sesion_en_curso()
+    assert estado["ErroresSesion"] == 1
+    assert estado["TareasCompletadas"] == 1
+    assert estado["TiempoPromedioAccion(s)"] == 2.5
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_compactacion_formato_dataset():
+    """Tras una venta y la compactación, el CSV tiene la sesión completada y una sesión nueva vacía"""
+    for duracion in (1.5, 2.5, 4.0):
+        registrar_evento("agregar_producto", duracion, True)
+    registrar_evento("compra_finalizada", 0.5, True)
+
+    # La venta completada se escribe en el diario sin esperar al escritor diferido
+    # Antes de compactar, leer_dataset ya refleja la sesión completada
+    df = diario_eventos.leer_dataset()
+    assert len(df) == 2
+    assert df.iloc[-2]["TareasCompletadas"] == 4
+    assert df.iloc[-1]["TareasCompletadas"] == 0
+
+    diario_eventos.compactar()
+    df = pd.read_csv(diario_eventos.ARCHIVO_DATASET)
+    assert list(df.columns) == diario_eventos.COLUMNAS_ALMACEN
+    assert len(df) == 2
+    assert df.iloc[-2]["TareasCompletadas"] == 4
+    # Promedio exacto de 1.5, 2.5, 4.0 y 0.5 (8.5 / 4), no del promedio ya redondeado
+    assert df.iloc[-2]["TiempoPromedioAccion(s)"] == 2.12
+    assert df.iloc[-2]["SumaDuracion(s)"] == 8.5
+    assert abs(diario_eventos.varianza_duracion(df.iloc[-2]) - 6.6875 / 3) < 1e-12
+    assert df.iloc[-1]["ErroresSesion"] == 0 and df.iloc[-1]["TareasCompletadas"] == 0
+
+    # El diario queda reducido al punto de control de la sesión abierta
+    cola = diario_eventos.leer_cola()
+    assert len(cola) == 1 and cola[0]["sesion"] == df.iloc[-1]["SesionID"]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cola_ignora_linea_truncada():
+    """Una línea a medio escribir (caída) no impide leer la sesión en curso"""
+    registrar_evento("agregar_producto", 2.0, True)
+    obtener_estado_sesion().persistir()
+    with open(diario_eventos.ARCHIVO_DIARIO, "a", encoding="utf-8") as f:
+        f.write('{"tipo": "evento", "sesion": "S_x", "dur')
+
+    estado, _ = diario_eventos.sesion_en_curso()
+    assert estado["TareasCompletadas"] == 1
+
+
+def test_acumuladores_exactos():
+    """Suma y varianza incrementales iguales a las calculadas sobre todas las duraciones"""
+    generador = random.Random(7)
+    duraciones = [generador.uniform(0.2, 12.0) for _ in range(500)]
+    estado = diario_eventos.estado_inicial(diario_eventos.marcador_sesion("S_prueba"))
+    for duracion in duraciones:
+        estado, tiempo = diario_eventos.aplicar_evento(estado, duracion, True)
+    assert abs(estado["SumaDuracion(s)"] / len(duraciones) - statistics.fmean(duraciones)) < 1e-9
+    assert abs(diario_eventos.varianza_duracion(estado) - statistics.variance(duraciones)) < 1e-9
+    assert abs(tiempo - statistics.fmean(duraciones)) < 1e-9
+
+    # Fila de un CSV anterior a los acumuladores: se parte de su promedio
+    antigua = {"SesionID": "S_vieja", "TiempoPromedioAccion(s)": 2.0, "ErroresSesion": 1,
+               "TareasCompletadas": 3, "NivelClasificado": "Novato"}
+    assert diario_eventos.acumuladores(antigua) == (4, 8.0, 0.0)
+    nueva, _ = diario_eventos.aplicar_evento(antigua, 7.0, True)
+    assert nueva["TiempoPromedioAccion(s)"] == 3.0
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cola_del_csv():
+    """leer_ultimas_filas devuelve las mismas filas que pd.read_csv(...).tail(n), con o sin salto final"""
+    os.makedirs("data")
+    filas = pd.DataFrame({
+        "SesionID": [f"S_{i:06d}" for i in range(20000)],
+        "TiempoPromedioAccion(s)": [round(1 + (i % 90) / 10, 2) for i in range(20000)],
+        "ErroresSesion": [i % 4 for i in range(20000)],
+        "TareasCompletadas": [i % 17 for i in range(20000)],
+        "NivelClasificado": [("Novato", "Intermedio", "Experto")[i % 3] for i in range(20000)],
+    })
+    filas.to_csv(diario_eventos.ARCHIVO_DATASET, index=False)
+    completo = pd.read_csv(diario_eventos.ARCHIVO_DATASET)
+    for n in (1, 2, 5):
+        cola = diario_eventos.leer_ultimas_filas(diario_eventos.ARCHIVO_DATASET, n)
+        esperadas = completo.tail(n).to_dict("records")
+        assert [{c: f[c] for c in diario_eventos.COLUMNAS_DATASET} for f in cola] == esperadas
+
+    # Sin salto de línea final, con una sola fila y solo con la cabecera
+    with open(diario_eventos.ARCHIVO_DATASET, "w", encoding="utf-8") as f:
+        f.write("SesionID,TiempoPromedioAccion(s),ErroresSesion,TareasCompletadas,NivelClasificado\nS_1,2.5,1,3,Novato")
+    cola = diario_eventos.leer_ultimas_filas(diario_eventos.ARCHIVO_DATASET, 2)
+    assert [f["SesionID"] for f in cola] == ["S_1"] and cola[0]["TareasCompletadas"] == 3
+    with open(diario_eventos.ARCHIVO_DATASET, "w", encoding="utf-8") as f:
+        f.write("SesionID,TiempoPromedioAccion(s),ErroresSesion,TareasCompletadas,NivelClasificado\n")
+    cola = diario_eventos.leer_ultimas_filas(diario_eventos.ARCHIVO_DATASET, 2)
+    assert cola == []
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_compactacion_copia_filas_anteriores():
+    """Un CSV sin acumuladores se completa una vez; después las filas que el diario no toca se copian tal cual"""
+    os.makedirs("data")
+    with open(diario_eventos.ARCHIVO_DATASET, "w", encoding="utf-8") as f:
+        f.write("SesionID,TiempoPromedioAccion(s),ErroresSesion,TareasCompletadas,NivelClasificado\n"
+                "S_1,2.5,1,3,Novato\nS_2,1.25,0,12,Experto\nS_3,0,0,0,\n")
+    registrar_evento("agregar_producto", 2.0, True)
+    registrar_evento("compra_finalizada", 1.0, True)
+    obtener_estado_sesion().persistir()
+    diario_eventos.compactar()
+
+    with open(diario_eventos.ARCHIVO_DATASET, encoding="utf-8") as f:
+        lineas = f.read().splitlines()
+    assert lineas[0] == ",".join(diario_eventos.COLUMNAS_ALMACEN)
+    # Acumuladores aproximados con el promedio de las filas anteriores
+    assert lineas[1:3] == ["S_1,2.5,1,3,Novato,10.0,0.0", "S_2,1.25,0,12,Experto,15.0,0.0"]
+    assert lineas[3].startswith("S_3,1.5,0,2,") and len(lineas) == 5
+
+    registrar_evento("agregar_producto", 3.0, True)
+    registrar_evento("compra_finalizada", 1.0, True)
+    obtener_estado_sesion().persistir()
+    diario_eventos.compactar()
+    with open(diario_eventos.ARCHIVO_DATASET, encoding="utf-8") as f:
+        nuevas = f.read().splitlines()
+    assert nuevas[:4] == lineas[:4] and len(nuevas) == 6
+    filas = diario_eventos.leer_filas()
+    assert [f["TareasCompletadas"] for f in filas] == [3, 12, 2, 2, 0]
+
+
+def escribir_diario_cortado(previas, linea, corte, sesion):
+    """
+    Escribe en el diario las líneas previas, `linea` y eventos de `sesion` de
+    modo que el primer bloque leído desde el final empiece `corte` bytes
+    dentro de `linea`. Devuelve el número de eventos escritos después.
+    """
+    evento = {"tipo": "evento", "sesion": sesion, "evento": "agregar_producto",
+              "duracion": 1.0, "exito": True, "tiempo_activo": None}
+    tamano_evento = len(json.dumps(evento) + "\n")
+    objetivo = diario_eventos._BLOQUE_COLA - (len(linea) - corte)
+    cantidad = objetivo // tamano_evento
+    relleno = objetivo - cantidad * tamano_evento
+    eventos = [dict(evento) for _ in range(cantidad)]
+    eventos[-1]["evento"] += "x" * relleno
+    cola = "".join(json.dumps(e) + "\n" for e in eventos)
+    assert len(linea) - corte + len(cola) == diario_eventos._BLOQUE_COLA
+    os.makedirs("data", exist_ok=True)
+    with open(diario_eventos.ARCHIVO_DIARIO, "w", encoding="utf-8") as f:
+        f.write("".join(previas) + linea + cola)
+    return cantidad
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cola_con_marcador_cortado_por_el_bloque():
+    """Un marcador que empieza justo antes del límite de un bloque no se pierde"""
+    previas = [json.dumps(diario_eventos.marcador_sesion("S_anterior")) + "\n"]
+    linea = json.dumps(diario_eventos.marcador_sesion("S_actual", anterior="S_anterior")) + "\n"
+    cantidad = escribir_diario_cortado(previas, linea, 1, "S_actual")
+
+    estado, marcador = diario_eventos.sesion_en_curso()
+    assert marcador["sesion"] == "S_actual"
+    assert estado["TareasCompletadas"] == cantidad
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_cola_con_lote_cortado_por_el_bloque():
+    """El lote de una venta cortado por el límite de un bloque antes de su marcador no pierde la sesión en curso"""
+    previas = [json.dumps(diario_eventos.marcador_sesion("S_anterior")) + "\n"]
+    venta = diario_eventos.lote([
+        {"tipo": "evento", "sesion": "S_anterior", "evento": "compra_finalizada",
+         "duracion": 1.0, "exito": True, "tiempo_activo": None},
+        diario_eventos.marcador_sesion("S_actual", nivel="Experto", anterior="S_anterior"),
+        {"tipo": "nivel", "sesion": "S_anterior", "nivel": "Intermedio"},
+    ])
+    linea = json.dumps(venta) + "\n"
+    # El bloque empieza dentro del lote, antes del texto del marcador
+    corte = linea.index('"tipo": "inicio_sesion"') // 2
+    cantidad = escribir_diario_cortado(previas, linea, corte, "S_actual")
+
+    estado, marcador = diario_eventos.sesion_en_curso()
+    assert marcador["sesion"] == "S_actual"
+    assert estado["TareasCompletadas"] == cantidad and estado["NivelClasificado"] == "Experto"
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Diario de eventos correcto")
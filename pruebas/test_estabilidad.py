@@ -1,25 +1,57 @@
 """
 Prueba de Estabilidad del Sistema POS Adaptativo
 Simula 30+ sesiones consecutivas y verifica integridad de datos
+
+Modos adicionales (en un directorio de datos temporal):
+    python pruebas/test_estabilidad.py --prolongada [--sesiones 200000] [--muestreo 1000]
+        Prueba prolongada: cientos de miles de sesiones (millones de eventos) por
+        registrar_evento() y evaluar_y_asignar(), con memoria (RSS), descriptores
+        abiertos y latencia por operación a lo largo del tiempo; marca lo que
+        crece linealmente.
+    python pruebas/test_estabilidad.py --fallos [--rondas 5] [--punto csv|diario]
+        Inyección de fallos: un proceso hijo registra ventas y se lo mata
+        (SIGKILL) a mitad de escribir el CSV en la compactación (o de un anexado al
+        diario); se recupera el historial y se comprueba que no falte ninguna
+        sesión completada.
 """
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import argparse
+import io
+import json
 import pandas as pd
+import signal
+import subprocess
+import tempfile
+import threading
 import time
 import random
 from datetime import datetime
-from src.logger import registrar_evento
+from src.logger import registrar_evento, finalizar_venta
 from src.adaptador import evaluar_y_asignar
+from src.diario_eventos import COLUMNAS_DATASET
+from src.estado_sesion import obtener_estado_terminal
+
+# Cajeros simulados
+PERFILES = {
+    "novato": {"acciones": (5, 10), "tiempo": (6, 10), "prob_error": 0.4},
+    "intermedio": {"acciones": (10, 20), "tiempo": (3, 7), "prob_error": 0.2},
+    "experto": {"acciones": (15, 30), "tiempo": (1, 3), "prob_error": 0.05},
+}
+
+TIPOS_EVENTO = [
+    "agregar_producto_carrito", "eliminar_producto_carrito",
+    "aumentar_cantidad", "disminuir_cantidad", "ir_a_pago",
+]
 
 class TestEstabilidad:
     def __init__(self, num_sesiones=30):
         self.num_sesiones = num_sesiones
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.archivo_log = f"pruebas/logs/estabilidad_{self.timestamp}.log"
-        self.archivo_csv = "data/dataset_pos.csv"
         
         # Crear carpetas
         os.makedirs("pruebas/logs", exist_ok=True)
@@ -39,42 +71,11 @@ class TestEstabilidad:
         with open(self.archivo_log, "a", encoding="utf-8") as f:
             f.write(linea + "\n")
     
-    def obtener_contenido_csv(self):
-        """Lee el contenido actual del CSV"""
-        if os.path.exists(self.archivo_csv):
-            try:
-                df = pd.read_csv(self.archivo_csv)
-                return df
-            except:
-                return pd.DataFrame()
-        return pd.DataFrame()
-    
-    def forzar_append_csv(self, nueva_fila_dict):
-        """Fuerza el append de una nueva fila al CSV sin sobrescribir"""
-        try:
-            # Leer CSV existente
-            if os.path.exists(self.archivo_csv):
-                df_existente = pd.read_csv(self.archivo_csv)
-            else:
-                # Si no existe, crear con columnas correctas
-                df_existente = pd.DataFrame(columns=[
-                    'SesionID', 'TiempoPromedioAccion(s)', 
-                    'ErroresSesion', 'TareasCompletadas', 'NivelClasificado'
-                ])
-            
-            # Crear DataFrame con la nueva fila
-            df_nueva = pd.DataFrame([nueva_fila_dict])
-            
-            # Concatenar
-            df_completo = pd.concat([df_existente, df_nueva], ignore_index=True)
-            
-            # Guardar sobrescribiendo el archivo completo
-            df_completo.to_csv(self.archivo_csv, index=False)
-            
-            return True
-        except Exception as e:
-            self.log(f"❌ ERROR al forzar append: {str(e)}")
-            return False
+    def sesiones_almacenadas(self):
+        """Sesiones del historial leídas por el almacenamiento (dataset + diario)"""
+        estado_sesion = obtener_estado_terminal()
+        estado_sesion.persistir()
+        return estado_sesion.almacen.filas()
     
     def simular_sesion(self, sesion_id, perfil="aleatorio"):
         """Simula una sesión completa de usuario"""
@@ -85,36 +86,19 @@ class TestEstabilidad:
         if perfil == "aleatorio":
             perfil = random.choice(["novato", "intermedio", "experto"])
         
-        if perfil == "novato":
-            num_acciones = random.randint(5, 10)
-            rango_tiempo = (6, 10)
-            prob_error = 0.4
-        elif perfil == "intermedio":
-            num_acciones = random.randint(10, 20)
-            rango_tiempo = (3, 7)
-            prob_error = 0.2
-        else:  # experto
-            num_acciones = random.randint(15, 30)
-            rango_tiempo = (1, 3)
-            prob_error = 0.05
-        
-        # Contar filas antes de empezar
-        df_antes = self.obtener_contenido_csv()
-        filas_antes = len(df_antes)
-        self.log(f"📊 Registros en CSV antes: {filas_antes}")
+        datos_perfil = PERFILES[perfil]
+        num_acciones = random.randint(*datos_perfil["acciones"])
+        rango_tiempo = datos_perfil["tiempo"]
+        prob_error = datos_perfil["prob_error"]
         
         # Simular acciones
         tiempo_activo_acumulado = 0
         tiempo_ultima_accion = time.time()
         errores_totales = 0
         tareas_completadas = 0
-        tiempos_accion = []
         
         for i in range(num_acciones):
-            tipo_evento = random.choice([
-                "agregar_producto_carrito", "eliminar_producto_carrito", 
-                "aumentar_cantidad", "disminuir_cantidad", "ir_a_pago"
-            ])
+            tipo_evento = random.choice(TIPOS_EVENTO)
             
             duracion = random.uniform(*rango_tiempo)
             exito = random.random() > prob_error
@@ -127,12 +111,11 @@ class TestEstabilidad:
             tiempo_activo = tiempo_activo_acumulado if tiempo_activo_acumulado > 0 else None
             tiempo_ultima_accion = ahora
             
-            # Registrar evento (esto NO debería escribir en el CSV aún)
+            # Registrar evento (queda en la sesión en curso, no es una sesión nueva)
             try:
                 registrar_evento(tipo_evento, duracion, exito, tiempo_activo)
                 
                 # Acumular métricas
-                tiempos_accion.append(duracion)
                 if exito:
                     tareas_completadas += 1
                 else:
@@ -142,55 +125,35 @@ class TestEstabilidad:
             except Exception as e:
                 self.log(f"❌ ERROR en acción {i+1}: {str(e)}")
         
-        # Finalizar sesión
+        # Finalizar sesión: venta, clasificación y sesión nueva en una sola escritura
         try:
-            tiempo_activo_final = tiempo_activo_acumulado if tiempo_activo_acumulado > 0 else None
-            registrar_evento("compra_finalizada", 0.5, True, tiempo_activo_final)
-            
-            # Evaluar y obtener nivel
-            interfaz, nivel = evaluar_y_asignar()
+            # La sesión en curso ya está almacenada; la venta agrega la siguiente
+            filas_antes = len(self.sesiones_almacenadas())
+            self.log(f"📊 Sesiones almacenadas antes de la venta: {filas_antes}")
             
-            # Determinar nivel clasificado
-            if nivel <= 0.33:
-                nivel_texto = "Novato"
-            elif nivel <= 0.66:
-                nivel_texto = "Intermedio"
-            else:
-                nivel_texto = "Experto"
-            
-            # Calcular tiempo promedio
-            tiempo_promedio = sum(tiempos_accion) / len(tiempos_accion) if tiempos_accion else 0
+            tiempo_activo_final = tiempo_activo_acumulado if tiempo_activo_acumulado > 0 else None
+            resultados, _ = finalizar_venta([{
+                "tipo_evento": "compra_finalizada", "duracion": 0.5,
+                "exito": True, "tiempo_activo": tiempo_activo_final,
+            }])
+            completada = resultados[-1][1]
             
-            # Crear nueva fila manualmente
-            sesion_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            nueva_fila = {
-                'SesionID': f'S_{sesion_timestamp}',
-                'TiempoPromedioAccion(s)': round(tiempo_promedio, 2),
-                'ErroresSesion': errores_totales,
-                'TareasCompletadas': tareas_completadas,
-                'NivelClasificado': nivel_texto
-            }
+            # Verificar lo que quedó en el almacenamiento
+            filas = self.sesiones_almacenadas()
+            fila = next((f for f in reversed(filas) if f["SesionID"] == completada), None)
             
-            # FORZAR el append al CSV
-            if self.forzar_append_csv(nueva_fila):
-                # Verificar que se agregó
-                df_despues = self.obtener_contenido_csv()
-                filas_despues = len(df_despues)
-                
-                if filas_despues > filas_antes:
-                    self.log(f"✅ Sesión {sesion_id} ingresada correctamente al CSV")
-                    self.log(f"   ID: {nueva_fila['SesionID']}")
-                    self.log(f"   Nivel: {nivel_texto}")
-                    self.log(f"   Total de registros en CSV: {filas_despues}")
-                    self.sesiones_exitosas += 1
-                    return True
-                else:
-                    self.log(f"❌ ERROR: Sesión {sesion_id} NO se ingresó al CSV")
-                    self.log(f"   Filas antes: {filas_antes}, Filas después: {filas_despues}")
-                    self.sesiones_fallidas += 1
-                    return False
+            if len(filas) == filas_antes + 1 and fila is not None \
+                    and fila["ErroresSesion"] == errores_totales \
+                    and fila["TareasCompletadas"] == tareas_completadas + 1:
+                self.log(f"✅ Sesión {sesion_id} almacenada correctamente")
+                self.log(f"   ID: {completada}")
+                self.log(f"   Nivel: {fila['NivelClasificado'] or '-'}")
+                self.log(f"   Total de sesiones almacenadas: {len(filas)}")
+                self.sesiones_exitosas += 1
+                return True
             else:
-                self.log(f"❌ ERROR: No se pudo forzar el append de sesión {sesion_id}")
+                self.log(f"❌ ERROR: Sesión {sesion_id} no quedó almacenada como se registró")
+                self.log(f"   Sesiones antes: {filas_antes}, después: {len(filas)}, fila: {fila}")
                 self.sesiones_fallidas += 1
                 return False
                 
@@ -218,20 +181,20 @@ class TestEstabilidad:
         tiempo_fin = time.time()
         tiempo_total = tiempo_fin - tiempo_inicio
         
-        # Mostrar CSV final
+        # Mostrar el historial final
         self.log(f"\n{'='*70}")
-        self.log("📄 CONTENIDO FINAL DEL CSV")
+        self.log("📄 CONTENIDO FINAL DEL HISTORIAL")
         self.log(f"{'='*70}")
         
         try:
-            df_final = self.obtener_contenido_csv()
+            df_final = pd.DataFrame(self.sesiones_almacenadas(), columns=COLUMNAS_DATASET)
             self.log(f"\nTotal de registros: {len(df_final)}\n")
             self.log("Primeros 5 registros:")
             self.log(df_final.head().to_string())
             self.log(f"\nÚltimos 5 registros:")
             self.log(df_final.tail().to_string())
         except Exception as e:
-            self.log(f"❌ Error al mostrar CSV: {str(e)}")
+            self.log(f"❌ Error al mostrar el historial: {str(e)}")
         
         # Resumen final
         self.log(f"\n{'='*70}")
@@ -246,22 +209,466 @@ class TestEstabilidad:
         else:
             self.log(f"\n⚠️  ❌ HUBO ERRORES EN {self.sesiones_fallidas} SESIONES\n")
 
+DIRECTORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def simular_venta(aleatorio, perfil=None, latencias=None):
+    """
+    Una venta completa de un cajero con registrar_evento() y evaluar_y_asignar().
+    Con latencias (dict de listas) guarda la duración de cada operación.
+    Devuelve (sesion_id, datos de la sesión completada, eventos registrados).
+    """
+    datos_perfil = PERFILES[perfil or aleatorio.choice(list(PERFILES))]
+    tiempo_activo = 0.0
+    eventos = 0
+    for _ in range(aleatorio.randint(*datos_perfil["acciones"])):
+        duracion = round(aleatorio.uniform(*datos_perfil["tiempo"]), 2)
+        tiempo_activo += duracion
+        inicio = time.perf_counter()
+        registrar_evento(aleatorio.choice(TIPOS_EVENTO), duracion,
+                         aleatorio.random() > datos_perfil["prob_error"], round(tiempo_activo, 2))
+        if latencias is not None:
+            latencias["registrar_evento"].append(time.perf_counter() - inicio)
+        eventos += 1
+
+    inicio = time.perf_counter()
+    _, sesion_id, datos = registrar_evento("compra_finalizada", 0.5, True, round(tiempo_activo, 2))
+    if latencias is not None:
+        latencias["venta"].append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    evaluar_y_asignar(silencioso=True)
+    if latencias is not None:
+        latencias["evaluar_y_asignar"].append(time.perf_counter() - inicio)
+    return sesion_id, datos, eventos + 1
+
+
+def _memoria_residente_mb():
+    """RSS actual del proceso (/proc); sin /proc, el pico de getrusage()"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2 ** 20 if sys.platform == "darwin" else pico / 1024
+
+
+def _descriptores_abiertos():
+    for directorio in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(directorio))
+        except OSError:
+            continue
+    return None
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def crecimiento_lineal(xs, ys, umbral_relativo, minimo_absoluto, descarte=0.2):
+    """
+    ¿ys crece linealmente con xs? Recta de mínimos cuadrados sin las primeras
+    muestras (calentamiento): crece si la pendiente es positiva, el ajuste es
+    bueno (r² >= 0.8) y el crecimiento de la recta supera minimo_absoluto y
+    umbral_relativo del valor inicial. Devuelve (crece, pendiente, r2, crecimiento).
+    """
+    inicio = int(len(xs) * descarte)
+    xs, ys = xs[inicio:], ys[inicio:]
+    if len(xs) < 5:
+        return False, 0.0, 0.0, 0.0
+    n = len(xs)
+    media_x = sum(xs) / n
+    media_y = sum(ys) / n
+    sxx = sum((x - media_x) ** 2 for x in xs)
+    syy = sum((y - media_y) ** 2 for y in ys)
+    sxy = sum((x - media_x) * (y - media_y) for x, y in zip(xs, ys))
+    if sxx == 0 or syy == 0:
+        return False, 0.0, 0.0, 0.0
+    pendiente = sxy / sxx
+    r2 = sxy * sxy / (sxx * syy)
+    crecimiento = pendiente * (xs[-1] - xs[0])
+    inicial = media_y + pendiente * (xs[0] - media_x)
+    crece = pendiente > 0 and r2 >= 0.8 and crecimiento > max(minimo_absoluto, umbral_relativo * abs(inicial))
+    return crece, pendiente, r2, crecimiento
+
+
+def _guardar_resultado(prefijo, informe):
+    os.makedirs(os.path.join(DIRECTORIO_RAIZ, "pruebas", "resultados"), exist_ok=True)
+    archivo = os.path.join(DIRECTORIO_RAIZ, "pruebas", "resultados",
+                           f"{prefijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(archivo, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en: {archivo}")
+    return archivo
+
+
+class PruebaProlongada:
+    """Cientos de miles de sesiones seguidas, con recursos y latencias por ventana"""
+
+    # Métrica de cada muestra -> (umbral relativo, mínimo absoluto) para marcar crecimiento
+    CRITERIOS = {
+        "rss_mb": (0.10, 5.0),
+        "descriptores": (0.0, 3),
+        "registrar_evento_p50_ms": (0.5, 0.05),
+        "venta_p50_ms": (0.5, 0.1),
+        "evaluar_y_asignar_p50_ms": (0.5, 0.1),
+    }
+
+    def __init__(self, num_sesiones=200000, muestreo=1000, semilla=None):
+        self.num_sesiones = num_sesiones
+        self.muestreo = muestreo      # sesiones por muestra
+        self.aleatorio = random.Random(semilla)
+        self.muestras = []
+        self.alertas = []
+        self.sesiones_almacenadas = None
+
+    def _muestra(self, sesiones, eventos, inicio, latencias):
+        muestra = {
+            "sesiones": sesiones,
+            "eventos": eventos,
+            "segundos": round(time.perf_counter() - inicio, 2),
+            "rss_mb": round(_memoria_residente_mb(), 2),
+            "descriptores": _descriptores_abiertos(),
+            "dataset_kb": round(os.path.getsize("data/dataset_pos.csv") / 1024, 1)
+            if os.path.exists("data/dataset_pos.csv") else 0.0,
+        }
+        for operacion, valores in latencias.items():
+            muestra[f"{operacion}_p50_ms"] = round(_percentil(valores, 50) * 1000, 3)
+            muestra[f"{operacion}_p99_ms"] = round(_percentil(valores, 99) * 1000, 3)
+            valores.clear()
+        self.muestras.append(muestra)
+        print(f"{sesiones:>9} {eventos:>10} {muestra['segundos']:>9} {muestra['rss_mb']:>8} "
+              f"{muestra['descriptores']!s:>5} {muestra['dataset_kb']:>10} "
+              f"{muestra['registrar_evento_p50_ms']:>8} {muestra['venta_p50_ms']:>8} "
+              f"{muestra['evaluar_y_asignar_p50_ms']:>8} {muestra['evaluar_y_asignar_p99_ms']:>8}")
+
+    def ejecutar(self):
+        from src.registro import configurar_registro
+        from src.estado_sesion import obtener_estado_sesion, persistir_todo
+
+        print("\n" + "=" * 70)
+        print("🧪 PRUEBA PROLONGADA - Sistema POS Adaptativo")
+        print("=" * 70)
+        print(f"📊 {self.num_sesiones} sesiones, una muestra cada {self.muestreo}")
+        print(f"\n{'sesiones':>9} {'eventos':>10} {'segundos':>9} {'rss MB':>8} {'fds':>5} "
+              f"{'dataset KB':>10} {'evt p50':>8} {'vta p50':>8} {'eval p50':>8} {'eval p99':>8}")
+
+        # Los errores del motor difuso ante combinaciones sin regla irían al registro en cada venta
+        configurar_registro(nivel="CRITICAL")
+        anterior = os.getcwd()
+        with tempfile.TemporaryDirectory() as directorio:
+            os.chdir(directorio)
+            try:
+                latencias = {"registrar_evento": [], "venta": [], "evaluar_y_asignar": []}
+                inicio = time.perf_counter()
+                eventos = 0
+                for sesion in range(1, self.num_sesiones + 1):
+                    eventos += simular_venta(self.aleatorio, latencias=latencias)[2]
+                    if sesion % self.muestreo == 0 or sesion == self.num_sesiones:
+                        self._muestra(sesion, eventos, inicio, latencias)
+                persistir_todo()
+                self.sesiones_almacenadas = obtener_estado_sesion("data/dataset_pos.csv").almacen.contar_sesiones()
+            finally:
+                persistir_todo()
+                os.chdir(anterior)
+                configurar_registro()
+        return self.analizar()
+
+    def analizar(self):
+        """Marca las métricas que crecen linealmente con el número de sesiones"""
+        xs = [m["sesiones"] for m in self.muestras]
+        tendencias = {}
+        self.alertas = []
+        for metrica, (umbral, minimo) in self.CRITERIOS.items():
+            ys = [m[metrica] for m in self.muestras if m.get(metrica) is not None]
+            if len(ys) != len(xs):
+                continue
+            crece, pendiente, r2, crecimiento = crecimiento_lineal(xs, ys, umbral, minimo)
+            tendencias[metrica] = {"crece": crece, "pendiente_por_1000_sesiones": round(pendiente * 1000, 4),
+                                   "r2": round(r2, 3), "crecimiento": round(crecimiento, 3)}
+            if crece:
+                self.alertas.append(metrica)
+
+        print(f"\n{'=' * 70}")
+        print(f"💾 Sesiones en el historial: {self.sesiones_almacenadas}")
+        for metrica, tendencia in tendencias.items():
+            marca = "⚠️  CRECE" if tendencia["crece"] else "✅ estable"
+            print(f"   {metrica:<28} {marca:<12} {tendencia['crecimiento']:+} "
+                  f"(r²={tendencia['r2']}, {tendencia['pendiente_por_1000_sesiones']} cada 1000 sesiones)")
+        return {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "sesiones": self.num_sesiones,
+            "sesiones_almacenadas": self.sesiones_almacenadas,
+            "muestras": self.muestras,
+            "tendencias": tendencias,
+            "alertas": self.alertas,
+        }
+
+
+class InyeccionFallos:
+    """Mata un proceso que registra ventas a mitad de una escritura y verifica la recuperación"""
+
+    PUNTOS = ("csv", "diario")
+
+    def __init__(self, rondas=5, punto="csv", semilla=None, espera_maxima=120):
+        if punto not in self.PUNTOS:
+            raise ValueError(f"Punto de fallo desconocido: {punto}")
+        self.rondas = rondas
+        self.punto = punto
+        self.aleatorio = random.Random(semilla)
+        self.espera_maxima = espera_maxima
+        self.completadas = {}     # SesionID -> (errores, tareas) de toda venta confirmada
+        self.resultados = []
+
+    def _lanzar_hijo(self, directorio):
+        """Ejecuta el hijo hasta que avisa que quedó a mitad de escritura y lo mata (SIGKILL)"""
+        llamada = self.aleatorio.randint(2, 6)
+        proceso = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--hijo-fallo",
+             directorio, self.punto, str(llamada), str(self.aleatorio.randrange(2 ** 31))],
+            stdout=subprocess.PIPE, text=True,
+        )
+        limite = threading.Timer(self.espera_maxima, proceso.kill)
+        limite.start()
+        confirmadas = 0
+        interrumpido = False
+        try:
+            for linea in proceso.stdout:
+                partes = linea.split()
+                if partes and partes[0] == "completa":
+                    self.completadas[partes[1]] = (int(partes[2]), int(partes[3]))
+                    confirmadas += 1
+                elif partes and partes[0] == "interrumpido":
+                    interrumpido = True
+                    break
+        finally:
+            proceso.kill()
+            proceso.wait()
+            proceso.stdout.close()
+            limite.cancel()
+        return llamada, confirmadas, interrumpido
+
+    def _verificar(self, almacen):
+        """Sesiones confirmadas que faltan o cuyos contadores no coinciden"""
+        filas = {str(f["SesionID"]): f for f in almacen.filas()}
+        faltantes = [s for s in self.completadas if s not in filas]
+        distintas = [
+            s for s, (errores, tareas) in self.completadas.items()
+            if s in filas and (int(filas[s]["ErroresSesion"]), int(filas[s]["TareasCompletadas"])) != (errores, tareas)
+        ]
+        return faltantes, distintas
+
+    def _ronda(self, numero):
+        from src.estado_sesion import obtener_estado_sesion, persistir_todo
+
+        llamada, confirmadas, interrumpido = self._lanzar_hijo(os.getcwd())
+        datos = "data"
+        temporales = [n for n in os.listdir(datos) if n.endswith(".tmp")]
+        diario = os.path.join(datos, "eventos_pos.jsonl")
+        with open(diario, "rb") as f:
+            contenido = f.read()
+        linea_incompleta = bool(contenido) and not contenido.endswith(b"\n")
+        try:
+            pd.read_csv(os.path.join(datos, "dataset_pos.csv"))
+            csv_legible = True
+        except Exception:
+            csv_legible = False
+
+        # Recuperación: cargar el historial como lo haría el servidor al reiniciar
+        estado = obtener_estado_sesion("data/dataset_pos.csv").cargar(forzar=True)
+        faltantes, distintas = self._verificar(estado.almacen)
+        restos = [n for n in os.listdir(datos) if n.endswith(".tmp")]
+
+        # El historial recuperado sigue aceptando ventas y compactaciones
+        for _ in range(2):
+            sesion_id, datos_sesion, _ = simular_venta(self.aleatorio)
+            self.completadas[sesion_id] = (int(datos_sesion["ErroresSesion"]), int(datos_sesion["TareasCompletadas"]))
+        persistir_todo()
+        ids_csv = set(pd.read_csv(os.path.join(datos, "dataset_pos.csv"))["SesionID"].astype(str))
+        faltantes_compactado = [s for s in self.completadas if s not in ids_csv]
+
+        resultado = {
+            "ronda": numero,
+            "punto": self.punto,
+            "llamada_interrumpida": llamada,
+            "interrumpido": interrumpido,
+            "ventas_confirmadas": confirmadas,
+            "temporales": len(temporales),
+            "linea_incompleta": linea_incompleta,
+            "csv_legible": csv_legible,
+            "faltantes": faltantes,
+            "distintas": distintas,
+            "restos_despues": restos,
+            "faltantes_despues_de_compactar": faltantes_compactado,
+        }
+        resultado["ok"] = (interrumpido and csv_legible and not faltantes and not distintas
+                           and not restos and not faltantes_compactado)
+        self.resultados.append(resultado)
+        print(f"{'✅' if resultado['ok'] else '❌'} Ronda {numero}: {confirmadas} ventas confirmadas, "
+              f"muerto en la llamada {llamada} a {self.punto} "
+              f"({len(temporales)} temporales, línea incompleta: {'sí' if linea_incompleta else 'no'}); "
+              f"faltan {len(faltantes)}, distintas {len(distintas)}, "
+              f"{len(self.completadas)} sesiones verificadas")
+        return resultado
+
+    def ejecutar(self):
+        from src.registro import configurar_registro
+        from src.estado_sesion import persistir_todo
+
+        print("\n" + "=" * 70)
+        print(f"💥 INYECCIÓN DE FALLOS - muerte a mitad de {self.punto}")
+        print("=" * 70)
+        configurar_registro(nivel="CRITICAL")
+        anterior = os.getcwd()
+        with tempfile.TemporaryDirectory() as directorio:
+            os.chdir(directorio)
+            try:
+                for numero in range(1, self.rondas + 1):
+                    self._ronda(numero)
+            finally:
+                persistir_todo()
+                os.chdir(anterior)
+                configurar_registro()
+        return {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "punto": self.punto,
+            "rondas": self.resultados,
+            "ok": all(r["ok"] for r in self.resultados),
+        }
+
+
+def _proceso_hijo_fallo(directorio, punto, llamada, semilla):
+    """
+    Proceso hijo de InyeccionFallos: registra ventas (una línea "completa" por
+    venta confirmada) y en la llamada indicada a la escritura del CSV o al anexado del diario
+    escribe la mitad, avisa "interrumpido" y espera a que lo maten.
+    """
+    from src import diario_eventos
+    from src.config import actualizar_config
+    from src.registro import configurar_registro
+
+    os.chdir(directorio)
+    configurar_registro(nivel="CRITICAL")
+    # Compactar después de cada venta, para llegar pronto a la llamada indicada
+    actualizar_config(intervalo_compactacion_s=0)
+    llamadas = [0]
+
+    def colgar():
+        print("interrumpido", flush=True)
+        time.sleep(3600)
+
+    if punto == "csv":
+        original = diario_eventos.escribir_atomico
+
+        def escribir_atomico(ruta, escribir, **kwargs):
+            if not ruta.endswith(".csv"):
+                return original(ruta, escribir, **kwargs)
+            llamadas[0] += 1
+            if llamadas[0] < llamada:
+                return original(ruta, escribir, **kwargs)
+
+            def escribir_mitad(destino):
+                texto = io.StringIO()
+                escribir(texto)
+                destino.write(texto.getvalue()[:len(texto.getvalue()) // 2])
+                destino.flush()
+                os.fsync(destino.fileno())
+                colgar()
+            return original(ruta, escribir_mitad, **kwargs)
+        diario_eventos.escribir_atomico = escribir_atomico
+    else:
+        original = diario_eventos.anexar
+
+        def anexar(registros, archivo=diario_eventos.ARCHIVO_DIARIO):
+            llamadas[0] += 1
+            if llamadas[0] < llamada:
+                return original(registros, archivo)
+            lineas = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+            with diario_eventos.lock_diario(archivo):
+                with open(archivo, "a", encoding="utf-8") as f:
+                    f.write(lineas[:max(1, len(lineas) // 2)])
+                    f.flush()
+                    os.fsync(f.fileno())
+                    colgar()
+        diario_eventos.anexar = anexar
+
+    aleatorio = random.Random(semilla)
+    while True:
+        sesion_id, datos, _ = simular_venta(aleatorio)
+        # registrar_evento() ya escribió la venta en el diario (sincronizada a disco)
+        print(f"completa {sesion_id} {int(datos['ErroresSesion'])} {int(datos['TareasCompletadas'])}", flush=True)
+
+
+def test_prolongada_corta():
+    """Versión corta de la prueba prolongada: sin pérdidas y sin fugas de descriptores"""
+    prueba = PruebaProlongada(num_sesiones=150, muestreo=25, semilla=1)
+    informe = prueba.ejecutar()
+    assert len(informe["muestras"]) == 6
+    # Las 150 completadas más la sesión en curso
+    assert informe["sesiones_almacenadas"] == 151
+    assert "descriptores" not in informe["alertas"], informe["tendencias"]
+
+
+def test_fallo_durante_escritura_csv():
+    """Muerto a mitad de la compactación: el CSV sigue legible y no falta ninguna venta"""
+    informe = InyeccionFallos(rondas=2, punto="csv", semilla=3).ejecutar()
+    assert informe["ok"], informe
+    assert all(r["temporales"] > 0 for r in informe["rondas"]), informe
+
+
+def test_fallo_durante_anexado():
+    """Muerto a mitad de un anexado al diario: la línea incompleta se descarta al recuperar"""
+    informe = InyeccionFallos(rondas=2, punto="diario", semilla=5).ejecutar()
+    assert informe["ok"], informe
+
+
 if __name__ == "__main__":
-    print("\n" + "="*70)
-    print("🧪 PRUEBA DE ESTABILIDAD - Sistema POS Adaptativo")
-    print("="*70)
-    print("\nEsta prueba simulará sesiones y las ingresará en el CSV.\n")
+    parser = argparse.ArgumentParser(description="Prueba de estabilidad del Sistema POS Adaptativo")
+    parser.add_argument("--prolongada", action="store_true", help="Prueba prolongada con muestras de recursos")
+    parser.add_argument("--sesiones", type=int, default=200000)
+    parser.add_argument("--muestreo", type=int, default=1000, help="Sesiones por muestra")
+    parser.add_argument("--fallos", action="store_true", help="Inyección de fallos a mitad de escritura")
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--punto", choices=InyeccionFallos.PUNTOS, default="csv")
+    parser.add_argument("--semilla", type=int)
+    parser.add_argument("--hijo-fallo", nargs=4, help=argparse.SUPPRESS)
+    argumentos = parser.parse_args()
+
+    if argumentos.hijo_fallo:
+        directorio, punto, llamada, semilla = argumentos.hijo_fallo
+        _proceso_hijo_fallo(directorio, punto, int(llamada), int(semilla))
+    elif argumentos.prolongada:
+        prueba = PruebaProlongada(argumentos.sesiones, argumentos.muestreo, argumentos.semilla)
+        informe = prueba.ejecutar()
+        _guardar_resultado("prolongada", informe)
+        sys.exit(1 if informe["alertas"] else 0)
+    elif argumentos.fallos:
+        informe = InyeccionFallos(argumentos.rondas, argumentos.punto, argumentos.semilla).ejecutar()
+        _guardar_resultado("fallos", informe)
+        print("\n✅ Historial recuperado sin perder sesiones completadas" if informe["ok"]
+              else "\n❌ Se perdieron o alteraron sesiones completadas")
+        sys.exit(0 if informe["ok"] else 1)
+    else:
+        print("\n" + "="*70)
+        print("🧪 PRUEBA DE ESTABILIDAD - Sistema POS Adaptativo")
+        print("="*70)
+        print("\nEsta prueba simulará sesiones y las ingresará en el historial.\n")
     
-    respuesta = input("¿Deseas continuar? (s/n): ")
+        respuesta = input("¿Deseas continuar? (s/n): ")
     
-    if respuesta.lower() == 's':
-        num_sesiones = input("\n¿Cuántas sesiones deseas simular? (default: 30): ")
-        num_sesiones = int(num_sesiones) if num_sesiones.strip() else 30
+        if respuesta.lower() == 's':
+            num_sesiones = input("\n¿Cuántas sesiones deseas simular? (default: 30): ")
+            num_sesiones = int(num_sesiones) if num_sesiones.strip() else 30
         
-        test = TestEstabilidad(num_sesiones=num_sesiones)
-        test.ejecutar()
+            test = TestEstabilidad(num_sesiones=num_sesiones)
+            test.ejecutar()
         
-        print(f"\n✅ Prueba completada. Revisa el log en:")
-        print(f"   📄 {test.archivo_log}")
-    else:
-        print("\n❌ Prueba cancelada")
\ No newline at end of file
+            print(f"\n✅ Prueba completada. Revisa el log en:")
+            print(f"   📄 {test.archivo_log}")
+        else:
+            print("\n❌ Prueba cancelada")
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Prueba del estado de sesión en memoria con escritura diferida
+Verifica que las lecturas no dependan del disco y que, tras volcar la cola,
+un estado recién cargado coincida con el que estaba en memoria
+"""
+import sys
+import os
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import diario_eventos
+from src.logger import registrar_evento
+from src.estado_sesion import EstadoSesion, obtener_estado_sesion
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_estado_recargado_igual_al_de_memoria():
+    """Lo que se vuelca al diario reconstruye exactamente el estado en memoria"""
+    for duracion, exito in ((1.5, True), (2.5, False), (4.0, True)):
+        registrar_evento("agregar_producto", duracion, exito)
+    registrar_evento("compra_finalizada", 0.5, True)
+    registrar_evento("agregar_producto", 3.0, True)
+
+    estado_sesion = obtener_estado_sesion()
+    en_memoria = estado_sesion.ultimas_filas()
+    estado_sesion.persistir()
+
+    recargado = EstadoSesion().cargar().ultimas_filas()
+    assert len(recargado) == 2
+    for memoria, disco in zip(en_memoria, recargado):
+        assert str(memoria["SesionID"]) == str(disco["SesionID"])
+        assert memoria["ErroresSesion"] == disco["ErroresSesion"]
+        assert memoria["TareasCompletadas"] == disco["TareasCompletadas"]
+        assert abs(memoria["TiempoPromedioAccion(s)"] - disco["TiempoPromedioAccion(s)"]) < 1e-9
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_reiniciar_descarta_pendientes():
+    """/reset borra dataset y diario y no deja eventos pendientes en la cola"""
+    registrar_evento("agregar_producto", 2.0, True)
+    estado_sesion = obtener_estado_sesion()
+    estado_sesion.reiniciar()
+
+    assert not estado_sesion.existe
+    assert estado_sesion.pendientes == []
+    assert not os.path.exists(diario_eventos.ARCHIVO_DIARIO)
+    assert not os.path.exists(diario_eventos.ARCHIVO_DATASET)
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Estado de sesión en memoria correcto")
@@ -0,0 +1,89 @@
+"""
+Prueba de las peticiones condicionales (ETag) de /api/estado
+Verifica que sin cambios se responda 304 y que un evento, el nivel o el
+toggle de adaptación invaliden el validador
+"""
+import sys
+import os
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+
+
+def consultar(cliente, etag=None):
+    cabeceras = {"X-Terminal-ID": "caja-etag"}
+    if etag:
+        cabeceras["If-None-Match"] = etag
+    return cliente.get("/api/estado", headers=cabeceras)
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_estado_condicional():
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+    evento = {"tipo_evento": "agregar_producto", "duracion": 1.5, "exito": True}
+
+    cliente.post("/api/evento", headers={"X-Terminal-ID": "caja-etag"}, json=evento)
+    respuesta = consultar(cliente)
+    etag = respuesta.headers["ETag"]
+    assert respuesta.status_code == 200 and respuesta.get_json()["tareas"] == 1
+
+    # Sin cambios: 304 sin cuerpo
+    respuesta = consultar(cliente, etag)
+    assert respuesta.status_code == 304 and respuesta.data == b""
+    assert respuesta.headers["ETag"] == etag
+
+    # Un evento de otra terminal no invalida esta
+    cliente.post("/api/evento", headers={"X-Terminal-ID": "otra-caja"}, json=evento)
+    assert consultar(cliente, etag).status_code == 304
+
+    # Un evento propio sí
+    cliente.post("/api/evento", headers={"X-Terminal-ID": "caja-etag"}, json=evento)
+    respuesta = consultar(cliente, etag)
+    assert respuesta.status_code == 200 and respuesta.get_json()["tareas"] == 2
+    etag = respuesta.headers["ETag"]
+
+    # El toggle de adaptación también
+    cliente.post("/api/toggle-adaptacion", json={"activar": False})
+    respuesta = consultar(cliente, etag)
+    assert respuesta.status_code == 200 and respuesta.get_json()["adaptacion_activa"] is False
+    assert aplicacion.cola_eventos.esperar_todo(timeout=10)
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_etag_de_otro_proceso_no_valida():
+    """Cada proceso (también los bifurcados tras importar app) tiene su identificador:
+    el ETag de otro worker con las mismas versiones no da 304"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+    etag = consultar(cliente).headers["ETag"]
+    assert consultar(cliente, etag).status_code == 304
+
+    # Proceso bifurcado (gunicorn --preload): otro identificador
+    lectura, escritura = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(escritura, aplicacion._ARRANQUE.encode())
+        os._exit(0)
+    os.close(escritura)
+    arranque_hijo = os.read(lectura, 100).decode()
+    os.close(lectura)
+    os.waitpid(pid, 0)
+    assert arranque_hijo and arranque_hijo != aplicacion._ARRANQUE
+
+    # Mismas versiones con el identificador del otro proceso: no valida
+    arranque = aplicacion._ARRANQUE
+    aplicacion._ARRANQUE = arranque_hijo
+    try:
+        respuesta = consultar(cliente, etag)
+        assert respuesta.status_code == 200 and respuesta.headers["ETag"] != etag
+    finally:
+        aplicacion._ARRANQUE = arranque
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ ETag de /api/estado correcto")
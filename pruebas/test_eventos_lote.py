@@ -0,0 +1,69 @@
+"""
+Prueba del endpoint /api/eventos (lotes del POSTracker)
+Verifica que un lote deje el mismo estado que los mismos eventos enviados
+uno por uno a /api/evento, y que acepte el envío por sendBeacon
+"""
+import sys
+import os
+import json
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.estado_sesion import obtener_estado_terminal
+
+EVENTOS = [
+    {"tipo_evento": "agregar_producto", "duracion": 1.2, "exito": True, "tiempo_activo": None},
+    {"tipo_evento": "click_generico", "duracion": 0.4, "exito": False, "tiempo_activo": None},
+    {"tipo_evento": "agregar_producto", "duracion": 2.5, "exito": True, "tiempo_activo": 6.0},
+    {"tipo_evento": "seleccionar_categoria", "duracion": 0.8, "exito": True, "tiempo_activo": 7.5},
+    {"tipo_evento": "compra_finalizada", "duracion": 0, "exito": True, "tiempo_activo": None},
+]
+
+
+def metricas(terminal):
+    filas = obtener_estado_terminal(terminal).ultimas_filas()
+    return [(f["TiempoPromedioAccion(s)"], f["ErroresSesion"], f["TareasCompletadas"], f["NivelClasificado"]) for f in filas]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_lote_igual_a_eventos_sueltos():
+    """Un lote terminado en compra deja el mismo historial y la misma respuesta que eventos sueltos"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    for evento in EVENTOS:
+        suelto = cliente.post("/api/evento", headers={"X-Terminal-ID": "sueltos"}, json=evento).get_json()
+    lote = cliente.post("/api/eventos", headers={"X-Terminal-ID": "lote"}, json={"eventos": EVENTOS}).get_json()
+
+    assert lote["procesados"] == len(EVENTOS)
+    assert lote["redirigir"] and lote["url_redireccion"] == suelto["url_redireccion"]
+    assert lote["nivel"] == suelto["nivel"]
+    assert metricas("lote") == metricas("sueltos")
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_lote_por_beacon_y_errores():
+    """sendBeacon (terminal en la URL, sin cabeceras) se acepta; los lotes inválidos no"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    respuesta = cliente.post("/api/eventos?terminal=caja-09", data=json.dumps(EVENTOS[:3]),
+                             content_type="text/plain")
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["procesados"] == 3
+    assert aplicacion.cola_eventos.esperar_todo(timeout=10)
+    assert "redirigir" not in respuesta.get_json()
+    assert metricas("caja-09")[-1][1:3] == (1, 2)
+
+    assert cliente.post("/api/eventos", json={"eventos": []}).status_code == 400
+    assert cliente.post("/api/eventos", json={"eventos": [{"duracion": "lento"}]}).status_code == 400
+    demasiados = [EVENTOS[0]] * (aplicacion.MAX_EVENTOS_LOTE + 1)
+    assert cliente.post("/api/eventos", json={"eventos": demasiados}).status_code == 413
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Lotes de eventos correctos")
@@ -0,0 +1,125 @@
+"""
+Prueba de la unidad de trabajo de una venta (finalizar_venta en src/logger.py)
+Verifica que la venta se escriba en una sola escritura, que deje el mismo
+historial que registrar_eventos() seguido de evaluar_y_asignar() (nivel en la
+penúltima fila, sesión nueva con el nivel anterior) y que una caída a mitad de
+la escritura no deje la venta a medias
+"""
+import sys
+import os
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import diario_eventos
+from src.adaptador import evaluar_y_asignar
+from src.config import establecer_estado_adaptacion
+from src.estado_sesion import obtener_estado_terminal, persistir_todo
+from src.logger import finalizar_venta, registrar_eventos
+
+EVENTOS = [
+    {"tipo_evento": "agregar_producto", "duracion": 1.2, "exito": True, "tiempo_activo": None},
+    {"tipo_evento": "click_generico", "duracion": 0.4, "exito": False, "tiempo_activo": None},
+    {"tipo_evento": "agregar_producto", "duracion": 2.5, "exito": True, "tiempo_activo": 6.0},
+    {"tipo_evento": "compra_finalizada", "duracion": 0.5, "exito": True, "tiempo_activo": 7.0},
+]
+
+
+def historial(terminal):
+    """Filas guardadas sin el SesionID (depende de la hora)"""
+    persistir_todo()
+    filas = obtener_estado_terminal(terminal).almacen.filas()
+    return [{c: v for c, v in f.items() if c != "SesionID"} for f in filas]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_venta_en_una_escritura():
+    """Eventos, marcador de la sesión nueva y nivel llegan al almacenamiento en un solo anexado"""
+    # Dos ventas: la segunda parte de una sesión completada con nivel
+    finalizar_venta(EVENTOS, "caja-1")
+    estado = obtener_estado_terminal("caja-1")
+    persistir_todo()
+
+    anexados = []
+    anexar = estado.almacen.anexar
+    estado.almacen.anexar = lambda registros: (anexados.append(registros), anexar(registros))[1]
+    try:
+        resultados, (interfaz, nivel) = finalizar_venta(EVENTOS, "caja-1")
+    finally:
+        estado.almacen.anexar = anexar
+
+    assert len(anexados) == 1 and len(anexados[0]) == 1
+    registros = diario_eventos.expandir_lotes(anexados[0])
+    assert [r["tipo"] for r in registros] == ["evento"] * len(EVENTOS) + ["inicio_sesion", "nivel"]
+    completada = resultados[-1][1]
+    assert registros[-1]["sesion"] == completada and registros[-2]["anterior"] == completada
+    assert estado.anterior["SesionID"] == completada
+    assert estado.anterior["NivelClasificado"] == interfaz.split(" ")[0]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_igual_a_registrar_y_evaluar():
+    """Mismo historial, interfaz y nivel que registrar_eventos() + evaluar_y_asignar()"""
+    por_pasos = []
+    unidad = []
+    for _ in range(3):
+        registrar_eventos(EVENTOS, terminal="pasos")
+        por_pasos.append(evaluar_y_asignar(terminal="pasos"))
+        _, evaluacion = finalizar_venta(EVENTOS, "unidad")
+        unidad.append(evaluacion)
+
+    assert unidad == por_pasos
+    assert historial("unidad") == historial("pasos")
+    # Sesiones completadas con nivel y la sesión nueva vacía al final
+    filas = historial("unidad")
+    assert len(filas) == 4 and filas[-1]["TareasCompletadas"] == 0
+    assert all(f["NivelClasificado"] for f in filas[:-1])
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_sin_adaptacion_no_clasifica():
+    """Con la adaptación desactivada no hay evaluación ni nivel, y la sesión nueva empieza sin nivel"""
+    finalizar_venta(EVENTOS, "caja-1")
+    establecer_estado_adaptacion(False)
+    resultados, evaluacion = finalizar_venta(EVENTOS, "caja-1")
+    assert evaluacion is None
+    estado = obtener_estado_terminal("caja-1")
+    assert estado.actual["NivelClasificado"] == ""
+    assert resultados[-1][0] and estado.anterior["SesionID"] == resultados[-1][1]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_venta_cortada_se_descarta_entera():
+    """Si la escritura de la venta se corta, al recuperar no queda ni el evento ni la sesión nueva"""
+    finalizar_venta(EVENTOS, "caja-1")
+    estado = obtener_estado_terminal("caja-1")
+    persistir_todo()
+    registrar_eventos(EVENTOS[:2], terminal="caja-1")
+    estado.persistir()
+    antes = dict(estado.actual)
+
+    diario = estado.archivo_diario
+    tamano = os.path.getsize(diario)
+    finalizar_venta(EVENTOS[2:], "caja-1")
+    with open(diario, "rb+") as f:
+        f.truncate(tamano + (os.path.getsize(diario) - tamano) // 2)
+
+    estado.cargar(forzar=True)
+    assert estado.actual == antes
+    sesion_en_curso, _ = diario_eventos.sesion_en_curso(diario)
+    assert sesion_en_curso["SesionID"] == antes["SesionID"]
+
+
+def test_lote_sin_venta_rechazado():
+    try:
+        finalizar_venta(EVENTOS[:2], "caja-1")
+    except ValueError:
+        return
+    raise AssertionError("finalizar_venta aceptó un lote sin compra_finalizada")
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Venta en una sola escritura, con el mismo historial y sin quedar a medias")
@@ -0,0 +1,177 @@
+"""
+Prueba de las métricas (src/metricas.py y GET /metrics)
+Verifica que los contadores e histogramas sumen bien lo registrado desde
+muchos hilos (también los que ya terminaron), que la salida siga el formato de
+texto de Prometheus y que /metrics informe rutas, etapas, transiciones de
+interfaz y sesiones almacenadas
+"""
+import sys
+import os
+import re
+import threading
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import metricas
+from src.metricas import Contador, Histograma
+from src.estado_sesion import obtener_estado_terminal, persistir_todo
+
+
+def test_hilos_sin_perder_mediciones():
+    """Cada hilo registra en su fragmento; la lectura suma vivos y terminados"""
+    contador = Contador("prueba_total", "Contador de prueba", ("hilo_par",))
+    histograma = Histograma("prueba_segundos", "Histograma de prueba", limites=(0.01, 0.1))
+
+    def trabajar(n):
+        for i in range(999):
+            contador.incrementar("si" if n % 2 == 0 else "no")
+            histograma.observar((0.005, 0.05, 0.5)[i % 3])
+
+    # Varias tandas: los fragmentos de las primeras se pliegan al crear hilos nuevos
+    for _ in range(3):
+        hilos = [threading.Thread(target=trabajar, args=(n,)) for n in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    assert contador.valor("si") == 11988 and contador.valor("no") == 11988
+    assert histograma.contador() == 23976
+
+    lineas = histograma.exponer()
+    assert 'prueba_segundos_bucket{le="0.01"} 7992' in lineas
+    assert 'prueba_segundos_bucket{le="0.1"} 15984' in lineas
+    assert 'prueba_segundos_bucket{le="+Inf"} 23976' in lineas
+    assert "prueba_segundos_count 23976" in lineas
+    metricas._metricas.remove(contador)
+    metricas._metricas.remove(histograma)
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_endpoint_metrics():
+    """/metrics expone rutas, etapas, transiciones y sesiones en formato Prometheus"""
+    import app as aplicacion
+    from src.estado_sesion import obtener_estado_terminal
+    cliente = aplicacion.app.test_client()
+    cabeceras = {"X-Terminal-ID": "caja-metricas"}
+
+    for _ in range(3):
+        cliente.post("/api/evento", headers=cabeceras,
+                     json={"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True})
+        cliente.post("/api/evento", headers=cabeceras,
+                     json={"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True})
+    persistir_todo()
+
+    respuesta = cliente.get("/metrics")
+    assert respuesta.status_code == 200
+    assert respuesta.content_type.startswith("text/plain; version=0.0.4")
+    texto = respuesta.get_data(as_text=True)
+
+    # Toda línea es un comentario o "nombre{etiquetas} valor"
+    patron = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [-+0-9.eInf]+$')
+    assert all(l.startswith("#") or patron.match(l) for l in texto.splitlines()), texto
+
+    assert re.search(r'pos_peticiones_total\{ruta="/api/evento",metodo="POST",estado="200"\} (\d+)', texto)
+    for etapa in ("lectura_almacenamiento", "escritura_almacenamiento", "calculo_nivel",
+                  "actualizar_nivel_clasificado"):
+        assert f'pos_etapa_segundos_count{{etapa="{etapa}"}}' in texto, etapa
+    assert 'pos_transiciones_interfaz_total{desde="' in texto
+
+    almacen = obtener_estado_terminal("caja-metricas").almacen
+    sesiones = len(almacen.filas())
+    assert almacen.contar_sesiones() == sesiones == 4
+    assert f'pos_sesiones_almacenadas{{terminal="caja-metricas"}} {sesiones}' in texto
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_sesiones_almacenadas_sin_releer():
+    """El medidor de sesiones no relee el historial en cada /metrics, no toma el
+    bloqueo del diario ni crea estados en memoria para terminales inactivas"""
+    import app as aplicacion
+    from src import diario_eventos, estado_sesion as modulo_estado
+    from src.almacenamiento import AlmacenamientoCSV
+    cliente = aplicacion.app.test_client()
+    venta = [{"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True},
+             {"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True}]
+    for terminal in ("caja-activa", "caja-inactiva"):
+        cliente.post("/api/eventos", headers={"X-Terminal-ID": terminal}, json={"eventos": venta})
+    persistir_todo()
+    # caja-inactiva: con historial en disco pero sin estado en este proceso
+    inactiva = modulo_estado._estados.pop(obtener_estado_terminal("caja-inactiva").archivo_dataset)
+
+    def sin_bloqueo(*argumentos):
+        raise AssertionError("/metrics tomó el bloqueo del diario")
+
+    def medir():
+        lock_diario = diario_eventos.lock_diario
+        diario_eventos.lock_diario = sin_bloqueo
+        try:
+            texto = cliente.get("/metrics").get_data(as_text=True)
+        finally:
+            diario_eventos.lock_diario = lock_diario
+        return {t: int(re.search(rf'pos_sesiones_almacenadas{{terminal="{t}"}} (\d+)', texto).group(1))
+                for t in ("caja-activa", "caja-inactiva")}
+
+    assert medir() == {"caja-activa": 2, "caja-inactiva": 2}
+    assert inactiva.archivo_dataset not in modulo_estado._estados
+
+    # Sin cambios ni releer: una venta suma en memoria y el historial inactivo sigue en caché
+    def sin_releer(almacen):
+        raise AssertionError("/metrics volvió a contar el almacenamiento")
+    contar_sesiones = AlmacenamientoCSV.contar_sesiones
+    AlmacenamientoCSV.contar_sesiones = sin_releer
+    try:
+        cliente.post("/api/eventos", headers={"X-Terminal-ID": "caja-activa"}, json={"eventos": venta})
+        assert medir() == {"caja-activa": 3, "caja-inactiva": 2}
+    finally:
+        AlmacenamientoCSV.contar_sesiones = contar_sesiones
+    persistir_todo()
+    assert len(obtener_estado_terminal("caja-activa").almacen.filas()) == 3
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_server_timing():
+    """Con server_timing activo las respuestas desglosan sus tramos; sin él no hay cabecera"""
+    import app as aplicacion
+    from src.config import actualizar_config
+    cliente = aplicacion.app.test_client()
+    cabeceras = {"X-Terminal-ID": "caja-tiempos"}
+
+    actualizar_config(server_timing=False)
+    respuesta = cliente.post("/api/eventos", headers=cabeceras, json={"eventos": [
+        {"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True},
+        {"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True},
+    ]})
+    assert respuesta.status_code == 200 and "Server-Timing" not in respuesta.headers
+
+    actualizar_config(server_timing=True)
+    respuesta = cliente.post("/api/eventos", headers=cabeceras, json={"eventos": [
+        {"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True},
+        {"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True},
+    ]})
+    tramos = dict(
+        (parte.split(";dur=")[0].strip(), float(parte.split(";dur=")[1]))
+        for parte in respuesta.headers["Server-Timing"].split(",")
+    )
+    for nombre in ("cola", "registro_eventos", "evaluacion", "calculo_nivel",
+                   "actualizar_nivel_clasificado", "escritura_almacenamiento", "total"):
+        assert nombre in tramos, (nombre, tramos)
+    assert tramos["calculo_nivel"] <= tramos["evaluacion"] <= tramos["total"]
+
+    respuesta = cliente.get("/api/estado", headers=cabeceras)
+    assert "espera_cola" in respuesta.headers["Server-Timing"]
+    assert "estado_json" in respuesta.headers["Server-Timing"]
+
+    respuesta = cliente.get("/", headers=cabeceras)
+    assert "evaluacion" in respuesta.headers["Server-Timing"]
+
+    # Los tramos no quedan activos en el hilo después de la petición
+    assert metricas.terminar_tramos() is None
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Métricas en formato Prometheus por ruta y por etapa")
@@ -0,0 +1,251 @@
+"""
+Micro-benchmark del flujo principal - Sistema POS Adaptativo
+Mide en el mismo proceso (sin servidor, red ni navegador) las piezas del flujo
+con historiales de distinto tamaño:
+
+  - registrar_evento() de un evento común y de una venta completada, y
+    finalizar_venta() (venta, clasificación y nivel en una sola escritura)
+  - cargar el estado de la terminal desde disco (lo único que depende del historial)
+  - evaluar_y_asignar(), crear_motor_difuso() y asignar_interfaz()
+  - las rutas de Flask con el cliente de pruebas: /api/evento, /api/estado (con
+    y sin ETag vigente) y /
+
+Para cada operación informa ops/s y los percentiles p50/p95/p99 en ms, y guarda
+todo en pruebas/resultados/microbenchmark_<fecha>.json. Con --comparar se
+compara con un JSON anterior y se sale con código 1 si alguna operación
+empeoró más del umbral (p50).
+
+Uso:
+    python pruebas/test_microbenchmark.py
+    python pruebas/test_microbenchmark.py --tamanos 10,1000 --iteraciones 100
+    python pruebas/test_microbenchmark.py --comparar pruebas/resultados/microbenchmark_X.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Agregar el directorio raíz al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.diario_eventos import COLUMNAS_ALMACEN
+from src.estado_sesion import obtener_estado_terminal, persistir_todo
+from src.logger import registrar_evento, finalizar_venta
+from src.adaptador import evaluar_y_asignar
+from src.motor_difuso import crear_motor_difuso
+from src.asignador_interfaz import asignar_interfaz
+from src.registro import configurar_registro
+
+TAMANOS_POR_DEFECTO = (10, 1000, 100000, 1000000)
+ITERACIONES_POR_DEFECTO = 200
+UMBRAL_REGRESION = 0.20
+
+# Métricas de las sesiones generadas: las del dataset de prueba, repetidas
+ARCHIVO_PERFILES = os.path.join(directorio_raiz, "data", "Dataset_POS_prueba.csv")
+
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) por rango más cercano de una lista ordenada"""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def crear_historial(n, archivo="data/dataset_pos.csv"):
+    """Escribe un dataset_pos.csv con n sesiones completadas y una sesión en curso vacía"""
+    with open(ARCHIVO_PERFILES, newline="", encoding="utf-8") as f:
+        perfiles = [(float(t), int(e), int(ta), nivel) for _, t, e, ta, nivel in list(csv.reader(f))[1:]]
+    os.makedirs(os.path.dirname(archivo), exist_ok=True)
+    inicio = datetime(2025, 1, 1)
+    with open(archivo, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS_ALMACEN)
+        for i in range(n):
+            sesion = (inicio + timedelta(seconds=i)).strftime("S_%Y%m%d_%H%M%S")
+            tiempo, errores, tareas, nivel = perfiles[i % len(perfiles)]
+            escritor.writerow([sesion, tiempo, errores, tareas, nivel, round(tiempo * (errores + tareas), 4), 0.0])
+        escritor.writerow([(inicio + timedelta(seconds=n)).strftime("S_%Y%m%d_%H%M%S"), 0, 0, 0, "Novato", 0.0, 0.0])
+
+
+class MicroBenchmark:
+    def __init__(self, tamanos=TAMANOS_POR_DEFECTO, iteraciones=ITERACIONES_POR_DEFECTO, calentamiento=3):
+        self.tamanos = list(tamanos)
+        self.iteraciones = iteraciones
+        self.calentamiento = calentamiento
+        self.resultados = {}
+
+    def medir(self, nombre, funcion, iteraciones=None):
+        """Ejecuta funcion() varias veces y resume sus tiempos"""
+        iteraciones = iteraciones or self.iteraciones
+        for _ in range(self.calentamiento):
+            funcion()
+        tiempos = []
+        inicio_total = time.perf_counter()
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        total = time.perf_counter() - inicio_total
+        tiempos.sort()
+        resumen = {
+            "iteraciones": iteraciones,
+            "ops_por_segundo": round(iteraciones / total, 2) if total > 0 else None,
+            "p50_ms": round(percentil(tiempos, 50) * 1000, 4),
+            "p95_ms": round(percentil(tiempos, 95) * 1000, 4),
+            "p99_ms": round(percentil(tiempos, 99) * 1000, 4),
+            "max_ms": round(tiempos[-1] * 1000, 4),
+        }
+        print(f"   {nombre:<28} {resumen['ops_por_segundo']:>12,.1f} ops/s"
+              f"   p50 {resumen['p50_ms']:>9.3f} ms   p95 {resumen['p95_ms']:>9.3f} ms   p99 {resumen['p99_ms']:>9.3f} ms")
+        return resumen
+
+    def medir_tamano(self, n):
+        """Todas las operaciones con un historial de n sesiones (en un directorio temporal)"""
+        import app as aplicacion
+
+        anterior = os.getcwd()
+        with tempfile.TemporaryDirectory() as directorio:
+            os.chdir(directorio)
+            try:
+                inicio = time.perf_counter()
+                crear_historial(n)
+                print(f"\n📚 Historial de {n:,} sesiones ({time.perf_counter() - inicio:.1f}s para generarlo)")
+
+                estado = obtener_estado_terminal()
+                cliente = aplicacion.app.test_client()
+                operaciones = {}
+
+                # Lectura del historial: lo que más depende de su tamaño
+                operaciones["cargar_estado"] = self.medir(
+                    "cargar_estado", lambda: estado.cargar(forzar=True), max(10, self.iteraciones // 10))
+
+                operaciones["registrar_evento"] = self.medir(
+                    "registrar_evento", lambda: registrar_evento("agregar_producto", 1.0, True))
+                operaciones["registrar_venta"] = self.medir(
+                    "registrar_venta", lambda: registrar_evento("compra_finalizada", 1.0, True),
+                    max(10, self.iteraciones // 4))
+                operaciones["finalizar_venta"] = self.medir(
+                    "finalizar_venta", lambda: finalizar_venta([{"tipo_evento": "compra_finalizada", "duracion": 1.0}]),
+                    max(10, self.iteraciones // 4))
+                operaciones["evaluar_y_asignar"] = self.medir(
+                    "evaluar_y_asignar", lambda: evaluar_y_asignar(silencioso=True))
+                operaciones["crear_motor_difuso"] = self.medir(
+                    "crear_motor_difuso", crear_motor_difuso, max(5, self.iteraciones // 10))
+                operaciones["asignar_interfaz"] = self.medir(
+                    "asignar_interfaz", lambda: asignar_interfaz(55.0), self.iteraciones * 10)
+
+                evento = {"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True}
+                venta = {"tipo_evento": "compra_finalizada", "duracion": 1.0, "exito": True}
+                operaciones["POST /api/evento"] = self.medir(
+                    "POST /api/evento", lambda: cliente.post("/api/evento", json=evento))
+                operaciones["POST /api/evento (venta)"] = self.medir(
+                    "POST /api/evento (venta)", lambda: cliente.post("/api/evento", json=venta),
+                    max(10, self.iteraciones // 4))
+                aplicacion.cola_eventos.esperar_todo(timeout=30)
+
+                operaciones["GET /api/estado"] = self.medir(
+                    "GET /api/estado", lambda: cliente.get("/api/estado"))
+                etag = cliente.get("/api/estado").headers.get("ETag")
+                operaciones["GET /api/estado (304)"] = self.medir(
+                    "GET /api/estado (304)", lambda: cliente.get("/api/estado", headers={"If-None-Match": etag}))
+                operaciones["GET /"] = self.medir("GET /", lambda: cliente.get("/"))
+
+                self.resultados[str(n)] = operaciones
+            finally:
+                # Terminar las escrituras en segundo plano antes de borrar el directorio
+                persistir_todo()
+                os.chdir(anterior)
+
+    def ejecutar(self):
+        import app  # configura el registro al importarse: antes de bajar el nivel
+        # Sin registros informativos: la salida a la terminal no debe entrar en la medición
+        configurar_registro(nivel="WARNING")
+        print("\n" + "=" * 60)
+        print("⏱️  MICRO-BENCHMARK DEL FLUJO PRINCIPAL")
+        print("=" * 60)
+        for n in self.tamanos:
+            self.medir_tamano(n)
+        return self.resultados
+
+    def guardar(self, archivo=None):
+        """Guarda los resultados en un JSON (pruebas/resultados/microbenchmark_<fecha>.json)"""
+        if archivo is None:
+            os.makedirs(os.path.join(directorio_raiz, "pruebas", "resultados"), exist_ok=True)
+            archivo = os.path.join(
+                directorio_raiz, "pruebas", "resultados",
+                f"microbenchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            )
+        datos = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "iteraciones": self.iteraciones,
+            "tamanos": self.tamanos,
+            "resultados": self.resultados,
+        }
+        with open(archivo, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en: {archivo}")
+        return archivo
+
+    def comparar(self, archivo_base, umbral=UMBRAL_REGRESION):
+        """Operaciones cuyo p50 empeoró más que umbral respecto de archivo_base"""
+        with open(archivo_base, encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+        regresiones = []
+        for tamano, operaciones in self.resultados.items():
+            for nombre, actual in operaciones.items():
+                anterior = base.get(tamano, {}).get(nombre)
+                if not anterior or not anterior["p50_ms"]:
+                    continue
+                cambio = actual["p50_ms"] / anterior["p50_ms"] - 1
+                if cambio > umbral:
+                    regresiones.append((int(tamano), nombre, anterior["p50_ms"], actual["p50_ms"], cambio))
+        if regresiones:
+            print(f"\n⚠️  REGRESIONES (p50 más de {umbral:.0%} peor que {archivo_base}):")
+            for tamano, nombre, antes, ahora, cambio in regresiones:
+                print(f"   {tamano:>9,} sesiones  {nombre:<28} {antes:.3f} → {ahora:.3f} ms (+{cambio:.0%})")
+        else:
+            print(f"\n✅ Sin regresiones respecto de {archivo_base}")
+        return regresiones
+
+
+def test_microbenchmark_rapido():
+    """Pasada corta con un historial pequeño: todas las operaciones se miden y se guardan"""
+    benchmark = MicroBenchmark(tamanos=(10, 1000), iteraciones=5, calentamiento=1)
+    resultados = benchmark.ejecutar()
+    assert set(resultados) == {"10", "1000"}
+    for operaciones in resultados.values():
+        assert "cargar_estado" in operaciones and "GET /api/estado (304)" in operaciones
+        for resumen in operaciones.values():
+            assert resumen["ops_por_segundo"] > 0
+            assert resumen["p50_ms"] <= resumen["p95_ms"] <= resumen["p99_ms"] <= resumen["max_ms"]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = benchmark.guardar(os.path.join(directorio, "base.json"))
+        assert benchmark.comparar(archivo) == []
+    configurar_registro()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark del flujo principal del POS")
+    parser.add_argument("--tamanos", default=",".join(str(n) for n in TAMANOS_POR_DEFECTO),
+                        help="Tamaños del historial separados por comas (sesiones)")
+    parser.add_argument("--iteraciones", type=int, default=ITERACIONES_POR_DEFECTO)
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION,
+                        help="Empeoramiento relativo del p50 que cuenta como regresión (0.2 = 20%%)")
+    argumentos = parser.parse_args()
+
+    benchmark = MicroBenchmark([int(n) for n in argumentos.tamanos.split(",")], argumentos.iteraciones)
+    benchmark.ejecutar()
+    benchmark.guardar()
+    if argumentos.comparar and benchmark.comparar(argumentos.comparar, argumentos.umbral):
+        sys.exit(1)
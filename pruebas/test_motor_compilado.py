@@ -0,0 +1,97 @@
+"""
+Prueba de equivalencia entre el motor difuso de skfuzzy y el motor compilado
+Verifica que ambos den el mismo NivelUsuario dentro de la tolerancia documentada
+"""
+import sys
+import os
+import threading
+import numpy as np
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.motor_difuso import crear_motor_difuso
+from src.motor_compilado import MotorCompilado, obtener_motor_compilado, TOLERANCIA_NIVEL
+from src.asignador_interfaz import asignar_interfaz
+
+
+def nivel_skfuzzy(motor, tiempo, errores, tareas):
+    """Calcula el nivel con skfuzzy (None si ninguna regla se activa)"""
+    motor.input['TiempoPromedioAccion'] = tiempo
+    motor.input['ErroresSesion'] = errores
+    motor.input['TareasCompletadas'] = tareas
+    try:
+        motor.compute()
+        return float(motor.output['NivelUsuario'])
+    except Exception:
+        return None
+
+
+def test_equivalencia_skfuzzy():
+    """Recorre una malla del dominio de entrada comparando ambos motores"""
+    motor = crear_motor_difuso()
+    compilado = MotorCompilado()
+
+    diferencia_maxima = 0.0
+    for tiempo in np.arange(0, 10.5, 0.5):
+        for errores in range(0, 11):
+            for tareas in range(0, 31, 5):
+                esperado = nivel_skfuzzy(motor, tiempo, errores, tareas)
+                obtenido = compilado.calcular_lote(tiempo, errores, tareas)[0]
+
+                if esperado is None:
+                    assert np.isnan(obtenido), f"skfuzzy sin salida pero compilado={obtenido} en {(tiempo, errores, tareas)}"
+                    continue
+
+                diferencia = abs(esperado - obtenido)
+                diferencia_maxima = max(diferencia_maxima, diferencia)
+                assert diferencia <= TOLERANCIA_NIVEL, f"{(tiempo, errores, tareas)}: {esperado:.4f} vs {obtenido:.4f}"
+
+                # Fuera de la banda de tolerancia alrededor de los umbrales la interfaz debe coincidir
+                if min(abs(esperado - 40), abs(esperado - 70)) > TOLERANCIA_NIVEL:
+                    assert asignar_interfaz(esperado) == asignar_interfaz(obtenido)
+
+    print(f"\n📏 Diferencia máxima skfuzzy vs compilado: {diferencia_maxima:.5f} (tolerancia {TOLERANCIA_NIVEL})")
+
+
+def test_lote_igual_a_individual():
+    """calcular_lote debe dar lo mismo que calcular() fila por fila"""
+    compilado = obtener_motor_compilado()
+    rng = np.random.default_rng(42)
+    tiempos = rng.uniform(0, 10, 500)
+    errores = rng.integers(0, 11, 500)
+    tareas = rng.integers(0, 31, 500)
+
+    lote = compilado.calcular_lote(tiempos, errores, tareas)
+    for i in range(len(lote)):
+        if np.isnan(lote[i]):
+            continue
+        assert abs(lote[i] - compilado.calcular(tiempos[i], errores[i], tareas[i])) < 1e-9
+
+
+def test_motor_compartido_entre_hilos():
+    """Varios hilos usando la misma instancia obtienen resultados idénticos"""
+    compilado = obtener_motor_compilado()
+    esperado = compilado.calcular(2.0, 0, 25)
+    resultados = []
+
+    def trabajar():
+        resultados.extend(compilado.calcular(2.0, 0, 25) for _ in range(200))
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert obtener_motor_compilado() is compilado
+    assert len(resultados) == 1600
+    assert all(r == esperado for r in resultados)
+
+
+if __name__ == "__main__":
+    test_equivalencia_skfuzzy()
+    test_lote_igual_a_individual()
+    test_motor_compartido_entre_hilos()
+    print("✅ Motor compilado equivalente a skfuzzy")
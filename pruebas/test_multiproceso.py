@@ -0,0 +1,73 @@
+"""
+Prueba del modo multiproceso (src/bloqueo.py)
+Varios procesos registran ventas en la misma terminal y cambian config.json
+a la vez: no se pierde ni se mezcla ninguna sesión, ni ninguna clave
+"""
+import sys
+import os
+import json
+import subprocess
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+PROCESOS = 4
+VENTAS_POR_PROCESO = 10
+EVENTOS_POR_VENTA = 4
+
+TRABAJADOR = f"""
+import os, sys, time
+sys.path.insert(0, {directorio_raiz!r})
+from src.logger import registrar_evento
+from src.config import actualizar_config
+numero = int(sys.argv[1])
+# Empezar todos a la vez
+while not os.path.exists("data/inicio"):
+    time.sleep(0.01)
+for venta in range({VENTAS_POR_PROCESO}):
+    for i in range({EVENTOS_POR_VENTA}):
+        registrar_evento("agregar_producto", 1.0, True)
+    registrar_evento("compra_finalizada", 1.0, True)
+actualizar_config(**{{f"clave_{{numero}}": numero}})
+"""
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_procesos_concurrentes():
+    os.makedirs("data")
+    with open("data/config.json", "w", encoding="utf-8") as f:
+        json.dump({"adaptacion_activa": True, "multiproceso": True}, f)
+
+    procesos = [
+        subprocess.Popen([sys.executable, "-c", TRABAJADOR, str(n)],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        for n in range(PROCESOS)
+    ]
+    open("data/inicio", "w").close()
+    for proceso in procesos:
+        _, errores = proceso.communicate(timeout=120)
+        assert proceso.returncode == 0, errores.decode()
+
+    # Cada venta es una sesión completa y la última sesión quedó vacía
+    from src.almacenamiento import AlmacenamientoCSV
+    filas = AlmacenamientoCSV("data/dataset_pos.csv", "data/eventos_pos.jsonl").filas()
+    ventas = PROCESOS * VENTAS_POR_PROCESO
+    assert len(filas) == ventas + 1, len(filas)
+    assert len({f["SesionID"] for f in filas}) == len(filas)
+    assert sum(f["TareasCompletadas"] for f in filas) == ventas * (EVENTOS_POR_VENTA + 1)
+    assert filas[-1]["TareasCompletadas"] == 0
+
+    with open("data/config.json", encoding="utf-8") as f:
+        config = json.load(f)
+    assert all(config.get(f"clave_{n}") == n for n in range(PROCESOS)), config
+
+    # Ningún temporal a medio escribir
+    assert not [a for a in os.listdir("data") if a.endswith(".tmp")]
+    os.remove("data/inicio")
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Varios procesos comparten el historial sin perder eventos")
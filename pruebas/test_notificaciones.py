@@ -0,0 +1,76 @@
+"""
+Prueba de las notificaciones en vivo (/api/stream)
+Verifica que el toggle de adaptación y la clasificación al completar una
+venta lleguen por el flujo SSE sin consultar /api/estado
+"""
+import sys
+import os
+import json
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import notificador
+
+
+def leer_mensaje(flujo):
+    """Siguiente mensaje (tipo, datos) del flujo, saltando retry y latidos"""
+    while True:
+        bloque = next(flujo)
+        bloque = bloque.decode("utf-8") if isinstance(bloque, bytes) else bloque
+        if bloque.startswith("event:"):
+            tipo, datos = bloque.strip().split("\n")
+            return tipo[len("event: "):], json.loads(datos[len("data: "):])
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_toggle_y_nivel_empujados():
+    """Cada terminal recibe su nivel; el toggle llega a todas"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    respuesta_a = cliente.get("/api/stream", headers={"X-Terminal-ID": "caja-a"}, buffered=False)
+    respuesta_b = cliente.get("/api/stream", headers={"X-Terminal-ID": "caja-b"}, buffered=False)
+    assert respuesta_a.mimetype == "text/event-stream"
+    flujo_a, flujo_b = iter(respuesta_a.response), iter(respuesta_b.response)
+
+    tipo, estado = leer_mensaje(flujo_a)
+    assert tipo == "estado" and estado["terminal"] == "caja-a"
+    assert leer_mensaje(flujo_b)[0] == "estado"
+    assert notificador.total_suscriptores() == 2
+
+    # Venta en la caja A: solo A recibe el nivel
+    for _ in range(10):
+        cliente.post("/api/evento", headers={"X-Terminal-ID": "caja-a"},
+                     json={"tipo_evento": "agregar_producto", "duracion": 1.0, "exito": True})
+    venta = cliente.post("/api/evento", headers={"X-Terminal-ID": "caja-a"},
+                         json={"tipo_evento": "compra_finalizada", "duracion": 0, "exito": True}).get_json()
+    tipo, datos = leer_mensaje(flujo_a)
+    assert tipo == "nivel" and datos["interfaz"] == venta["interfaz"]
+
+    # Toggle: llega a ambas terminales
+    cliente.post("/api/toggle-adaptacion", json={"activar": False})
+    assert leer_mensaje(flujo_a) == ("adaptacion", {"adaptacion_activa": False})
+    assert leer_mensaje(flujo_b) == ("adaptacion", {"adaptacion_activa": False})
+
+    respuesta_a.close()
+    respuesta_b.close()
+    assert notificador.total_suscriptores() == 0
+
+
+def test_cliente_lento_no_bloquea():
+    """Una cola llena descarta mensajes en lugar de bloquear al que publica"""
+    cola = notificador.suscribir("lenta")
+    try:
+        for i in range(notificador.MAX_PENDIENTES + 10):
+            notificador.publicar("lenta", "nivel", {"i": i})
+        assert cola.qsize() == notificador.MAX_PENDIENTES
+    finally:
+        notificador.cancelar("lenta", cola)
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Notificaciones en vivo correctas")
@@ -0,0 +1,118 @@
+"""
+Prueba del registro del sistema (src/registro.py)
+Verifica que los registros se escriban en el hilo del QueueListener y no en el
+de la petición, que el formato JSON sea una línea por registro con sus campos
+y que los banners solo aparezcan con nivel DEBUG
+"""
+import sys
+import os
+import json
+import logging
+import threading
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src import registro as modulo_registro
+from src.registro import obtener_registro, configurar_registro, detener_registro, banner
+
+
+class Captura(logging.Handler):
+    """Guarda las líneas formateadas y el hilo que las escribió"""
+
+    def __init__(self):
+        super().__init__()
+        self.lineas = []
+        self.hilos = set()
+
+    def emit(self, record):
+        self.lineas.append(self.format(record))
+        self.hilos.add(threading.get_ident())
+
+
+def _capturar(nivel, formato):
+    captura = Captura()
+    configurar_registro(nivel=nivel, formato=formato, manejador=captura)
+    return captura
+
+
+def _restaurar():
+    detener_registro()
+    configurar_registro(nivel="INFO", formato="texto")
+
+
+def test_json_fuera_del_hilo_de_la_peticion(monkeypatch):
+    """Cada registro es una línea JSON, formateada y escrita por el hilo del QueueListener"""
+    hilos_formato = set()
+    for clase in (logging.Formatter, modulo_registro.FormatoJSON):
+        def format(formato, record, formatear=clase.format):
+            hilos_formato.add(threading.get_ident())
+            return formatear(formato, record)
+        monkeypatch.setattr(clase, "format", format)
+
+    captura = _capturar("INFO", "json")
+    try:
+        registro = obtener_registro("prueba")
+        registro.info("Venta evaluada", extra={"campos": {"terminal": "caja-1", "nivel": 72.5}})
+        registro.debug("no debe aparecer")
+        try:
+            raise ValueError("falla de prueba")
+        except ValueError:
+            registro.exception("Error en prueba")
+        detener_registro()
+    finally:
+        _restaurar()
+
+    assert len(captura.lineas) == 2, captura.lineas
+    assert "\n" not in captura.lineas[0]
+    venta = json.loads(captura.lineas[0])
+    assert venta["nivel"] == 72.5 and venta["terminal"] == "caja-1"
+    assert venta["mensaje"] == "Venta evaluada" and venta["origen"] == "pos.prueba"
+    error = json.loads(captura.lineas[1])
+    assert error["nivel"] == "ERROR" and error["mensaje"] == "Error en prueba"
+    assert "falla de prueba" in error["excepcion"]
+    assert threading.get_ident() not in captura.hilos
+    assert hilos_formato and threading.get_ident() not in hilos_formato
+
+
+def test_banners_solo_en_debug():
+    """Los banners con emojis se registran con DEBUG y ni se arman con INFO"""
+    registro = obtener_registro("prueba")
+
+    captura = _capturar("INFO", "texto")
+    try:
+        banner(registro, "🚀 HAY DATOS - Evaluando nivel...")
+        detener_registro()
+    finally:
+        _restaurar()
+    assert captura.lineas == []
+
+    captura = _capturar("DEBUG", "texto")
+    try:
+        banner(registro, "🚀 HAY DATOS - Evaluando nivel...", "   detalle")
+        detener_registro()
+    finally:
+        _restaurar()
+    assert len(captura.lineas) == 1
+    assert "🚀 HAY DATOS" in captura.lineas[0] and "   detalle" in captura.lineas[0]
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_nivel_desde_config_y_entorno():
+    """El nivel sale de config.json; la variable de entorno tiene prioridad"""
+    from src.config import guardar_config
+    guardar_config({"adaptacion_activa": True, "nivel_registro": "warning", "formato_registro": "json"})
+    try:
+        assert modulo_registro._preferencias(None, None) == ("WARNING", "json")
+        os.environ["POS_NIVEL_REGISTRO"] = "debug"
+        assert modulo_registro._preferencias(None, None) == ("DEBUG", "json")
+        assert modulo_registro._preferencias("no-existe", "xml") == ("INFO", "texto")
+    finally:
+        os.environ.pop("POS_NIVEL_REGISTRO", None)
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Registro en cola con formato JSON y banners solo en DEBUG")
@@ -0,0 +1,85 @@
+"""
+Prueba de la tabla precalculada de clasificación
+Verifica la interpolación frente al motor compilado y la reconstrucción automática
+"""
+import sys
+import os
+import tempfile
+import threading
+import numpy as np
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.motor_compilado import obtener_motor_compilado
+from src.tabla_clasificacion import TablaClasificacion, cargar_o_construir, TOLERANCIA_TABLA
+
+
+def test_tabla_equivalente_al_motor():
+    """La interpolación trilineal se mantiene dentro de la tolerancia documentada"""
+    motor = obtener_motor_compilado()
+    tabla = TablaClasificacion.construir()
+
+    rng = np.random.default_rng(7)
+    for _ in range(2000):
+        tiempo = rng.uniform(0, 10)
+        errores = int(rng.integers(0, 11))
+        tareas = int(rng.integers(0, 31))
+        esperado = motor.calcular_lote(tiempo, errores, tareas)[0]
+        if np.isnan(esperado):
+            continue
+        obtenido = tabla.calcular(tiempo, errores, tareas)
+        assert abs(esperado - obtenido) <= TOLERANCIA_TABLA, f"{(tiempo, errores, tareas)}: {esperado:.4f} vs {obtenido:.4f}"
+
+
+def test_tabla_en_puntos_de_malla():
+    """En los nodos de la malla la tabla devuelve exactamente el valor del motor"""
+    motor = obtener_motor_compilado()
+    tabla = TablaClasificacion.construir()
+    for tiempo, errores, tareas in [(2.0, 0, 25), (8.0, 7, 5), (5.0, 3, 10), (10.0, 10, 30)]:
+        esperado = motor.calcular_lote(tiempo, errores, tareas)[0]
+        assert abs(tabla.consultar(tiempo, errores, tareas) - esperado) < 1e-9
+
+
+def test_reconstruccion_por_cambio_de_reglas():
+    """Una tabla guardada con otra huella de reglas se reconstruye al cargarla"""
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "tabla.npz")
+        vieja = TablaClasificacion.construir()
+        TablaClasificacion(vieja.niveles.copy(), vieja.pasos, "huella_antigua").guardar(archivo)
+
+        tabla = cargar_o_construir(archivo)
+        assert tabla.huella == obtener_motor_compilado().huella
+        assert TablaClasificacion.cargar(archivo).huella == tabla.huella
+
+
+def test_guardados_simultaneos():
+    """Varios procesos guardando la tabla a la vez dejan una tabla legible y ningún temporal"""
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "tabla.npz")
+        tabla = TablaClasificacion.construir()
+        errores = []
+        def guardar():
+            try:
+                for _ in range(5):
+                    tabla.guardar(archivo)
+            except Exception as e:
+                errores.append(e)
+        hilos = [threading.Thread(target=guardar) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        assert TablaClasificacion.cargar(archivo).huella == tabla.huella
+        assert os.listdir(directorio) == ["tabla.npz"]
+
+
+if __name__ == "__main__":
+    test_tabla_equivalente_al_motor()
+    test_tabla_en_puntos_de_malla()
+    test_reconstruccion_por_cambio_de_reglas()
+    test_guardados_simultaneos()
+    print("✅ Tabla de clasificación correcta")
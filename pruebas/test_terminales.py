@@ -0,0 +1,86 @@
+"""
+Prueba de sesiones por terminal
+Verifica que dos cajas intercaladas en el mismo servidor tengan contadores,
+nivel e interfaz independientes y que sin identificador se use data/
+"""
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+# Agregar el directorio raíz del proyecto al path
+directorio_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, directorio_raiz)
+
+from src.terminales import normalizar_terminal, archivos_terminal, TERMINAL_POR_DEFECTO
+
+
+def evento(cliente, terminal, tipo, duracion, exito=True):
+    respuesta = cliente.post("/api/evento", headers={"X-Terminal-ID": terminal}, json={
+        "tipo_evento": tipo, "duracion": duracion, "exito": exito,
+    })
+    assert respuesta.status_code == 200
+    return respuesta.get_json()
+
+
+def test_identificador_de_terminal():
+    """Los identificadores inválidos (rutas, vacíos) van a la terminal principal"""
+    assert normalizar_terminal("caja-07") == "caja-07"
+    assert normalizar_terminal("../config") == TERMINAL_POR_DEFECTO
+    assert normalizar_terminal("") == TERMINAL_POR_DEFECTO
+    assert archivos_terminal(None)[0] == os.path.join("data", "dataset_pos.csv")
+    assert archivos_terminal("caja-07")[0] == os.path.join("data", "terminales", "caja-07", "dataset_pos.csv")
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_terminales_intercaladas_independientes():
+    """Una caja experta y una novata intercaladas no se mezclan"""
+    import app as aplicacion
+    cliente = aplicacion.app.test_client()
+
+    for _ in range(12):
+        evento(cliente, "caja-01", "agregar_producto", 1.0, True)
+        evento(cliente, "caja-02", "agregar_producto", 9.0, False)
+    experta = evento(cliente, "caja-01", "compra_finalizada", 1.0, True)
+    novata = evento(cliente, "caja-02", "compra_finalizada", 9.0, True)
+
+    assert experta["interfaz"] == "experto", experta
+    assert novata["interfaz"] == "novato", novata
+
+    # La primera venta de cada caja queda en su propio dataset
+    for terminal, errores in (("caja-01", 0), ("caja-02", 12)):
+        archivo, _ = archivos_terminal(terminal)
+        assert os.path.exists(archivo)
+        estado = cliente.get("/api/estado", headers={"X-Terminal-ID": terminal}).get_json()
+        assert estado["terminal"] == terminal
+        assert estado["eventos"] == 0  # sesión nueva tras la venta
+
+    # La terminal principal no se tocó
+    assert not os.path.exists(archivos_terminal(None)[0])
+
+
+@pytest.mark.usefixtures("directorio_temporal")
+def test_terminales_concurrentes():
+    """Peticiones simultáneas de varias cajas no pierden eventos"""
+    import app as aplicacion
+    from src.estado_sesion import obtener_estado_terminal
+
+    terminales = [f"caja-{i:02d}" for i in range(8)]
+
+    def caja(terminal):
+        cliente = aplicacion.app.test_client()
+        for _ in range(20):
+            evento(cliente, terminal, "agregar_producto", 2.0, True)
+
+    with ThreadPoolExecutor(max_workers=len(terminales)) as ejecutor:
+        list(ejecutor.map(caja, terminales))
+    # Los eventos se responden al encolarse: esperar a que la cola los aplique
+    assert aplicacion.cola_eventos.esperar_todo(timeout=10)
+
+    for terminal in terminales:
+        assert obtener_estado_terminal(terminal).actual["TareasCompletadas"] == 20
+
+
+if __name__ == "__main__":
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ Sesiones por terminal independientes")
@@ -1,94 +1,165 @@
-import pandas as pd
+import logging
 import os
-from src.motor_difuso import crear_motor_difuso
 from src.asignador_interfaz import asignar_interfaz
+from src.config import obtener_modo_clasificacion, obtener_pasos_tabla, MODOS_CLASIFICACION
+from src.diario_eventos import numero
+from src.estado_sesion import obtener_estado_sesion
+from src.terminales import archivos_terminal
+from src.registro import obtener_registro
+from src.metricas import ETAPAS, cronometrar
 
-def evaluar_y_asignar(silencioso=False):
+registro = obtener_registro("adaptador")
+
+def obtener_clasificador(modo):
+    """
+    Devuelve el objeto que calcula NivelUsuario según el modo:
+      - "compilado": motor Mamdani precompilado en NumPy (por defecto)
+      - "tabla": tabla precalculada con interpolación trilineal (O(1))
+      - "skfuzzy": motor original de skfuzzy construido en cada llamada
+    Todos exponen calcular(tiempo, errores, tareas) y lanzan excepción si no hay nivel.
+    """
+    # NumPy y el motor se importan con el primer clasificador (ver src/calentamiento.py)
+    if modo == "tabla":
+        from src.tabla_clasificacion import obtener_tabla
+        return obtener_tabla(obtener_pasos_tabla())
+    if modo == "skfuzzy":
+        return _MotorSkfuzzy()
+    from src.motor_compilado import obtener_motor_compilado
+    return obtener_motor_compilado()
+
+class _MotorSkfuzzy:
+    """Adaptador del motor de skfuzzy a la interfaz calcular()"""
+
+    def calcular(self, tiempo, errores, tareas):
+        from src.motor_difuso import crear_motor_difuso
+        with cronometrar(ETAPAS, "construccion_motor"):
+            motor = crear_motor_difuso()
+        motor.input['TiempoPromedioAccion'] = tiempo
+        motor.input['ErroresSesion'] = errores
+        motor.input['TareasCompletadas'] = tareas
+        motor.compute()
+        return float(motor.output['NivelUsuario'])
+
+def evaluar_y_asignar(silencioso=False, modo=None, terminal=None):
     """
     Evalúa el nivel del usuario basado en métricas acumuladas.
     Lee directamente el formato Dataset_POS.csv
     
     Args:
-        silencioso: Si es True, no imprime logs (útil para llamadas durante el proceso)
+        silencioso: Si es True, no registra el detalle (útil para llamadas durante el proceso)
+        modo: "compilado", "tabla" o "skfuzzy". Si es None se usa el de data/config.json
+        terminal: Terminal evaluada (None = terminal principal, data/dataset_pos.csv)
     """
-    archivo = "data/dataset_pos.csv"
+    if modo is None:
+        modo = obtener_modo_clasificacion()
+    elif modo not in MODOS_CLASIFICACION:
+        raise ValueError(f"Modo de clasificación desconocido: {modo}")
+    
+    archivo, _ = archivos_terminal(terminal)
     
+    # Estado de sesión en memoria (no se lee el CSV)
+    estado_sesion = obtener_estado_sesion(archivo).cargar()
+    interfaz, nivel, clasificada = _evaluar(estado_sesion, modo, silencioso)
+    if clasificada:
+        # Actualizar el nivel clasificado en el CSV
+        actualizar_nivel_clasificado(interfaz, archivo)
+    return interfaz, nivel
+
+def evaluar_y_marcar(estado_sesion, modo, silencioso=False):
+    """
+    evaluar_y_asignar dentro de una transacción ya abierta sobre estado_sesion
+    (finalizar_venta en src/logger.py): marca NivelClasificado en memoria y
+    devuelve el registro del diario en lugar de encolarlo aparte.
+    Devuelve (interfaz, nivel, registros).
+    """
+    interfaz, nivel, clasificada = _evaluar(estado_sesion, modo, silencioso)
+    registros = []
+    if clasificada:
+        try:
+            with cronometrar(ETAPAS, "actualizar_nivel_clasificado"):
+                marca = _marcar_nivel(estado_sesion, interfaz)
+            if marca is not None:
+                registros.append(marca)
+        except Exception as e:
+            registro.warning("Error al actualizar nivel en CSV: %s", e)
+    return interfaz, nivel, registros
+
+def _evaluar(estado_sesion, modo, silencioso):
+    """(interfaz, nivel, clasificada): clasificada es False en los casos por defecto sin datos"""
     # ========== SIN DATOS O ARCHIVO NO EXISTE ==========
-    if not os.path.exists(archivo):
-        print("[ADAPTADOR] Archivo no encontrado → NOVATO (default)")
-        return "Novato → Interfaz simplificada", 30.0
+    if not estado_sesion.existe:
+        registro.debug("[ADAPTADOR] Archivo no encontrado → NOVATO (default)")
+        return "Novato → Interfaz simplificada", 30.0, False
     
-    df = pd.read_csv(archivo)
+    # Penúltima (sesión completada) y última fila (sesión actual)
+    filas = estado_sesion.ultimas_filas()
     
-    if df.empty or len(df) == 0:
-        print("[ADAPTADOR] Sin datos → NOVATO (default)")
-        return "Novato → Interfaz simplificada", 30.0
+    if len(filas) == 0:
+        registro.debug("[ADAPTADOR] Sin datos → NOVATO (default)")
+        return "Novato → Interfaz simplificada", 30.0, False
     
     # Verificar si la fila tiene datos válidos (no solo encabezado)
     # Leer la ÚLTIMA fila (sesión actual), pero si tiene 0 eventos, leer la penúltima (sesión completada)
     try:
         # Obtener la última fila (sesión actual)
-        ultima_fila = df.iloc[-1]
+        ultima_fila = filas[-1]
         sesion_id = str(ultima_fila.get('SesionID', '')).strip()
         if not sesion_id or sesion_id == '' or sesion_id.lower() == 'nan':
-            print("[ADAPTADOR] CSV solo con encabezado → NOVATO (default)")
-            return "Novato → Interfaz simplificada", 30.0
+            registro.debug("[ADAPTADOR] CSV solo con encabezado → NOVATO (default)")
+            return "Novato → Interfaz simplificada", 30.0, False
         
         # Verificar si la última fila tiene eventos
-        errores_ultima = pd.to_numeric(ultima_fila.get('ErroresSesion', 0), errors='coerce') or 0
-        tareas_ultima = pd.to_numeric(ultima_fila.get('TareasCompletadas', 0), errors='coerce') or 0
+        errores_ultima = numero(ultima_fila.get('ErroresSesion', 0))
+        tareas_ultima = numero(ultima_fila.get('TareasCompletadas', 0))
         eventos_ultima = int(errores_ultima) + int(tareas_ultima)
         
         # Si la última fila tiene 0 eventos y hay más de una fila, leer la penúltima (sesión completada)
-        if eventos_ultima == 0 and len(df) > 1:
-            ultima_fila = df.iloc[-2]  # Leer la penúltima fila (sesión completada)
+        if eventos_ultima == 0 and len(filas) > 1:
+            ultima_fila = filas[-2]  # Leer la penúltima fila (sesión completada)
             if not silencioso:
-                print(f"[ADAPTADOR] Última fila vacía, leyendo sesión completada (penúltima fila)")
+                registro.debug("[ADAPTADOR] Última fila vacía, leyendo sesión completada (penúltima fila)")
     except (IndexError, KeyError):
-        print("[ADAPTADOR] Error al leer fila → NOVATO (default)")
-        return "Novato → Interfaz simplificada", 30.0
+        registro.debug("[ADAPTADOR] Error al leer fila → NOVATO (default)")
+        return "Novato → Interfaz simplificada", 30.0, False
     
     # ========== LEER MÉTRICAS DIRECTAMENTE ==========
     # Leer métricas de la fila seleccionada (última si tiene eventos, penúltima si la última está vacía)
-    tiempo_prom = pd.to_numeric(ultima_fila.get('TiempoPromedioAccion(s)', 0), errors='coerce') or 0
-    errores = pd.to_numeric(ultima_fila.get('ErroresSesion', 0), errors='coerce') or 0
-    tareas = pd.to_numeric(ultima_fila.get('TareasCompletadas', 0), errors='coerce') or 0
-    
-    # Convertir NaN a 0
-    if pd.isna(tiempo_prom):
-        tiempo_prom = 0
-    if pd.isna(errores):
-        errores = 0
-    if pd.isna(tareas):
-        tareas = 0
+    # Valores vacíos o no numéricos cuentan como 0
+    tiempo_prom = numero(ultima_fila.get('TiempoPromedioAccion(s)', 0))
+    errores = int(numero(ultima_fila.get('ErroresSesion', 0)))
+    tareas = int(numero(ultima_fila.get('TareasCompletadas', 0)))
     
     eventos_totales = int(errores) + int(tareas)
     
-    if not silencioso:
-        print(f"\n{'='*60}")
-        print(f"🧠 EVALUACIÓN DEL USUARIO")
-        print(f"{'='*60}")
-        print(f"📊 MÉTRICAS ACUMULADAS ({eventos_totales} eventos):")
-        print(f"   • Tiempo Promedio: {tiempo_prom:.2f}s")
-        print(f"   • Errores: {errores}")
-        print(f"   • Tareas Completadas: {tareas}")
-        print(f"{'-'*60}")
+    # Detalle paso a paso solo con nivel_registro DEBUG
+    detallar = not silencioso and registro.isEnabledFor(logging.DEBUG)
+    if detallar:
+        registro.debug("\n".join([
+            "=" * 60,
+            "🧠 EVALUACIÓN DEL USUARIO",
+            "=" * 60,
+            f"📊 MÉTRICAS ACUMULADAS ({eventos_totales} eventos):",
+            f"   • Tiempo Promedio: {tiempo_prom:.2f}s",
+            f"   • Errores: {errores}",
+            f"   • Tareas Completadas: {tareas}",
+            "-" * 60,
+        ]))
     
     # ========== CASOS ESPECIALES ==========
     
     # Usuario completamente nuevo (0 eventos)
     if eventos_totales == 0:
-        if not silencioso:
-            print("🆕 Usuario nuevo → NOVATO (sin datos para evaluar)")
-            print(f"{'='*60}\n")
-        return "Novato → Interfaz simplificada", 30.0
+        if detallar:
+            registro.debug("🆕 Usuario nuevo → NOVATO (sin datos para evaluar)")
+        return "Novato → Interfaz simplificada", 30.0, False
     
     # ========== EVALUACIÓN CON LÓGICA DIFUSA ==========
     # Siempre usar lógica difusa cuando hay al menos 1 evento
-    if not silencioso:
-        print(f"✅ Evaluación con lógica difusa ({eventos_totales} eventos)")
+    if detallar:
+        registro.debug("✅ Evaluación con lógica difusa (%d eventos, modo: %s)", eventos_totales, modo)
     
-    motor = crear_motor_difuso()
+    # Motor compilado o tabla: se construyen una sola vez por proceso (compartidos entre hilos)
+    motor = obtener_clasificador(modo)
     
     # Normalizar valores al rango esperado del motor difuso
     # Tiempo: 0-10 segundos
@@ -98,21 +169,18 @@ def evaluar_y_asignar(silencioso=False):
     # Tareas: 0-30
     tareas_normalizadas = max(0, min(int(tareas), 30))
     
-    # Asignar valores al motor difuso
-    motor.input['TiempoPromedioAccion'] = tiempo_normalizado
-    motor.input['ErroresSesion'] = errores_normalizados
-    motor.input['TareasCompletadas'] = tareas_normalizadas
-    
-    if not silencioso:
-        print(f"📥 INPUTS AL MOTOR DIFUSO:")
-        print(f"   • Tiempo: {tiempo_normalizado:.2f}s (normalizado)")
-        print(f"   • Errores: {errores_normalizados}")
-        print(f"   • Tareas: {tareas_normalizadas}")
+    if detallar:
+        registro.debug("\n".join([
+            "📥 INPUTS AL MOTOR DIFUSO:",
+            f"   • Tiempo: {tiempo_normalizado:.2f}s (normalizado)",
+            f"   • Errores: {errores_normalizados}",
+            f"   • Tareas: {tareas_normalizadas}",
+        ]))
     
     try:
         # Ejecutar inferencia difusa
-        motor.compute()
-        nivel = float(motor.output['NivelUsuario'])
+        with cronometrar(ETAPAS, "calculo_nivel"):
+            nivel = motor.calcular(tiempo_normalizado, errores_normalizados, tareas_normalizadas)
         
         # Asegurar que el nivel esté en el rango válido [0, 100]
         nivel = max(0, min(100, nivel))
@@ -128,23 +196,19 @@ def evaluar_y_asignar(silencioso=False):
         else:
             confianza = "Alta"
         
-        if not silencioso:
-            print(f"🎯 RESULTADO DE CLASIFICACIÓN:")
-            print(f"   • Nivel Difuso: {nivel:.2f} / 100")
-            print(f"   • Interfaz Asignada: {interfaz}")
-            print(f"   • Confianza: {confianza} ({eventos_totales} eventos)")
-            print(f"{'='*60}\n")
+        if detallar:
+            registro.debug("\n".join([
+                "🎯 RESULTADO DE CLASIFICACIÓN:",
+                f"   • Nivel Difuso: {nivel:.2f} / 100",
+                f"   • Interfaz Asignada: {interfaz}",
+                f"   • Confianza: {confianza} ({eventos_totales} eventos)",
+                "=" * 60,
+            ]))
         
-        # Actualizar el nivel clasificado en el CSV
-        actualizar_nivel_clasificado(interfaz, archivo)
-        
-        return interfaz, nivel
+        return interfaz, nivel, True
         
     except Exception as e:
-        print(f"❌ Error en motor difuso: {e}")
-        import traceback
-        traceback.print_exc()
-        print(f"   → Fallback a evaluación simple")
+        registro.exception("Error en motor difuso (%s) → evaluación simple de respaldo", e)
         
         # Fallback: evaluación simple basada en reglas básicas
         if tiempo_prom > 7 or errores > 5:
@@ -157,56 +221,64 @@ def evaluar_y_asignar(silencioso=False):
             nivel_fallback = 50.0  # Intermedio
             interfaz_fallback = "Intermedio → Interfaz equilibrada"
         
-        print(f"   → Nivel Fallback: {nivel_fallback:.2f} → {interfaz_fallback}")
-        print(f"{'='*60}\n")
+        registro.warning("Nivel de respaldo: %.2f → %s", nivel_fallback, interfaz_fallback)
         
-        actualizar_nivel_clasificado(interfaz_fallback, archivo)
-        return interfaz_fallback, nivel_fallback
+        return interfaz_fallback, nivel_fallback, True
 
+@cronometrar(ETAPAS, "actualizar_nivel_clasificado")
 def actualizar_nivel_clasificado(interfaz, archivo):
-    """Actualiza la columna NivelClasificado en el CSV (última fila - sesión actual o completada)"""
+    """Actualiza la columna NivelClasificado (sesión actual o, si está vacía, la sesión completada)
+    
+    El nivel se actualiza en el estado en memoria y se encola para el diario; el
+    escritor diferido lo compacta en el CSV en segundo plano.
+    """
     try:
-        df = pd.read_csv(archivo)
-        
-        if df.empty or len(df) == 0:
-            return
-        
-        # Determinar nivel basado en la interfaz asignada
-        if "novato" in interfaz.lower():
-            nivel_texto = "Novato"
-        elif "intermedio" in interfaz.lower():
-            nivel_texto = "Intermedio"
-        elif "experto" in interfaz.lower():
-            nivel_texto = "Experto"
-        else:
-            # Si no se puede determinar, usar el nivel por defecto
-            nivel_texto = "Novato"
+        estado_sesion = obtener_estado_sesion(archivo)
+        with estado_sesion.transaccion():
+            estado_sesion.cargar()
+            marca = _marcar_nivel(estado_sesion, interfaz)
+            if marca is None:
+                return
+            estado_sesion.encolar([marca])
         
-        # Asegurar que la columna existe
-        if 'NivelClasificado' not in df.columns:
-            df['NivelClasificado'] = ''
-        
-        # Actualizar SOLO la última fila (sesión actual o completada)
-        # Si hay más de una fila y la última tiene 0 eventos, actualizar la penúltima (sesión completada)
-        if len(df) > 1:
-            ultima_fila = df.iloc[-1]
-            eventos_ultima = int(ultima_fila.get('ErroresSesion', 0) or 0) + int(ultima_fila.get('TareasCompletadas', 0) or 0)
-            if eventos_ultima == 0:
-                # La última fila es la nueva sesión vacía, actualizar la penúltima (sesión completada)
-                df.iloc[-2, df.columns.get_loc('NivelClasificado')] = nivel_texto
-                print(f"📝 Nivel actualizado en CSV (sesión completada, penúltima fila): {nivel_texto}")
-            else:
-                # La última fila es la sesión actual, actualizarla
-                df.iloc[-1, df.columns.get_loc('NivelClasificado')] = nivel_texto
-                print(f"📝 Nivel actualizado en CSV (sesión actual, última fila): {nivel_texto}")
-        else:
-            # Solo hay una fila, actualizarla
-            df.iloc[-1, df.columns.get_loc('NivelClasificado')] = nivel_texto
-            print(f"📝 Nivel actualizado en CSV (única fila): {nivel_texto}")
-        
-        # Guardar el CSV
-        df.to_csv(archivo, index=False)
+        # Compactar el diario en el CSV en segundo plano
+        estado_sesion.solicitar_compactacion()
         
     except Exception as e:
-        print(f"⚠️  Error al actualizar nivel en CSV: {e}")
-        # No lanzar excepción, solo registrar el error
\ No newline at end of file
+        registro.warning("Error al actualizar nivel en CSV: %s", e)
+        # No lanzar excepción, solo registrar el error
+
+def _marcar_nivel(estado_sesion, interfaz):
+    """Marca NivelClasificado en memoria (con el lock de la sesión tomado) y devuelve
+    el registro "nivel" del diario, o None si no hay sesión"""
+    # Determinar nivel basado en la interfaz asignada
+    if "novato" in interfaz.lower():
+        nivel_texto = "Novato"
+    elif "intermedio" in interfaz.lower():
+        nivel_texto = "Intermedio"
+    elif "experto" in interfaz.lower():
+        nivel_texto = "Experto"
+    else:
+        # Si no se puede determinar, usar el nivel por defecto
+        nivel_texto = "Novato"
+    
+    if estado_sesion.actual is None:
+        return None
+    
+    actual = estado_sesion.actual
+    eventos_actual = int(actual['ErroresSesion']) + int(actual['TareasCompletadas'])
+    
+    # Si la sesión actual tiene 0 eventos, actualizar la sesión completada (penúltima fila)
+    if estado_sesion.anterior is None:
+        fila = actual
+        descripcion = "única fila"
+    elif eventos_actual == 0:
+        fila = estado_sesion.anterior
+        descripcion = "sesión completada, penúltima fila"
+    else:
+        fila = actual
+        descripcion = "sesión actual, última fila"
+    
+    fila['NivelClasificado'] = nivel_texto
+    registro.debug("📝 Nivel actualizado en CSV (%s): %s", descripcion, nivel_texto)
+    return {"tipo": "nivel", "sesion": str(fila['SesionID']), "nivel": nivel_texto}
@@ -0,0 +1,436 @@
+"""
+Almacenamiento del historial de sesiones (intercambiable).
+
+El estado en memoria (src/estado_sesion.py) delega en un almacenamiento la
+lectura inicial y la escritura de los registros del diario:
+
+    csv     dataset_pos.csv + diario de solo anexado (src/diario_eventos.py)
+    sqlite  data/pos.db (sqlite3 en modo WAL) con una tabla de sesiones
+            indexada por SesionID y por hora de finalización, y una tabla
+            de eventos. Actualizar la sesión en curso es un solo UPDATE.
+
+El almacenamiento se elige con la clave "almacenamiento" de data/config.json.
+
+bloqueo() y firma() permiten a varios procesos compartir el historial: el
+bloqueo excluye a los demás procesos mientras se lee y escribe, y la firma
+(mtime, tamaño e inodo de los archivos) cambia con cada escritura.
+
+Migración desde el CSV y vuelta al formato Dataset_POS.csv:
+    python -m src.almacenamiento importar [data/dataset_pos.csv] [data/pos.db]
+    python -m src.almacenamiento exportar [data/pos.db] [data/Dataset_POS_export.csv]
+"""
+import csv
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from src import diario_eventos
+from src.bloqueo import bloqueo_archivo, escribir_atomico, limpiar_temporales
+from src.metricas import ETAPAS, cronometrar
+from src.diario_eventos import ARCHIVO_DIARIO, ARCHIVO_DATASET, COLUMNAS_DATASET, COLUMNAS_ALMACEN
+from src.config import obtener_almacenamiento, TIPOS_ALMACENAMIENTO
+
+NOMBRE_BASE_DATOS = "pos.db"
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sesion_id TEXT NOT NULL,
+    tiempo REAL NOT NULL DEFAULT 0,
+    errores INTEGER NOT NULL DEFAULT 0,
+    tareas INTEGER NOT NULL DEFAULT 0,
+    nivel TEXT NOT NULL DEFAULT '',
+    inicio REAL,
+    fin REAL,
+    suma_duracion REAL,
+    m2_duracion REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sesiones_sesion_id ON sesiones (sesion_id);
+CREATE INDEX IF NOT EXISTS idx_sesiones_fin ON sesiones (fin);
+-- Índice parcial: solo las sesiones con eventos (cargar() pregunta si hay alguna)
+CREATE INDEX IF NOT EXISTS idx_sesiones_con_eventos ON sesiones (id) WHERE errores > 0 OR tareas > 0;
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sesion INTEGER NOT NULL REFERENCES sesiones (id),
+    evento TEXT NOT NULL,
+    duracion REAL NOT NULL,
+    exito INTEGER NOT NULL,
+    tiempo_activo REAL,
+    ts REAL
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_sesion ON eventos (sesion);
+"""
+
+
+# Columnas agregadas después de la primera versión del esquema (migración con ALTER TABLE)
+COLUMNAS_AGREGADAS = {"suma_duracion": "REAL", "m2_duracion": "REAL"}
+
+_SELECCION_FILA = "sesion_id, tiempo, errores, tareas, nivel, suma_duracion, m2_duracion"
+
+
+def _fila(sesion_id, tiempo, errores, tareas, nivel, suma=None, m2=None):
+    """Fila con las columnas de Dataset_POS.csv y los acumuladores de duración"""
+    fila = {
+        "SesionID": sesion_id,
+        "TiempoPromedioAccion(s)": float(tiempo or 0),
+        "ErroresSesion": int(errores or 0),
+        "TareasCompletadas": int(tareas or 0),
+        "NivelClasificado": nivel or "",
+        "SumaDuracion(s)": suma,
+        "M2Duracion": m2,
+    }
+    _, fila["SumaDuracion(s)"], fila["M2Duracion"] = diario_eventos.acumuladores(fila)
+    return fila
+
+
+def _firma_archivos(*rutas):
+    firma = []
+    for ruta in rutas:
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            firma.append(None)
+            continue
+        firma.append((info.st_mtime_ns, info.st_size, info.st_ino))
+    return tuple(firma)
+
+
+def _inicio_desde_id(sesion_id):
+    """Hora de inicio codificada en el SesionID (S_AAAAMMDD_HHMMSS), o None"""
+    try:
+        return datetime.strptime(str(sesion_id)[2:17], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return None
+
+
+class AlmacenamientoCSV:
+    """dataset_pos.csv más el diario de solo anexado (comportamiento original)"""
+
+    tipo = "csv"
+
+    def __init__(self, archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
+        self.archivo_dataset = os.path.abspath(archivo_dataset)
+        self.archivo_diario = os.path.abspath(archivo_diario)
+        self.directorio = os.path.dirname(self.archivo_dataset)
+
+    def existe(self):
+        return os.path.exists(self.archivo_dataset)
+
+    def bloqueo(self):
+        return diario_eventos.lock_diario(self.archivo_diario)
+
+    def firma(self):
+        return _firma_archivos(self.archivo_dataset, self.archivo_diario)
+
+    def cargar(self):
+        """(anterior, actual, marcador, hay_eventos) leídos de disco"""
+        from src.logger import iniciar_diario
+
+        # Restos de una caída (se carga con el bloqueo tomado: nadie está escribiendo)
+        limpiar_temporales(self.archivo_dataset)
+        limpiar_temporales(self.archivo_diario)
+        diario_eventos.reparar_final(self.archivo_diario)
+
+        anterior = None
+        hay_eventos = False
+        # Solo la cola del CSV: toda sesión completada tiene al menos la venta como
+        # evento, así que si alguna sesión tiene eventos, una de las dos últimas también
+        filas = diario_eventos.leer_ultimas_sesiones(self.archivo_dataset, self.archivo_diario)
+        hay_eventos = any(f["ErroresSesion"] > 0 or f["TareasCompletadas"] > 0 for f in filas)
+        if len(filas) > 1:
+            anterior = filas[-2]
+
+        actual, marcador = diario_eventos.sesion_en_curso(self.archivo_diario)
+        if actual is None:
+            actual, marcador = iniciar_diario(self.archivo_dataset, self.archivo_diario)
+        return anterior, actual, marcador, hay_eventos
+
+    def crear(self, sesion_id, nivel="Novato"):
+        """Crea el dataset con una primera sesión vacía"""
+        def escribir(f):
+            writer = csv.writer(f)
+            writer.writerow(COLUMNAS_ALMACEN)
+            writer.writerow([sesion_id, 0, 0, 0, nivel, 0.0, 0.0])
+        with self.bloqueo():
+            escribir_atomico(self.archivo_dataset, escribir, newline="", encoding="utf-8")
+            diario_eventos.reiniciar(self.archivo_diario)
+
+    def anexar(self, registros):
+        diario_eventos.anexar(registros, self.archivo_diario)
+
+    def compactar(self, solicitada=False):
+        if solicitada or diario_eventos.necesita_compactar(self.archivo_diario):
+            with cronometrar(ETAPAS, "compactacion"):
+                diario_eventos.compactar(self.archivo_dataset, self.archivo_diario)
+
+    def reiniciar(self):
+        with self.bloqueo():
+            diario_eventos.reiniciar(self.archivo_diario)
+            if os.path.exists(self.archivo_dataset):
+                os.remove(self.archivo_dataset)
+
+    def contar_sesiones(self):
+        return diario_eventos.contar_sesiones(self.archivo_dataset, self.archivo_diario)
+
+    def filas(self):
+        """Todas las sesiones, en orden, como filas de Dataset_POS.csv"""
+        if not self.existe():
+            return []
+        filas = diario_eventos.leer_filas(self.archivo_dataset, self.archivo_diario)
+        return [_fila(*(fila[columna] for columna in COLUMNAS_ALMACEN)) for fila in filas]
+
+
+class AlmacenamientoSQLite:
+    """Sesiones y eventos en una base SQLite (modo WAL) junto al dataset"""
+
+    tipo = "sqlite"
+
+    def __init__(self, archivo_dataset=ARCHIVO_DATASET, archivo_base_datos=None, migrar=True):
+        self.archivo_dataset = os.path.abspath(archivo_dataset)
+        self.directorio = os.path.dirname(self.archivo_dataset)
+        self.archivo_base_datos = os.path.abspath(
+            archivo_base_datos or os.path.join(self.directorio, NOMBRE_BASE_DATOS)
+        )
+        self._local = threading.local()
+        self._lock_esquema = threading.Lock()
+        self._esquema_creado = False
+        self.migrar = migrar  # importar dataset_pos.csv al crear la base
+
+    def conexion(self):
+        """Conexión del hilo actual (sqlite3 no comparte conexiones entre hilos)"""
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            os.makedirs(self.directorio, exist_ok=True)
+            nueva = not os.path.exists(self.archivo_base_datos)
+            conexion = sqlite3.connect(self.archivo_base_datos, timeout=10)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            with self._lock_esquema:
+                if not self._esquema_creado:
+                    conexion.executescript(ESQUEMA_SQLITE)
+                    existentes = {c[1] for c in conexion.execute("PRAGMA table_info(sesiones)")}
+                    for columna, tipo in COLUMNAS_AGREGADAS.items():
+                        if columna not in existentes:
+                            conexion.execute(f"ALTER TABLE sesiones ADD COLUMN {columna} {tipo}")
+                    self._esquema_creado = True
+                    # Primera vez: migrar el historial existente de dataset_pos.csv
+                    if self.migrar and nueva and os.path.exists(self.archivo_dataset):
+                        csv_existente = AlmacenamientoCSV(
+                            self.archivo_dataset, diario_eventos.diario_junto_a(self.archivo_dataset)
+                        )
+                        self.importar(csv_existente.filas(), conexion)
+            self._local.conexion = conexion
+        return conexion
+
+    def existe(self):
+        return self.conexion().execute("SELECT 1 FROM sesiones LIMIT 1").fetchone() is not None
+
+    def bloqueo(self):
+        # SQLite ya serializa sus transacciones; este bloqueo cubre leer el
+        # estado y escribir los registros como una sola operación
+        return bloqueo_archivo(self.archivo_base_datos)
+
+    def firma(self):
+        # Cada commit en modo WAL escribe en pos.db-wal
+        return _firma_archivos(self.archivo_base_datos, f"{self.archivo_base_datos}-wal")
+
+    def cargar(self):
+        """(anterior, actual, marcador, hay_eventos): todo por índice, sin recorrer la tabla"""
+        conexion = self.conexion()
+        ultimas = conexion.execute(
+            f"SELECT {_SELECCION_FILA} FROM sesiones ORDER BY id DESC LIMIT 2"
+        ).fetchall()
+        hay_eventos = conexion.execute(
+            "SELECT EXISTS (SELECT 1 FROM sesiones INDEXED BY idx_sesiones_con_eventos "
+            "WHERE errores > 0 OR tareas > 0)"
+        ).fetchone()[0] == 1
+        if not ultimas:
+            return None, None, None, False
+
+        actual = _fila(*ultimas[0])
+        anterior = _fila(*ultimas[1]) if len(ultimas) > 1 else None
+        marcador = diario_eventos.marcador_sesion(
+            actual["SesionID"],
+            nivel=actual["NivelClasificado"],
+            base=diario_eventos.base_sesion(actual),
+            anterior=anterior["SesionID"] if anterior else None,
+        )
+        return anterior, actual, marcador, hay_eventos
+
+    def crear(self, sesion_id, nivel="Novato"):
+        with self.conexion() as conexion:
+            conexion.execute(
+                "INSERT INTO sesiones (sesion_id, nivel, inicio) VALUES (?, ?, ?)",
+                (sesion_id, nivel, time.time()),
+            )
+
+    def _id_sesion(self, conexion, sesion_id):
+        # La última fila con ese SesionID, igual que el plegado del diario
+        fila = conexion.execute(
+            f"SELECT id, {_SELECCION_FILA} FROM sesiones "
+            "WHERE sesion_id = ? ORDER BY id DESC LIMIT 1",
+            (sesion_id,),
+        ).fetchone()
+        return (fila[0], _fila(*fila[1:])) if fila else (None, None)
+
+    def anexar(self, registros):
+        """Aplica los registros del diario en una sola transacción"""
+        modificadas = {}  # id de sesión -> estado tras sus eventos
+        with self.conexion() as conexion:
+            for registro in diario_eventos.expandir_lotes(registros):
+                tipo = registro.get("tipo")
+                if tipo == "inicio_sesion":
+                    inicial = diario_eventos.estado_inicial(registro)
+                    ts = registro.get("ts") or time.time()
+                    if registro.get("anterior"):
+                        conexion.execute(
+                            "UPDATE sesiones SET fin = ? WHERE id = "
+                            "(SELECT MAX(id) FROM sesiones WHERE sesion_id = ?) AND fin IS NULL",
+                            (ts, registro["anterior"]),
+                        )
+                    if self._id_sesion(conexion, registro["sesion"])[0] is None:
+                        conexion.execute(
+                            "INSERT INTO sesiones (sesion_id, tiempo, errores, tareas, nivel, inicio, "
+                            "suma_duracion, m2_duracion) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (registro["sesion"], inicial["TiempoPromedioAccion(s)"], inicial["ErroresSesion"],
+                             inicial["TareasCompletadas"], inicial["NivelClasificado"], ts,
+                             inicial["SumaDuracion(s)"], inicial["M2Duracion"]),
+                        )
+                    continue
+
+                id_sesion, estado = self._id_sesion(conexion, registro.get("sesion"))
+                if id_sesion is None:
+                    continue
+                estado = modificadas.get(id_sesion, estado)
+                if tipo == "evento":
+                    conexion.execute(
+                        "INSERT INTO eventos (sesion, evento, duracion, exito, tiempo_activo, ts) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (id_sesion, registro["evento"], registro["duracion"], int(registro["exito"]),
+                         registro.get("tiempo_activo"), registro.get("ts")),
+                    )
+                    estado, _ = diario_eventos.aplicar_evento(
+                        estado, registro["duracion"], registro["exito"], registro.get("tiempo_activo")
+                    )
+                    modificadas[id_sesion] = estado
+                elif tipo == "nivel":
+                    conexion.execute("UPDATE sesiones SET nivel = ? WHERE id = ?", (registro["nivel"], id_sesion))
+                    if id_sesion in modificadas:
+                        modificadas[id_sesion]["NivelClasificado"] = registro["nivel"]
+
+            # Una sola actualización por sesión tocada (normalmente solo la sesión en curso)
+            for id_sesion, estado in modificadas.items():
+                conexion.execute(
+                    "UPDATE sesiones SET tiempo = ?, errores = ?, tareas = ?, "
+                    "suma_duracion = ?, m2_duracion = ? WHERE id = ?",
+                    (estado["TiempoPromedioAccion(s)"], estado["ErroresSesion"], estado["TareasCompletadas"],
+                     estado["SumaDuracion(s)"], estado["M2Duracion"], id_sesion),
+                )
+
+    def compactar(self, solicitada=False):
+        # Nada que plegar: solo devolver el WAL a la base cuando se pide
+        if solicitada:
+            with cronometrar(ETAPAS, "compactacion"):
+                self.conexion().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def reiniciar(self):
+        with self.conexion() as conexion:
+            conexion.execute("DELETE FROM eventos")
+            conexion.execute("DELETE FROM sesiones")
+
+    def contar_sesiones(self):
+        return self.conexion().execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+
+    def filas(self):
+        return [_fila(*fila) for fila in self.conexion().execute(
+            f"SELECT {_SELECCION_FILA} FROM sesiones ORDER BY id"
+        )]
+
+    def importar(self, filas, conexion=None):
+        """
+        Reemplaza el contenido por las filas de Dataset_POS.csv. La hora de inicio
+        sale del SesionID y la de finalización es el inicio de la sesión siguiente.
+        """
+        conexion = conexion or self.conexion()
+        inicios = [_inicio_desde_id(f["SesionID"]) for f in filas]
+        with conexion:
+            conexion.execute("DELETE FROM eventos")
+            conexion.execute("DELETE FROM sesiones")
+            conexion.executemany(
+                "INSERT INTO sesiones (sesion_id, tiempo, errores, tareas, nivel, inicio, fin, "
+                "suma_duracion, m2_duracion) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (str(f["SesionID"]).strip(), f["TiempoPromedioAccion(s)"], f["ErroresSesion"],
+                     f["TareasCompletadas"], f["NivelClasificado"], inicios[i],
+                     inicios[i + 1] if i + 1 < len(filas) else None,
+                     *diario_eventos.acumuladores(f)[1:])
+                    for i, f in enumerate(filas)
+                ],
+            )
+        return len(filas)
+
+
+def crear_almacenamiento(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO, tipo=None):
+    """Almacenamiento configurado (o el indicado) para el dataset"""
+    tipo = tipo or obtener_almacenamiento()
+    if tipo not in TIPOS_ALMACENAMIENTO:
+        raise ValueError(f"Almacenamiento desconocido: {tipo}")
+    if tipo == "sqlite":
+        return AlmacenamientoSQLite(archivo_dataset)
+    return AlmacenamientoCSV(archivo_dataset, archivo_diario)
+
+
+def _leer_filas_csv(archivo):
+    with open(archivo, newline="", encoding="utf-8") as f:
+        return [
+            _fila(
+                fila.get("SesionID", "").strip(),
+                float(fila.get("TiempoPromedioAccion(s)") or 0),
+                int(float(fila.get("ErroresSesion") or 0)),
+                int(float(fila.get("TareasCompletadas") or 0)),
+                fila.get("NivelClasificado", ""),
+                fila.get("SumaDuracion(s)") or None,
+                fila.get("M2Duracion") or None,
+            )
+            for fila in csv.DictReader(f)
+        ]
+
+
+def importar_csv(archivo_csv=ARCHIVO_DATASET, archivo_base_datos=None):
+    """Importa un CSV con formato Dataset_POS.csv a la base SQLite"""
+    # Sin la migración automática: las filas se importan una sola vez, aquí
+    almacen = AlmacenamientoSQLite(archivo_csv, archivo_base_datos, migrar=False)
+    filas = _leer_filas_csv(archivo_csv)
+    return almacen.importar(filas)
+
+
+def exportar_csv(almacen, destino):
+    """Escribe todas las sesiones del almacenamiento en formato Dataset_POS.csv"""
+    filas = almacen.filas()
+    def escribir(f):
+        writer = csv.writer(f)
+        writer.writerow(COLUMNAS_DATASET)
+        for fila in filas:
+            writer.writerow([fila[c] for c in COLUMNAS_DATASET])
+    escribir_atomico(destino, escribir, newline="", encoding="utf-8")
+    return len(filas)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("importar", "exportar"):
+        print("Uso: python -m src.almacenamiento importar|exportar [origen] [destino]")
+        sys.exit(1)
+
+    if sys.argv[1] == "importar":
+        origen = sys.argv[2] if len(sys.argv) > 2 else ARCHIVO_DATASET
+        destino = sys.argv[3] if len(sys.argv) > 3 else os.path.join(os.path.dirname(origen), NOMBRE_BASE_DATOS)
+        total = importar_csv(origen, destino)
+        print(f"✅ {total} sesiones importadas de {origen} a {destino}")
+    else:
+        origen = sys.argv[2] if len(sys.argv) > 2 else os.path.join("data", NOMBRE_BASE_DATOS)
+        destino = sys.argv[3] if len(sys.argv) > 3 else "data/Dataset_POS_export.csv"
+        almacen = AlmacenamientoSQLite(ARCHIVO_DATASET, origen)
+        total = exportar_csv(almacen, destino)
+        print(f"✅ {total} sesiones exportadas de {origen} a {destino}")
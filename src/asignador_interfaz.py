@@ -5,3 +5,12 @@ def asignar_interfaz(nivel_predicho):
         return "Intermedio → Interfaz equilibrada"
     else:
         return "Experto → Interfaz avanzada"
+
+def asignar_interfaces(niveles):
+    """Versión vectorizada de asignar_interfaz para un arreglo de niveles"""
+    import numpy as np
+    niveles = np.asarray(niveles, dtype=np.float64)
+    return np.where(
+        niveles < 40, "Novato → Interfaz simplificada",
+        np.where(niveles < 70, "Intermedio → Interfaz equilibrada", "Experto → Interfaz avanzada")
+    )
@@ -0,0 +1,159 @@
+"""
+Bloqueo entre procesos y escritura atómica de archivos.
+
+Para servir con varios procesos (p. ej. gunicorn -w 4) todas las escrituras
+del historial y de config.json se hacen con un bloqueo fcntl.flock,
+compartido por hilos y procesos, y los archivos que se
+reescriben enteros (dataset_pos.csv al compactar, config.json) se escriben en
+un temporal que se sincroniza a disco (fsync) antes de renombrarlo sobre el
+original: ante una caída queda la versión anterior o la nueva, nunca un
+archivo truncado.
+
+Modo multiproceso
+-----------------
+Cada proceso tiene su propio estado en memoria (src/estado_sesion.py). Con
+"multiproceso": true en data/config.json, cada cambio del estado de una
+terminal se hace con el bloqueo del almacenamiento tomado: si otro proceso
+escribió desde la última lectura se recarga el estado, y los registros se
+escriben antes de soltar el bloqueo (sin escritura diferida). Por ejemplo:
+
+    pip install gunicorn
+    gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 app:app
+
+Las notificaciones de /api/stream solo llegan a las páginas conectadas al
+mismo proceso; las demás reciben la nueva interfaz en la respuesta de la
+venta o consultando /api/estado.
+
+Los archivos de bloqueo van en DIRECTORIO_BLOQUEOS (uno por archivo
+protegido, nombrado por el hash de su ruta) y no en data/, para no dejar
+archivos en los directorios de datos ni en los de las terminales.
+En sistemas sin fcntl (Windows) el bloqueo es solo dentro del proceso.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DIRECTORIO_BLOQUEOS = os.path.join(tempfile.gettempdir(), "pos-bloqueos")
+
+
+class BloqueoArchivo:
+    """Lock reentrante entre hilos (RLock) y entre procesos (flock sobre un archivo de bloqueo)"""
+
+    def __init__(self, ruta):
+        self.protegido = ruta
+        huella = hashlib.sha1(ruta.encode("utf-8")).hexdigest()[:16]
+        self.ruta = os.path.join(DIRECTORIO_BLOQUEOS, f"{os.path.basename(ruta)}.{huella}.lock")
+        self._lock = threading.RLock()
+        self._profundidad = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        self._profundidad += 1
+        if self._profundidad > 1 or fcntl is None:
+            return True
+        try:
+            os.makedirs(DIRECTORIO_BLOQUEOS, exist_ok=True)
+            self._fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o666)
+        except BaseException:
+            self._profundidad -= 1
+            self._lock.release()
+            raise
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return True
+
+    def release(self):
+        self._profundidad -= 1
+        if self._profundidad == 0 and self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *excepcion):
+        self.release()
+
+
+_bloqueos = {}
+_lock_bloqueos = threading.Lock()
+
+
+def bloqueo_archivo(ruta):
+    """Bloqueo (único por proceso) del archivo indicado"""
+    clave = os.path.abspath(ruta)
+    bloqueo = _bloqueos.get(clave)
+    if bloqueo is None:
+        with _lock_bloqueos:
+            bloqueo = _bloqueos.setdefault(clave, BloqueoArchivo(clave))
+    return bloqueo
+
+
+def _sincronizar_directorio(directorio):
+    """fsync del directorio para que el renombrado sobreviva a una caída"""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def escribir_atomico(ruta, escribir, modo="w", **opciones):
+    """
+    Reemplaza ruta de forma atómica: escribir(f) escribe en un temporal del mismo
+    directorio, que se sincroniza a disco y se renombra sobre el original.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix=".tmp", dir=directorio)
+    try:
+        with os.fdopen(fd, modo, **opciones) as f:
+            escribir(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    _sincronizar_directorio(directorio)
+
+
+def limpiar_temporales(ruta):
+    """
+    Borra los temporales de escribir_atomico() que dejó una escritura
+    interrumpida (caída a mitad de escritura). El original sigue intacto; hay
+    que llamarla con el bloqueo de ruta tomado. Devuelve cuántos se borraron.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    prefijo = f".{os.path.basename(ruta)}."
+    try:
+        nombres = os.listdir(directorio)
+    except OSError:
+        return 0
+    borrados = 0
+    for nombre in nombres:
+        if nombre.startswith(prefijo) and nombre.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+                borrados += 1
+            except OSError:
+                pass
+    return borrados
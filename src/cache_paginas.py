@@ -0,0 +1,100 @@
+"""
+Caché de las páginas de interfaz ya renderizadas.
+
+Las plantillas de ui/ solo dependen de nivel_actual (y de url_for, fijo para la
+aplicación), así que cada página se renderiza una vez por versión de la
+plantilla y se guarda codificada en UTF-8 junto con su variante gzip. Las
+siguientes peticiones copian esos bytes, con un ETag fuerte para que el
+navegador revalide con 304 en lugar de descargar de nuevo la página.
+
+La entrada se invalida cuando cambia el archivo de la plantilla (mtime,
+tamaño o inodo), comprobado como mucho cada INTERVALO_COMPROBACION_S.
+"""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from flask import Response, render_template, request
+
+# Cada cuánto se comprueba si la plantilla cambió en disco
+INTERVALO_COMPROBACION_S = 1.0
+
+# Nivel de compresión: las páginas se comprimen una sola vez, conviene el máximo
+NIVEL_GZIP = 9
+
+# Revalidar siempre: la ruta decide (adaptación activa, terminal) antes de servir
+CACHE_CONTROL = "no-cache"
+
+
+class PaginaRenderizada:
+    """Bytes de una página y su variante gzip, con sus ETag"""
+
+    def __init__(self, html, firma):
+        self.cuerpo = html.encode("utf-8")
+        self.cuerpo_gzip = gzip.compress(self.cuerpo, compresslevel=NIVEL_GZIP, mtime=0)
+        huella = hashlib.sha1(self.cuerpo).hexdigest()[:20]
+        self.etag = huella
+        self.etag_gzip = f"{huella}-gz"
+        self.firma = firma
+        self.comprobado = time.monotonic()
+
+
+class CachePaginas:
+    """Páginas renderizadas por (plantilla, contexto)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._paginas = {}
+        self._lock = threading.Lock()
+
+    def _ruta_plantilla(self, plantilla):
+        return os.path.join(self.app.root_path, self.app.template_folder, plantilla)
+
+    def _firma(self, plantilla):
+        try:
+            info = os.stat(self._ruta_plantilla(plantilla))
+        except OSError:
+            return None
+        return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+    def obtener(self, plantilla, **contexto):
+        """Página renderizada (de la caché si la plantilla no cambió)"""
+        clave = (plantilla, tuple(sorted(contexto.items())))
+        pagina = self._paginas.get(clave)
+        ahora = time.monotonic()
+        if pagina is not None and ahora - pagina.comprobado < INTERVALO_COMPROBACION_S:
+            return pagina
+
+        firma = self._firma(plantilla)
+        if pagina is not None and firma == pagina.firma:
+            pagina.comprobado = ahora
+            return pagina
+
+        with self._lock:
+            pagina = self._paginas.get(clave)
+            if pagina is None or pagina.firma != firma:
+                pagina = PaginaRenderizada(render_template(plantilla, **contexto), firma)
+                self._paginas[clave] = pagina
+        return pagina
+
+    def servir(self, plantilla, **contexto):
+        """Respuesta con la página: 304 si el ETag coincide, gzip si el cliente lo acepta"""
+        pagina = self.obtener(plantilla, **contexto)
+        usar_gzip = "gzip" in request.accept_encodings
+        etag = pagina.etag_gzip if usar_gzip else pagina.etag
+
+        if request.if_none_match.contains(etag):
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(pagina.cuerpo_gzip if usar_gzip else pagina.cuerpo, mimetype="text/html")
+            if usar_gzip:
+                respuesta.headers["Content-Encoding"] = "gzip"
+        respuesta.set_etag(etag)
+        respuesta.headers["Cache-Control"] = CACHE_CONTROL
+        respuesta.headers["Vary"] = "Accept-Encoding"
+        return respuesta
+
+    def limpiar(self):
+        with self._lock:
+            self._paginas.clear()
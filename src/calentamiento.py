@@ -0,0 +1,127 @@
+"""
+Calentamiento del servidor al arrancar.
+
+Importar app.py no carga pandas, NumPy ni scikit-fuzzy: se importan dentro de
+las funciones que los usan, así que las herramientas de línea de comandos
+(src/main.py) y las pruebas no los pagan si no los necesitan. Las peticiones
+no usan pandas (solo las herramientas de análisis y src/main.py); NumPy y el
+motor se cargan en una fase de calentamiento explícita, antes de declararse
+listo, para que la primera venta después de un reinicio no sea lenta:
+
+    modulos     NumPy
+    config      data/config.json (adaptación, modo de clasificación...)
+    motor       clasificador del modo configurado y una evaluación de prueba
+    estado      estado en memoria de cada terminal con historial
+    plantillas  compilación de las plantillas de ui/ (Jinja)
+
+GET /healthz/ready responde 503 hasta que el calentamiento termina y 200
+después. `python app.py` calienta en segundo plano al arrancar; con gunicorn
+cada proceso calienta en post_worker_init (gunicorn.conf.py) antes de
+aceptar peticiones. Si nada lo inició, la primera consulta a /healthz/ready
+lo inicia.
+"""
+import importlib
+import threading
+import time
+from src.config import (
+    obtener_estado_adaptacion, obtener_modo_clasificacion, obtener_multiproceso,
+    obtener_server_timing, obtener_tiempo_max_evaluacion,
+)
+from src.metricas import ETAPAS, cronometrar
+from src.registro import obtener_registro
+
+registro = obtener_registro("calentamiento")
+
+MODULOS_PESADOS = ("numpy",)
+
+_listo = threading.Event()
+_lock = threading.Lock()
+_hilo = None
+_resumen = {"etapas": {}, "errores": {}, "segundos": None}
+
+
+def _modulos():
+    for nombre in MODULOS_PESADOS:
+        importlib.import_module(nombre)
+
+
+def _config():
+    obtener_estado_adaptacion()
+    obtener_modo_clasificacion()
+    obtener_multiproceso()
+    obtener_server_timing()
+    obtener_tiempo_max_evaluacion()
+
+
+def _motor():
+    from src.adaptador import obtener_clasificador
+    from src.asignador_interfaz import asignar_interfaz
+
+    clasificador = obtener_clasificador(obtener_modo_clasificacion())
+    try:
+        asignar_interfaz(clasificador.calcular(2.0, 1, 10))
+    except ValueError:
+        # Combinación sin regla activa: el motor ya está construido igual
+        pass
+
+
+def _estado():
+    from src.estado_sesion import obtener_estado_terminal
+    from src.terminales import listar_terminales
+
+    for terminal in listar_terminales():
+        obtener_estado_terminal(terminal).cargar()
+
+
+def _plantillas(app):
+    for plantilla in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(plantilla)
+
+
+def calentar(app):
+    """Ejecuta todas las etapas (en este hilo) y marca el servidor como listo"""
+    etapas = (
+        ("modulos", _modulos),
+        ("config", _config),
+        ("motor", _motor),
+        ("estado", _estado),
+        ("plantillas", lambda: _plantillas(app)),
+    )
+    inicio = time.perf_counter()
+    with cronometrar(ETAPAS, "calentamiento"):
+        for nombre, etapa in etapas:
+            inicio_etapa = time.perf_counter()
+            try:
+                etapa()
+            except Exception as e:
+                # Una etapa fallida no impide atender: esa parte se inicializa en la primera petición
+                _resumen["errores"][nombre] = str(e)
+                registro.warning("Calentamiento: falló la etapa %s: %s", nombre, e)
+            _resumen["etapas"][nombre] = round((time.perf_counter() - inicio_etapa) * 1000, 2)
+    _resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+    _listo.set()
+    registro.info("Servidor listo", extra={"campos": {"calentamiento_s": _resumen["segundos"], **_resumen["etapas"]}})
+
+
+def iniciar(app):
+    """Inicia el calentamiento en segundo plano (una sola vez por proceso)"""
+    global _hilo
+    with _lock:
+        if _hilo is None and not _listo.is_set():
+            _hilo = threading.Thread(target=calentar, args=(app,), name="calentamiento", daemon=True)
+            _hilo.start()
+    return _hilo
+
+
+def esta_listo():
+    return _listo.is_set()
+
+
+def esperar(timeout=None):
+    """Espera a que termine el calentamiento; devuelve True si el servidor está listo"""
+    return _listo.wait(timeout)
+
+
+def resumen():
+    """Duración de cada etapa en ms, errores y total en segundos"""
+    return {"listo": esta_listo(), **_resumen}
@@ -0,0 +1,110 @@
+"""
+Clasificación vectorizada de muchas sesiones en una sola pasada.
+
+Aplica las mismas reglas que evaluar_y_asignar() a cada fila (normalización,
+caso de usuario sin eventos y evaluación simple de respaldo cuando ninguna
+regla difusa se activa), pero sobre arreglos completos con el motor compilado
+en lugar de una llamada al motor por fila.
+"""
+import numpy as np
+from src.motor_compilado import obtener_motor_compilado
+from src.asignador_interfaz import asignar_interfaces
+
+COLUMNA_TIEMPO = 'TiempoPromedioAccion(s)'
+COLUMNA_ERRORES = 'ErroresSesion'
+COLUMNA_TAREAS = 'TareasCompletadas'
+COLUMNAS_ENTRADA = (COLUMNA_TIEMPO, COLUMNA_ERRORES, COLUMNA_TAREAS)
+
+# Nivel asignado a sesiones sin eventos (igual que evaluar_y_asignar)
+NIVEL_SIN_EVENTOS = 30.0
+
+
+def _a_numerico(valores):
+    """Convierte a float64; valores no numéricos o vacíos se tratan como 0"""
+    arreglo = np.asarray(valores)
+    if arreglo.dtype.kind not in 'iufb':
+        arreglo = np.array([_a_float(v) for v in arreglo.ravel()], dtype=np.float64)
+    arreglo = arreglo.astype(np.float64, copy=False)
+    return np.nan_to_num(arreglo, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _a_float(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def nivel_texto(interfaces):
+    """NivelClasificado ('Novato', 'Intermedio', 'Experto') a partir de las etiquetas de interfaz"""
+    interfaces = np.asarray(interfaces)
+    return np.where(
+        np.char.startswith(interfaces, "Experto"), "Experto",
+        np.where(np.char.startswith(interfaces, "Intermedio"), "Intermedio", "Novato")
+    )
+
+
+def clasificar_arreglos(tiempos, errores, tareas):
+    """
+    Clasifica arreglos de métricas de sesión.
+
+    Args:
+        tiempos: TiempoPromedioAccion(s) por sesión
+        errores: ErroresSesion por sesión
+        tareas: TareasCompletadas por sesión
+
+    Returns:
+        (niveles, interfaces): np.ndarray de float64 y np.ndarray de etiquetas
+    """
+    tiempos = _a_numerico(tiempos)
+    errores = _a_numerico(errores)
+    tareas = _a_numerico(tareas)
+    if not (tiempos.shape == errores.shape == tareas.shape):
+        raise ValueError("Las columnas de entrada deben tener la misma longitud")
+
+    # Normalizar al rango del motor difuso (errores y tareas se truncan a enteros)
+    tiempo_norm = np.clip(tiempos, 0, 10.0)
+    errores_norm = np.clip(np.trunc(errores), 0, 10)
+    tareas_norm = np.clip(np.trunc(tareas), 0, 30)
+
+    niveles = obtener_motor_compilado().calcular_lote(tiempo_norm, errores_norm, tareas_norm)
+    niveles = np.clip(niveles, 0, 100)
+
+    # Respaldo cuando ninguna regla se activa (mismas reglas que evaluar_y_asignar)
+    sin_nivel = np.isnan(niveles)
+    if sin_nivel.any():
+        respaldo = np.select(
+            [(tiempos > 7) | (errores > 5), (tiempos < 3) & (errores < 2) & (tareas > 15)],
+            [25.0, 75.0],
+            default=50.0
+        )
+        niveles = np.where(sin_nivel, respaldo, niveles)
+
+    # Sesiones sin eventos → Novato por defecto
+    sin_eventos = (np.trunc(errores) + np.trunc(tareas)) == 0
+    niveles = np.where(sin_eventos, NIVEL_SIN_EVENTOS, niveles)
+
+    return niveles, asignar_interfaces(niveles)
+
+
+def clasificar_lote(datos):
+    """
+    Clasifica un DataFrame (o dict de columnas) con el formato de Dataset_POS.csv.
+
+    Returns:
+        Copia del DataFrame con las columnas NivelUsuario, Interfaz y NivelClasificado
+    """
+    import pandas as pd
+    df = datos if isinstance(datos, pd.DataFrame) else pd.DataFrame(datos)
+    faltantes = [c for c in COLUMNAS_ENTRADA if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas: {', '.join(faltantes)}")
+
+    niveles, interfaces = clasificar_arreglos(
+        df[COLUMNA_TIEMPO].to_numpy(), df[COLUMNA_ERRORES].to_numpy(), df[COLUMNA_TAREAS].to_numpy()
+    )
+    resultado = df.copy()
+    resultado['NivelUsuario'] = niveles
+    resultado['Interfaz'] = interfaces
+    resultado['NivelClasificado'] = nivel_texto(interfaces)
+    return resultado
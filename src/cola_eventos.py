@@ -0,0 +1,160 @@
+"""
+Cola ordenada de procesamiento de eventos.
+
+/api/evento y /api/eventos encolan los eventos y responden de inmediato; unos
+hilos trabajadores los aplican (registrar_eventos y, al completar una venta,
+la evaluación) en el mismo orden en que llegaron. Cada terminal se asigna
+siempre al mismo trabajador, así que su orden se conserva y terminales
+distintas se procesan en paralelo.
+
+Solo compra_finalizada espera su resultado, con un tiempo máximo; si la cola
+va atrasada la petición recibe una respuesta de respaldo y la evaluación
+llega después por /api/stream.
+
+metricas() expone la profundidad de la cola y las latencias de encolado,
+espera y procesamiento.
+"""
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from src.registro import obtener_registro
+from src.metricas import tramos_activos, anotar_tramo
+
+registro = obtener_registro("cola_eventos")
+
+# Hilos trabajadores (cada terminal va siempre al mismo)
+NUM_TRABAJADORES = 4
+
+
+class EstadisticaLatencia:
+    """Contador, suma y máximo de una latencia en segundos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contador = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.ultimo = 0.0
+
+    def registrar(self, segundos):
+        with self._lock:
+            self.contador += 1
+            self.total += segundos
+            self.ultimo = segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "contador": self.contador,
+                "promedio_ms": round(self.total / self.contador * 1000, 3) if self.contador else 0.0,
+                "maximo_ms": round(self.maximo * 1000, 3),
+                "ultimo_ms": round(self.ultimo * 1000, 3),
+            }
+
+
+class ColaEventos:
+    """Cola de lotes de eventos por terminal, procesados en orden por hilos trabajadores"""
+
+    def __init__(self, procesar, trabajadores=NUM_TRABAJADORES):
+        # procesar(terminal, eventos) -> respuesta (se ejecuta en un hilo trabajador)
+        self.procesar = procesar
+        self._colas = [queue.Queue() for _ in range(trabajadores)]
+        self._hilos = []
+        self._lock_hilos = threading.Lock()
+
+        # Lotes pendientes por terminal (para que las lecturas vean sus propios eventos)
+        self._pendientes = {}
+        self._condicion = threading.Condition()
+
+        self.latencia_encolado = EstadisticaLatencia()
+        self.latencia_espera = EstadisticaLatencia()
+        self.latencia_procesamiento = EstadisticaLatencia()
+        self.procesados = 0
+        self.errores = 0
+        self.respaldos = 0
+
+    def _iniciar(self):
+        if self._hilos:
+            return
+        with self._lock_hilos:
+            if self._hilos:
+                return
+            for i, cola in enumerate(self._colas):
+                hilo = threading.Thread(target=self._trabajar, args=(cola,), name=f"cola-eventos-{i}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+
+    def _cola_de(self, terminal):
+        return self._colas[zlib.crc32(terminal.encode("utf-8")) % len(self._colas)]
+
+    def encolar(self, terminal, eventos, esperar=False, tramos=None):
+        """Encola un lote ordenado; devuelve un Future con la respuesta si esperar=True
+
+        tramos: dict de tramos de la petición (Server-Timing) donde anotar la
+        espera en la cola y las etapas del procesamiento.
+        """
+        inicio = time.perf_counter()
+        self._iniciar()
+        futuro = Future() if esperar else None
+        with self._condicion:
+            self._pendientes[terminal] = self._pendientes.get(terminal, 0) + 1
+        self._cola_de(terminal).put((terminal, eventos, futuro, tramos, time.perf_counter()))
+        self.latencia_encolado.registrar(time.perf_counter() - inicio)
+        return futuro
+
+    def _trabajar(self, cola):
+        while True:
+            terminal, eventos, futuro, tramos, encolado = cola.get()
+            inicio = time.perf_counter()
+            self.latencia_espera.registrar(inicio - encolado)
+            try:
+                with tramos_activos(tramos):
+                    anotar_tramo("cola", inicio - encolado)
+                    respuesta = self.procesar(terminal, eventos)
+                if futuro is not None:
+                    futuro.set_result(respuesta)
+            except Exception as e:
+                self.errores += 1
+                registro.exception("Error al procesar eventos de la terminal %s: %s", terminal, e)
+                if futuro is not None:
+                    futuro.set_exception(e)
+            finally:
+                self.latencia_procesamiento.registrar(time.perf_counter() - inicio)
+                self.procesados += len(eventos)
+                with self._condicion:
+                    self._pendientes[terminal] -= 1
+                    if not self._pendientes[terminal]:
+                        del self._pendientes[terminal]
+                    self._condicion.notify_all()
+
+    def pendientes(self, terminal):
+        with self._condicion:
+            return self._pendientes.get(terminal, 0)
+
+    def esperar_terminal(self, terminal, timeout=None):
+        """Espera a que se procesen los lotes encolados de la terminal; False si se agota el tiempo"""
+        with self._condicion:
+            return self._condicion.wait_for(lambda: not self._pendientes.get(terminal), timeout)
+
+    def esperar_todo(self, timeout=None):
+        with self._condicion:
+            return self._condicion.wait_for(lambda: not self._pendientes, timeout)
+
+    def profundidad(self):
+        return sum(cola.qsize() for cola in self._colas)
+
+    def metricas(self):
+        return {
+            "profundidad": self.profundidad(),
+            "profundidad_por_trabajador": [cola.qsize() for cola in self._colas],
+            "eventos_procesados": self.procesados,
+            "errores": self.errores,
+            "respaldos_por_tiempo": self.respaldos,
+            "latencia_encolado": self.latencia_encolado.resumen(),
+            "latencia_espera": self.latencia_espera.resumen(),
+            "latencia_procesamiento": self.latencia_procesamiento.resumen(),
+        }
@@ -1,39 +1,193 @@
 import os
 import json
+import threading
+import time
+from src.bloqueo import bloqueo_archivo, escribir_atomico
 
 CONFIG_FILE = "data/config.json"
 
+# Configuración por defecto
+CONFIG_POR_DEFECTO = {
+    "adaptacion_activa": True
+}
+
+# Cada cuánto se comprueba si config.json cambió en disco (otro proceso/worker).
+# Es el retraso máximo con que un worker ve un cambio hecho por otro.
+INTERVALO_COMPROBACION_S = 0.5
+
+# Caché en memoria por ruta absoluta de config.json
+_cache = {}
+_lock_config = threading.Lock()
+
+# Versión de la configuración en este proceso: crece cada vez que cambia (ETag)
+_version = 0
+
+
+def _firma(ruta):
+    """Identifica la versión del archivo en disco (None si no existe)"""
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return None
+    # os.replace cambia el inodo: detecta escrituras atómicas dentro del mismo tick de mtime
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+
+def _config():
+    """Configuración en caché (no copiar: solo lectura)"""
+    ruta = os.path.abspath(CONFIG_FILE)
+    entrada = _cache.get(ruta)
+    ahora = time.monotonic()
+    if entrada is not None and ahora - entrada["comprobado"] < INTERVALO_COMPROBACION_S:
+        return entrada["config"]
+
+    with _lock_config:
+        entrada = _cache.get(ruta)
+        firma = _firma(ruta)
+        if entrada is not None and firma == entrada["firma"]:
+            entrada["comprobado"] = ahora
+            return entrada["config"]
+
+        if firma is None:
+            # Primera vez: crear el archivo con la configuración por defecto
+            config = dict(CONFIG_POR_DEFECTO)
+            firma = _escribir(ruta, config)
+        else:
+            config = _leer(ruta)
+            if config is None:
+                # Ilegible: conservar la última configuración válida sin reescribir el archivo
+                config = entrada["config"] if entrada is not None else dict(CONFIG_POR_DEFECTO)
+        _cache[ruta] = {"config": config, "firma": firma, "comprobado": ahora}
+        _incrementar_version()
+        return config
+
+
+def _incrementar_version():
+    global _version
+    _version += 1
+
+
+def version_config():
+    """Versión monótona de la configuración (cambia con cada recarga o escritura)"""
+    _config()
+    return _version
+
+
+def _leer(ruta):
+    """config.json leído de disco, o None si falta o no es válido"""
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir(ruta, config):
+    """Escritura atómica (temporal + fsync + os.replace); devuelve la firma del archivo nuevo"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    escribir_atomico(ruta, lambda f: json.dump(config, f, indent=2), encoding='utf-8')
+    return _firma(ruta)
+
+
 def cargar_config():
-    """Carga la configuración del sistema"""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    
-    # Configuración por defecto
-    config = {
-        "adaptacion_activa": True
-    }
-    guardar_config(config)
-    return config
+    """Carga la configuración del sistema (copia de la caché en memoria)"""
+    return dict(_config())
 
 def guardar_config(config):
-    """Guarda la configuración del sistema"""
-    os.makedirs("data", exist_ok=True)
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2)
+    """Guarda la configuración del sistema y actualiza la caché de este proceso"""
+    ruta = os.path.abspath(CONFIG_FILE)
+    with bloqueo_archivo(ruta), _lock_config:
+        config = dict(config)
+        firma = _escribir(ruta, config)
+        _cache[ruta] = {"config": config, "firma": firma, "comprobado": time.monotonic()}
+        _incrementar_version()
+
+def actualizar_config(**cambios):
+    """Cambia claves de config.json leyéndolo de disco con el bloqueo entre procesos
+    tomado, para no pisar lo que otro worker haya guardado entretanto"""
+    ruta = os.path.abspath(CONFIG_FILE)
+    with bloqueo_archivo(ruta):
+        config = _leer(ruta)
+        if config is None:
+            config = cargar_config()
+        config.update(cambios)
+        guardar_config(config)
+    return config
+
+def invalidar_config():
+    """Fuerza a releer config.json en la próxima consulta (aviso de cambio externo)"""
+    with _lock_config:
+        _cache.clear()
+        _incrementar_version()
 
 def obtener_estado_adaptacion():
     """Obtiene el estado actual de la adaptación"""
-    config = cargar_config()
-    return config.get("adaptacion_activa", True)
+    return _config().get("adaptacion_activa", True)
 
 def establecer_estado_adaptacion(activa):
     """Establece el estado de la adaptación"""
-    config = cargar_config()
-    config["adaptacion_activa"] = activa
-    guardar_config(config)
+    actualizar_config(adaptacion_activa=activa)
     return activa
 
+
+MODOS_CLASIFICACION = ("compilado", "tabla", "skfuzzy")
+
+def obtener_modo_clasificacion():
+    """Obtiene el modo de clasificación configurado (compilado, tabla o skfuzzy)"""
+    config = _config()
+    modo = config.get("modo_clasificacion", "compilado")
+    return modo if modo in MODOS_CLASIFICACION else "compilado"
+
+def obtener_pasos_tabla():
+    """Obtiene los pasos de la malla de la tabla de clasificación (None = por defecto)"""
+    config = _config()
+    return config.get("pasos_tabla_clasificacion")
+
+def obtener_intervalo_escritura():
+    """Segundos entre escrituras diferidas del estado de sesión al diario"""
+    config = _config()
+    try:
+        return max(0.05, float(config.get("intervalo_escritura_s", 1.0)))
+    except (TypeError, ValueError):
+        return 1.0
+
+def obtener_intervalo_compactacion():
+    """Segundos mínimos entre compactaciones solicitadas del diario en el CSV (agrupa las ventas)"""
+    config = _config()
+    try:
+        return max(0.0, float(config.get("intervalo_compactacion_s", 5.0)))
+    except (TypeError, ValueError):
+        return 5.0
+
+TIPOS_ALMACENAMIENTO = ("csv", "sqlite")
+
+def obtener_almacenamiento():
+    """Obtiene el almacenamiento configurado del historial de sesiones (csv o sqlite)"""
+    config = _config()
+    tipo = config.get("almacenamiento", "csv")
+    return tipo if tipo in TIPOS_ALMACENAMIENTO else "csv"
+
+def obtener_tiempo_max_evaluacion():
+    """Segundos que /api/evento espera la evaluación de una venta antes de responder sin ella"""
+    config = _config()
+    try:
+        return max(0.0, float(config.get("tiempo_max_evaluacion_s", 2.0)))
+    except (TypeError, ValueError):
+        return 2.0
+
+def obtener_multiproceso():
+    """¿Se sirve con varios procesos? (estado recargado y escrito bajo bloqueo, src/bloqueo.py)"""
+    return bool(_config().get("multiproceso", False))
+
+def obtener_nivel_registro():
+    """Nivel del registro del sistema (src/registro.py): DEBUG muestra los banners detallados"""
+    return str(_config().get("nivel_registro", "INFO")).upper()
+
+def obtener_formato_registro():
+    """Formato del registro del sistema: "texto" o "json" (una línea JSON por registro)"""
+    formato = _config().get("formato_registro", "texto")
+    return formato if formato in ("texto", "json") else "texto"
+
+def obtener_server_timing():
+    """¿Se agrega la cabecera Server-Timing con los tramos de cada petición? (src/metricas.py)"""
+    return bool(_config().get("server_timing", False))
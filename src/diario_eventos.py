@@ -0,0 +1,593 @@
+"""
+Diario de eventos de solo anexado (append-only).
+
+Cada evento del POSTracker se registra con una sola escritura al final de
+data/eventos_pos.jsonl, en lugar de leer y reescribir todo dataset_pos.csv.
+
+Registros del diario (una línea JSON cada uno):
+    {"tipo": "inicio_sesion", "sesion": ..., "nivel": ..., "base": {...}, "anterior": ...}
+    {"tipo": "evento", "sesion": ..., "evento": ..., "duracion": ..., "exito": ..., "tiempo_activo": ...}
+    {"tipo": "nivel", "sesion": ..., "nivel": ...}
+    {"tipo": "lote", "registros": [...]}
+
+Un lote agrupa los registros de una venta (evento compra_finalizada, marcador
+de la sesión nueva y nivel clasificado) en una sola línea: si una caída corta
+la escritura, la línea incompleta se descarta entera y la venta no queda a
+medias. Al leer, los lotes se sustituyen por su contenido.
+
+Toda sesión empieza con un registro inicio_sesion, así que las métricas de la
+sesión en curso se obtienen leyendo el diario desde el final hasta el último
+inicio_sesion (coste proporcional a la sesión, no al histórico).
+
+La compactación pliega el diario en dataset_pos.csv (mismo formato que
+Dataset_POS.csv) y deja en el diario solo un punto de control de la sesión
+en curso.
+
+Las filas del dataset se manejan como dicts (fila_desde_csv) con el módulo
+csv: la ruta de las peticiones no usa pandas. leer_dataset devuelve un
+DataFrame para las herramientas de análisis.
+
+Anexados, compactaciones y borrados toman el bloqueo del diario, que también
+excluye a otros procesos (src/bloqueo.py).
+"""
+import csv
+import io
+import json
+import os
+import time
+from src.bloqueo import bloqueo_archivo, escribir_atomico
+from src.registro import obtener_registro
+
+registro = obtener_registro("diario")
+
+ARCHIVO_DIARIO = "data/eventos_pos.jsonl"
+ARCHIVO_DATASET = "data/dataset_pos.csv"
+
+COLUMNAS_DATASET = ["SesionID", "TiempoPromedioAccion(s)", "ErroresSesion", "TareasCompletadas", "NivelClasificado"]
+
+# Acumuladores exactos de las duraciones de cada sesión (suma y M2 de Welford;
+# la cuenta es ErroresSesion + TareasCompletadas). dataset_pos.csv los guarda
+# después de las columnas de Dataset_POS.csv; la exportación no los incluye.
+COLUMNAS_ACUMULADORES = ["SumaDuracion(s)", "M2Duracion"]
+COLUMNAS_ALMACEN = COLUMNAS_DATASET + COLUMNAS_ACUMULADORES
+
+# Tamaño del diario a partir del cual registrar_evento compacta
+UMBRAL_COMPACTACION_BYTES = 256 * 1024
+
+# Bloque de lectura al recorrer el diario desde el final
+_BLOQUE_COLA = 8192
+
+
+def diario_junto_a(archivo_dataset):
+    """Diario (eventos_pos.jsonl) que corresponde al dataset: el de su mismo directorio"""
+    return os.path.join(os.path.dirname(archivo_dataset), os.path.basename(ARCHIVO_DIARIO))
+
+
+def lock_diario(archivo=ARCHIVO_DIARIO):
+    """Bloqueo del diario indicado, entre hilos y procesos (uno por diario:
+    cada terminal tiene su propio diario y no compite con las demás)"""
+    return bloqueo_archivo(archivo)
+
+
+def anexar(registros, archivo=ARCHIVO_DIARIO):
+    """Anexa uno o varios registros al diario con una sola escritura (sincronizada a disco)"""
+    lineas = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+    with lock_diario(archivo):
+        with open(archivo, "a", encoding="utf-8") as f:
+            f.write(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def reparar_final(archivo=ARCHIVO_DIARIO):
+    """
+    Quita la última línea si quedó a medias (caída a mitad de anexar): si no,
+    el siguiente anexado la continuaría y el registro nuevo también se perdería.
+    Devuelve los bytes descartados.
+    """
+    with lock_diario(archivo):
+        if not os.path.exists(archivo):
+            return 0
+        with open(archivo, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            tamano = f.tell()
+            if tamano == 0:
+                return 0
+            f.seek(tamano - 1)
+            if f.read(1) == b"\n":
+                return 0
+            # Buscar el último salto de línea hacia atrás
+            posicion = tamano
+            corte = 0
+            while posicion > 0:
+                leer = min(_BLOQUE_COLA, posicion)
+                posicion -= leer
+                f.seek(posicion)
+                bloque = f.read(leer)
+                salto = bloque.rfind(b"\n")
+                if salto >= 0:
+                    corte = posicion + salto + 1
+                    break
+            f.truncate(corte)
+            f.flush()
+            os.fsync(f.fileno())
+    registro.warning("Diario %s: descartada una línea incompleta de %d bytes", archivo, tamano - corte)
+    return tamano - corte
+
+
+def lote(registros):
+    """Registro que agrupa varios en una sola línea del diario (se aplican todos o ninguno)"""
+    return {"tipo": "lote", "registros": list(registros)}
+
+
+def expandir_lotes(registros):
+    """Registros con cada lote sustituido por su contenido, en orden"""
+    expandidos = []
+    for registro in registros:
+        if registro.get("tipo") == "lote":
+            expandidos.extend(registro["registros"])
+        else:
+            expandidos.append(registro)
+    return expandidos
+
+
+def _leer_todo(archivo):
+    if not os.path.exists(archivo):
+        return []
+    registros = []
+    with open(archivo, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                registros.append(json.loads(linea))
+            except json.JSONDecodeError:
+                # Línea truncada por una caída a mitad de escritura: se ignora
+                continue
+    return expandir_lotes(registros)
+
+
+def _registros_de(datos):
+    """Registros de las líneas JSON de un bloque (las que no se pueden leer se ignoran)"""
+    registros = []
+    for linea in datos.decode("utf-8", errors="ignore").splitlines():
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            registros.append(json.loads(linea))
+        except json.JSONDecodeError:
+            # Línea truncada por una caída a mitad de escritura
+            continue
+    return registros
+
+
+def leer_cola(archivo=ARCHIVO_DIARIO):
+    """
+    Registros de la sesión en curso: desde el último inicio_sesion hasta el final.
+    Lee el archivo hacia atrás por bloques, sin recorrer el histórico, hasta que
+    una línea completa (que empieza después de un salto de línea o al principio
+    del archivo) contiene un marcador, suelto o dentro de un lote.
+    """
+    if not os.path.exists(archivo):
+        return []
+    registros = []
+    with open(archivo, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b""
+        while posicion > 0:
+            leer = min(_BLOQUE_COLA, posicion)
+            posicion -= leer
+            f.seek(posicion)
+            datos = f.read(leer) + datos
+            # La primera línea del bloque puede estar cortada (salvo al principio del archivo)
+            completas = datos if posicion == 0 else datos[datos.find(b"\n") + 1:] if b"\n" in datos else b""
+            if b'"tipo": "inicio_sesion"' not in completas:
+                continue
+            # El marcador de una venta va dentro de su lote
+            registros = expandir_lotes(_registros_de(completas))
+            if any(r.get("tipo") == "inicio_sesion" for r in registros):
+                break
+
+    for i in range(len(registros) - 1, -1, -1):
+        if registros[i].get("tipo") == "inicio_sesion":
+            return registros[i:]
+    return []
+
+
+def numero(valor, defecto=0.0):
+    """float de un valor del CSV o del diario (None, "" y NaN -> defecto)"""
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return defecto
+    return defecto if numero != numero else numero
+
+
+def acumuladores(fila):
+    """
+    (eventos, suma, m2) de las duraciones de la sesión. Las filas guardadas antes
+    de existir los acumuladores se aproximan con su promedio y varianza cero.
+    """
+    eventos = int(numero(fila.get("ErroresSesion"))) + int(numero(fila.get("TareasCompletadas")))
+    suma = numero(fila.get("SumaDuracion(s)"), None)
+    if suma is None:
+        return eventos, numero(fila.get("TiempoPromedioAccion(s)")) * eventos, 0.0
+    return eventos, suma, numero(fila.get("M2Duracion"))
+
+
+def varianza_duracion(fila):
+    """Varianza muestral de las duraciones de la sesión (0 con menos de dos eventos)"""
+    eventos, _, m2 = acumuladores(fila)
+    return m2 / (eventos - 1) if eventos > 1 else 0.0
+
+
+def base_sesion(fila):
+    """Base de un marcador inicio_sesion con las métricas y acumuladores de la fila"""
+    eventos, suma, m2 = acumuladores(fila)
+    return {
+        "tiempo": numero(fila.get("TiempoPromedioAccion(s)")),
+        "errores": int(numero(fila.get("ErroresSesion"))),
+        "tareas": int(numero(fila.get("TareasCompletadas"))),
+        "suma": suma,
+        "m2": m2,
+    }
+
+
+def estado_inicial(marcador):
+    """Métricas de una sesión al abrirse (base del marcador, cero si es nueva)"""
+    base = marcador.get("base") or {}
+    estado = {
+        "SesionID": marcador["sesion"],
+        "TiempoPromedioAccion(s)": base.get("tiempo", 0),
+        "ErroresSesion": int(base.get("errores", 0)),
+        "TareasCompletadas": int(base.get("tareas", 0)),
+        "NivelClasificado": marcador.get("nivel", ""),
+        "SumaDuracion(s)": base.get("suma"),
+        "M2Duracion": base.get("m2", 0.0),
+    }
+    _, estado["SumaDuracion(s)"], estado["M2Duracion"] = acumuladores(estado)
+    return estado
+
+
+def aplicar_evento(estado, duracion, exito=True, tiempo_activo=None):
+    """
+    Aplica un evento a las métricas de la sesión en O(1) y devuelve (nuevo_estado, tiempo_nuevo).
+
+    La suma y el M2 de las duraciones se actualizan exactos (Welford); el tiempo
+    promedio se deriva de ellos, acotado a [1, 10] s, y se guarda redondeado a 2
+    decimales como en el CSV sin volver a usarse para el siguiente evento.
+    """
+    eventos_totales, suma, m2 = acumuladores(estado)
+    errores = int(estado["ErroresSesion"])
+    tareas = int(estado["TareasCompletadas"])
+
+    if exito:
+        tareas += 1
+    else:
+        errores += 1
+    eventos_totales += 1
+
+    media_anterior = suma / (eventos_totales - 1) if eventos_totales > 1 else 0.0
+    suma += duracion
+    media = suma / eventos_totales
+    m2 += (duracion - media_anterior) * (duracion - media)
+
+    # PRIORIDAD: Si tenemos tiempo activo, usarlo para calcular mejor el tiempo promedio por acción
+    if tiempo_activo is not None and tiempo_activo > 0:
+        tiempo_nuevo = min(10.0, max(1.0, tiempo_activo / eventos_totales))
+    else:
+        # Promedio exacto de las duraciones, con mínimo de 1 segundo
+        tiempo_nuevo = min(10.0, max(1.0, media))
+
+    nuevo = dict(estado)
+    nuevo["TiempoPromedioAccion(s)"] = round(tiempo_nuevo, 2)
+    nuevo["ErroresSesion"] = errores
+    nuevo["TareasCompletadas"] = tareas
+    nuevo["SumaDuracion(s)"] = suma
+    nuevo["M2Duracion"] = m2
+    return nuevo, tiempo_nuevo
+
+
+def plegar_sesion(registros):
+    """Reconstruye las métricas de una sesión a partir de sus registros (marcador primero)"""
+    estado = estado_inicial(registros[0])
+    for registro in registros[1:]:
+        if registro.get("tipo") == "evento":
+            estado, _ = aplicar_evento(estado, registro["duracion"], registro["exito"], registro.get("tiempo_activo"))
+        elif registro.get("tipo") == "nivel" and registro.get("sesion", estado["SesionID"]) == estado["SesionID"]:
+            # (el nivel de la sesión completada anterior puede venir después del marcador)
+            estado["NivelClasificado"] = registro["nivel"]
+    return estado
+
+
+def sesion_en_curso(archivo=ARCHIVO_DIARIO):
+    """(estado, marcador) de la sesión abierta según la cola del diario, o (None, None)"""
+    cola = leer_cola(archivo)
+    if not cola:
+        return None, None
+    return plegar_sesion(cola), cola[0]
+
+
+def marcador_sesion(sesion_id, nivel="", base=None, anterior=None):
+    """Registro inicio_sesion para una sesión nueva o un punto de control"""
+    registro = {"tipo": "inicio_sesion", "sesion": sesion_id, "nivel": nivel, "ts": time.time()}
+    if base:
+        registro["base"] = base
+    if anterior:
+        registro["anterior"] = anterior
+    return registro
+
+
+def _agrupar_sesiones(registros):
+    """Agrupa los registros del diario en sesiones (listas que empiezan con su marcador)"""
+    sesiones = []
+    niveles_sueltos = []
+    for registro in registros:
+        if registro.get("tipo") == "inicio_sesion":
+            sesiones.append([registro])
+        elif sesiones and registro.get("sesion") == sesiones[-1][0]["sesion"]:
+            sesiones[-1].append(registro)
+        elif registro.get("tipo") == "nivel":
+            # Nivel de una sesión ya cerrada (p. ej. la sesión completada anterior)
+            niveles_sueltos.append(registro)
+    return sesiones, niveles_sueltos
+
+
+# Columnas que reescribe cada sesión plegada (el nivel solo si la sesión tiene registro de nivel)
+_COLUMNAS_METRICAS = ["TiempoPromedioAccion(s)", "ErroresSesion", "TareasCompletadas"] + COLUMNAS_ACUMULADORES
+
+
+def fila_desde_csv(valores):
+    """
+    Fila del dataset (dict de cadenas, como las de csv.DictReader) con los tipos
+    del estado en memoria: métricas numéricas, nivel como texto ("" si está
+    vacío) y acumuladores en None si la fila es anterior a ellos. Las demás
+    columnas se conservan como texto.
+    """
+    fila = dict(valores)
+    fila["SesionID"] = (valores.get("SesionID") or "").strip()
+    fila["TiempoPromedioAccion(s)"] = numero(valores.get("TiempoPromedioAccion(s)"))
+    fila["ErroresSesion"] = int(numero(valores.get("ErroresSesion")))
+    fila["TareasCompletadas"] = int(numero(valores.get("TareasCompletadas")))
+    fila["NivelClasificado"] = valores.get("NivelClasificado") or ""
+    fila["SumaDuracion(s)"] = numero(valores.get("SumaDuracion(s)"), None)
+    fila["M2Duracion"] = numero(valores.get("M2Duracion"), None)
+    return fila
+
+
+def plegar_en_filas(filas, registros):
+    """
+    Aplica los registros del diario sobre filas del dataset (de fila_desde_csv).
+    Cada sesión del diario actualiza su fila (la última con ese SesionID) o se
+    añade como fila nueva. Devuelve una lista nueva; las filas modificadas son copias.
+    """
+    sesiones, niveles_sueltos = _agrupar_sesiones(registros)
+    filas = list(filas)
+    posiciones = {str(fila["SesionID"]).strip(): i for i, fila in enumerate(filas)}
+
+    for registros_sesion in sesiones:
+        estado = plegar_sesion(registros_sesion)
+        tiene_nivel = any(r.get("tipo") == "nivel" for r in registros_sesion)
+        posicion = posiciones.get(estado["SesionID"])
+        if posicion is None:
+            posiciones[estado["SesionID"]] = len(filas)
+            filas.append(estado)
+            continue
+        fila = dict(filas[posicion])
+        for columna in _COLUMNAS_METRICAS:
+            fila[columna] = estado[columna]
+        if tiene_nivel:
+            fila["NivelClasificado"] = estado["NivelClasificado"]
+        filas[posicion] = fila
+
+    for registro in niveles_sueltos:
+        posicion = posiciones.get(registro["sesion"])
+        if posicion is not None:
+            filas[posicion] = {**filas[posicion], "NivelClasificado": registro["nivel"]}
+
+    return filas
+
+
+def leer_filas(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
+    """Todas las filas de dataset_pos.csv con los eventos aún no compactados ya aplicados (sin escribir nada)"""
+    with open(archivo_dataset, newline="", encoding="utf-8") as f:
+        filas = [fila_desde_csv(valores) for valores in csv.DictReader(f)]
+    with lock_diario(archivo_diario):
+        registros = _leer_todo(archivo_diario)
+    if not registros:
+        return filas
+    return plegar_en_filas(filas, registros)
+
+
+def leer_dataset(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
+    """leer_filas como DataFrame (herramientas de análisis; el servidor no lo usa)"""
+    import pandas as pd
+
+    filas = leer_filas(archivo_dataset, archivo_diario)
+    return pd.DataFrame(filas) if filas else pd.DataFrame(columns=COLUMNAS_ALMACEN)
+
+
+def leer_ultimas_filas(archivo_dataset=ARCHIVO_DATASET, n=2):
+    """
+    Últimas n filas de dataset_pos.csv (de fila_desde_csv), leyendo el archivo
+    hacia atrás por bloques: el coste no depende del número de sesiones
+    guardadas. Las filas del dataset no contienen saltos de línea.
+    """
+    with open(archivo_dataset, "rb") as f:
+        cabecera = f.readline()
+        inicio_datos = f.tell()
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b""
+        # n filas completas: n saltos de línea sin contar el final del archivo
+        while posicion > inicio_datos and datos.rstrip(b"\r\n").count(b"\n") < n:
+            leer = min(_BLOQUE_COLA, posicion - inicio_datos)
+            posicion -= leer
+            f.seek(posicion)
+            datos = f.read(leer) + datos
+
+    lineas = [linea for linea in datos.splitlines() if linea.strip()]
+    if posicion > inicio_datos:
+        # La primera línea puede estar cortada por el bloque
+        lineas = lineas[1:]
+    texto = b"\n".join([cabecera.rstrip(b"\r\n")] + lineas[-n:]).decode("utf-8")
+    return [fila_desde_csv(valores) for valores in csv.DictReader(io.StringIO(texto))]
+
+
+def leer_ultimas_sesiones(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO, n=2):
+    """
+    Como leer_filas, pero solo con las últimas n filas del CSV. El diario solo
+    contiene las sesiones posteriores a la última compactación (y como mucho
+    UMBRAL_COMPACTACION_BYTES), así que plegarlo sobre la cola basta.
+    """
+    filas = leer_ultimas_filas(archivo_dataset, n)
+    with lock_diario(archivo_diario):
+        registros = _leer_todo(archivo_diario)
+    if not registros:
+        return filas
+    return plegar_en_filas(filas, registros)
+
+
+def _inodos(*rutas):
+    inodos = []
+    for ruta in rutas:
+        try:
+            inodos.append(os.stat(ruta).st_ino)
+        except OSError:
+            inodos.append(None)
+    return inodos
+
+
+def contar_sesiones(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
+    """
+    Número de sesiones del historial sin interpretar el CSV: filas de
+    dataset_pos.csv (contando saltos de línea) más las sesiones del diario que
+    aún no se compactaron (el punto de control ya es la última fila del CSV).
+
+    Se cuenta sin el bloqueo del diario (no detiene las ventas). La compactación
+    reemplaza ambos archivos (escritura atómica, inodo nuevo): si ocurrió
+    mientras se contaba, se vuelve a contar.
+    """
+    for _ in range(3):
+        inodos = _inodos(archivo_dataset, archivo_diario)
+        total = _contar_sesiones(archivo_dataset, archivo_diario)
+        if _inodos(archivo_dataset, archivo_diario) == inodos:
+            return total
+    # Compactaciones seguidas: contar con el bloqueo tomado
+    with lock_diario(archivo_diario):
+        return _contar_sesiones(archivo_dataset, archivo_diario)
+
+
+def _contar_sesiones(archivo_dataset, archivo_diario):
+    filas = 0
+    ultima = None
+    if os.path.exists(archivo_dataset):
+        with open(archivo_dataset, "rb") as f:
+            saltos = 0
+            final = b"\n"
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                saltos += bloque.count(b"\n")
+                final = bloque[-1:]
+        # Sin salto de línea al final la última fila no se contó
+        filas = max(0, saltos - 1 + (final != b"\n"))
+        cola = leer_ultimas_filas(archivo_dataset, 1)
+        if cola:
+            ultima = cola[-1]["SesionID"]
+    registros = _leer_todo(archivo_diario)
+    nuevas = {r["sesion"] for r in registros if r.get("tipo") == "inicio_sesion"} - {ultima}
+    return filas + len(nuevas)
+
+
+def _leer_csv_crudo(archivo):
+    """(cabecera, filas) del CSV como listas de cadenas, sin interpretarlas"""
+    if not os.path.exists(archivo):
+        return list(COLUMNAS_ALMACEN), []
+    with open(archivo, newline="", encoding="utf-8") as f:
+        lector = csv.reader(f)
+        cabecera = next(lector, None) or list(COLUMNAS_ALMACEN)
+        return cabecera, [fila for fila in lector if fila]
+
+
+def _valores_fila(fila, columnas):
+    """Valores de una fila plegada en el orden de columnas, con los acumuladores completos"""
+    fila = dict(fila)
+    _, fila["SumaDuracion(s)"], fila["M2Duracion"] = acumuladores(fila)
+    return [fila.get(columna) for columna in columnas]
+
+
+def compactar(archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
+    """
+    Pliega el diario en dataset_pos.csv y lo reduce a un punto de control
+    de la sesión en curso. Devuelve el número de registros compactados.
+
+    Las filas anteriores a la primera sesión del diario se copian tal cual,
+    sin interpretarlas; solo se convierten y pliegan las de la cola.
+    """
+    with lock_diario(archivo_diario):
+        registros = _leer_todo(archivo_diario)
+        if len(registros) <= 1:
+            return 0
+
+        cabecera, crudas = _leer_csv_crudo(archivo_dataset)
+        columnas = cabecera + [c for c in COLUMNAS_ALMACEN if c not in cabecera]
+        corte = len(crudas)
+        if columnas != cabecera:
+            # CSV anterior a los acumuladores: se completan en todas las filas
+            corte = 0
+        else:
+            sesiones_diario = {r.get("sesion") for r in registros}
+            columna_id = cabecera.index("SesionID")
+            ultimas = {}
+            for i, fila in enumerate(crudas):
+                if len(fila) > columna_id and fila[columna_id].strip() in sesiones_diario:
+                    ultimas[fila[columna_id].strip()] = i
+            corte = min(ultimas.values(), default=corte)
+
+        cola = [fila_desde_csv(dict(zip(cabecera, fila))) for fila in crudas[corte:]]
+        cola = plegar_en_filas(cola, registros)
+
+        def escribir(f):
+            escritor = csv.writer(f, lineterminator="\n")
+            escritor.writerow(columnas)
+            escritor.writerows(crudas[:corte])
+            escritor.writerows(_valores_fila(fila, columnas) for fila in cola)
+
+        escribir_atomico(archivo_dataset, escribir, newline="", encoding="utf-8")
+
+        # Punto de control: la sesión abierta pasa a ser un marcador con su estado como base
+        sesiones, _ = _agrupar_sesiones(registros)
+        punto_control = []
+        if sesiones:
+            abierta = sesiones[-1]
+            estado = plegar_sesion(abierta)
+            punto_control.append(marcador_sesion(
+                estado["SesionID"],
+                nivel=estado["NivelClasificado"],
+                base=base_sesion(estado),
+                anterior=abierta[0].get("anterior"),
+            ))
+        escribir_atomico(
+            archivo_diario,
+            lambda f: f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in punto_control),
+            encoding="utf-8",
+        )
+
+    registro.debug("[DIARIO] Compactados %d registros en %s", len(registros), archivo_dataset)
+    return len(registros)
+
+
+def necesita_compactar(archivo=ARCHIVO_DIARIO):
+    try:
+        return os.path.getsize(archivo) > UMBRAL_COMPACTACION_BYTES
+    except OSError:
+        return False
+
+
+def reiniciar(archivo=ARCHIVO_DIARIO):
+    """Borra el diario (usado al reiniciar el sistema)"""
+    with lock_diario(archivo):
+        if os.path.exists(archivo):
+            os.remove(archivo)
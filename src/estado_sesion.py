@@ -0,0 +1,305 @@
+"""
+Estado de sesión residente en memoria con escritura diferida (write-behind).
+
+El estado de la sesión en curso (última fila del dataset) y de la sesión
+completada anterior (penúltima fila) vive en memoria y es la fuente de verdad
+para las lecturas del camino crítico: registrar_evento(), evaluar_y_asignar(),
+actualizar_nivel_clasificado(), /api/estado y /. Ninguna de ellas toca disco.
+
+Los registros del diario (src/diario_eventos.py) se acumulan en memoria y un
+hilo escritor los entrega al almacenamiento configurado (src/almacenamiento.py)
+cada `intervalo` segundos; al completar una venta se escriben de inmediato.
+Ante una caída se pierden como máximo los eventos de un intervalo. El mismo
+hilo compacta el diario en dataset_pos.csv cuando se solicita (después de
+clasificar, como mucho una vez cada "intervalo_compactacion_s": las ventas de
+ese intervalo se pliegan juntas) o cuando el diario crece demasiado.
+
+Con varios procesos ("multiproceso" en config.json, ver src/bloqueo.py) los
+cambios se hacen dentro de transaccion(): bloqueo del almacenamiento entre
+procesos, recarga si otro proceso escribió y escritura inmediata.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from src.diario_eventos import ARCHIVO_DIARIO, ARCHIVO_DATASET, diario_junto_a, expandir_lotes, lote
+from src.config import obtener_intervalo_compactacion, obtener_intervalo_escritura, obtener_multiproceso
+from src.almacenamiento import crear_almacenamiento
+from src.terminales import archivos_terminal
+from src.registro import obtener_registro
+from src.metricas import ETAPAS, cronometrar
+
+registro = obtener_registro("estado_sesion")
+
+
+class EstadoSesion:
+    """Sesión en curso y sesión completada anterior de un dataset, en memoria"""
+
+    def __init__(self, archivo_dataset=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO, almacen=None):
+        # Rutas absolutas: el escritor diferido no depende del directorio actual
+        self.archivo_dataset = os.path.abspath(archivo_dataset)
+        self.archivo_diario = os.path.abspath(archivo_diario)
+        self.almacen = almacen or crear_almacenamiento(archivo_dataset, archivo_diario)
+        self.lock = threading.RLock()
+        self._lock_escritura = threading.RLock()
+        self.cargado = False
+        self.existe = False          # ¿hay historial (dataset_pos.csv o base de datos)?
+        self.hay_eventos = False     # ¿alguna sesión tiene errores o tareas?
+        self.actual = None           # fila de la sesión en curso (última fila)
+        self.anterior = None         # fila de la sesión completada (penúltima fila)
+        self.marcador = None         # registro inicio_sesion de la sesión en curso
+        self.pendientes = []         # registros del diario aún no escritos
+        self.compactacion_solicitada = False
+        self._ultima_compactacion = None   # time.monotonic() de la última compactación solicitada
+        self.interfaz = "novato"     # interfaz mostrada en esta terminal
+        self.evaluacion_pendiente = False  # venta respondida sin esperar su evaluación (cola atrasada)
+        self.version = 0             # crece con cada cambio de las filas (ETag de /api/estado)
+        self.sesiones = None         # sesiones del historial (None: sin contar desde la última carga)
+        self._firma = None           # firma del almacenamiento según este proceso (multiproceso)
+
+    def _desactualizado(self):
+        """¿Otro proceso escribió en el almacenamiento desde la última lectura o escritura?"""
+        return obtener_multiproceso() and not self.pendientes and self.almacen.firma() != self._firma
+
+    def cargar(self, forzar=False):
+        """Carga el estado desde disco (una sola vez, o de nuevo si forzar=True
+        o si otro proceso lo cambió en modo multiproceso)"""
+        with self.lock:
+            if self.cargado and not forzar and not self._desactualizado():
+                return self
+
+            self.cargado = True
+            self.version += 1
+            self.sesiones = None
+            self.existe = self.almacen.existe()
+            self.actual = self.anterior = self.marcador = None
+            self.hay_eventos = False
+            if not self.existe:
+                return self
+
+            # Única lectura de disco; a partir de aquí el estado vive en memoria
+            with self.almacen.bloqueo(), cronometrar(ETAPAS, "lectura_almacenamiento"):
+                self.anterior, self.actual, self.marcador, self.hay_eventos = self.almacen.cargar()
+                self._firma = self.almacen.firma()
+            return self
+
+    @contextmanager
+    def transaccion(self):
+        """Lock para leer, modificar y encolar el estado de la sesión
+
+        En modo multiproceso también toma el bloqueo del almacenamiento (otros
+        procesos esperan), recarga el estado si otro proceso lo cambió y escribe
+        los registros antes de soltarlo.
+        """
+        if not obtener_multiproceso():
+            with self.lock:
+                yield self
+            return
+        with self._lock_escritura, self.lock, self.almacen.bloqueo():
+            self.cargar()
+            try:
+                yield self
+            finally:
+                self.persistir()
+
+    def crear(self, sesion_id):
+        """Crea el historial con una primera sesión vacía (primer evento del sistema)"""
+        with self.lock:
+            self.almacen.crear(sesion_id, nivel="Novato")
+            return self.cargar(forzar=True)
+
+    def ultimas_filas(self):
+        """Copia de [penúltima, última] fila (o solo la última si no hay anterior)"""
+        with self.lock:
+            self.cargar()
+            return [dict(f) for f in (self.anterior, self.actual) if f is not None]
+
+    def encolar(self, registros, atomico=False):
+        """Agrega registros del diario para la próxima escritura
+
+        Todo cambio del estado en memoria pasa por aquí, así que también
+        incrementa la versión. Con atomico=True los registros se escriben
+        como un lote (una sola línea del diario: todos o ninguno).
+        """
+        nuevas = sum(1 for r in registros if r.get("tipo") == "inicio_sesion")
+        if atomico and len(registros) > 1:
+            registros = [lote(registros)]
+        with self.lock:
+            self.pendientes.extend(registros)
+            self.version += 1
+            if self.sesiones is not None:
+                self.sesiones += nuevas
+
+    def contar_sesiones(self):
+        """Sesiones del historial: se cuentan en el almacenamiento una vez por carga
+        y después se mantienen en memoria (cada inicio_sesion encolado suma una)"""
+        with self._lock_escritura, self.lock:
+            self.cargar()
+            if not self.existe:
+                return 0
+            if self.sesiones is None:
+                # Con _lock_escritura ningún registro está a medio escribir
+                pendientes = expandir_lotes(self.pendientes)
+                self.sesiones = self.almacen.contar_sesiones() + sum(
+                    1 for r in pendientes if r.get("tipo") == "inicio_sesion"
+                )
+            return self.sesiones
+
+    def persistir(self):
+        """Escribe ahora en el diario los registros pendientes (una sola escritura)"""
+        with self._lock_escritura:
+            with self.lock:
+                pendientes, self.pendientes = self.pendientes, []
+            if not pendientes:
+                return 0
+            try:
+                with cronometrar(ETAPAS, "escritura_almacenamiento"):
+                    self._escribir_sin_perder_firma(self.almacen.anexar, pendientes)
+            except (OSError, sqlite3.Error):
+                # Devolverlos a la cola para el próximo intento, conservando el orden
+                with self.lock:
+                    self.pendientes[:0] = pendientes
+                raise
+            return len(pendientes)
+
+    def solicitar_compactacion(self):
+        """Pide al escritor que compacte el diario en el CSV en su próxima pasada"""
+        with self.lock:
+            self.compactacion_solicitada = True
+        _escritor.despertar()
+
+    def compactar_si_corresponde(self, forzar=False):
+        """Compacta si se solicitó y pasó intervalo_compactacion_s desde la anterior
+        (forzar: sin esperar el intervalo), o si el diario creció demasiado"""
+        with self.lock:
+            solicitada = self.compactacion_solicitada and (
+                forzar or self._ultima_compactacion is None
+                or time.monotonic() - self._ultima_compactacion >= obtener_intervalo_compactacion()
+            )
+            if solicitada:
+                # Si no, queda solicitada para una próxima pasada del escritor
+                self.compactacion_solicitada = False
+                self._ultima_compactacion = time.monotonic()
+        self._escribir_sin_perder_firma(self.almacen.compactar, solicitada)
+
+    def _escribir_sin_perder_firma(self, escribir, *argumentos):
+        """Escribe en el almacenamiento; en modo multiproceso, si el estado estaba al
+        día, la firma nueva es de esta escritura y no de otro proceso"""
+        if not obtener_multiproceso():
+            return escribir(*argumentos)
+        with self.almacen.bloqueo():
+            sincronizado = self.almacen.firma() == self._firma
+            resultado = escribir(*argumentos)
+            if sincronizado:
+                self._firma = self.almacen.firma()
+            return resultado
+
+    def reiniciar(self):
+        """Descarta el estado y borra el historial (usado por /reset)"""
+        with self._lock_escritura, self.lock:
+            self.pendientes = []
+            self.compactacion_solicitada = False
+            self.almacen.reiniciar()
+            self.cargar(forzar=True)
+
+
+class EscritorDiferido(threading.Thread):
+    """Hilo que vuelca periódicamente los estados en memoria al diario"""
+
+    def __init__(self):
+        super().__init__(name="escritor-diferido", daemon=True)
+        self._despertar = threading.Event()
+        self._lock_pasada = threading.Lock()
+
+    def despertar(self):
+        self._despertar.set()
+
+    def pasada(self, forzar=False):
+        # Una pasada a la vez: persistir_todo() espera a la que esté en curso
+        with self._lock_pasada:
+            self._pasada(forzar)
+
+    def _pasada(self, forzar):
+        for clave, estado in list(_estados.items()):
+            try:
+                estado.persistir()
+                estado.compactar_si_corresponde(forzar)
+            except Exception as e:
+                if not os.path.isdir(estado.almacen.directorio):
+                    # El directorio de datos desapareció: descartar este estado
+                    _estados.pop(clave, None)
+                else:
+                    registro.warning("Error en escritura diferida: %s", e)
+
+    def run(self):
+        while True:
+            try:
+                intervalo = obtener_intervalo_escritura()
+            except Exception:
+                intervalo = 1.0
+            self._despertar.wait(intervalo)
+            self._despertar.clear()
+            self.pasada()
+
+
+_estados = {}
+_lock_estados = threading.Lock()
+_escritor = EscritorDiferido()
+
+
+def obtener_estado_sesion(archivo_dataset=ARCHIVO_DATASET, archivo_diario=None):
+    """Estado en memoria del dataset indicado (uno por archivo, compartido entre hilos)
+
+    Si no se indica el diario se usa eventos_pos.jsonl junto al dataset.
+    """
+    if archivo_diario is None:
+        archivo_diario = diario_junto_a(archivo_dataset)
+    clave = os.path.abspath(archivo_dataset)
+    estado = _estados.get(clave)
+    if estado is None:
+        with _lock_estados:
+            estado = _estados.get(clave)
+            if estado is None:
+                estado = EstadoSesion(archivo_dataset, archivo_diario)
+                _estados[clave] = estado
+                if not _escritor.is_alive():
+                    _escritor.start()
+    return estado
+
+
+def obtener_estado_terminal(terminal=None):
+    """Estado en memoria de una terminal (src/terminales.py)"""
+    return obtener_estado_sesion(*archivos_terminal(terminal))
+
+
+_conteos = {}  # dataset -> (firma, sesiones) de los historiales sin estado en memoria
+
+
+def contar_sesiones_terminal(terminal=None):
+    """Sesiones del historial de una terminal, o None si no tiene historial
+
+    No crea el estado en memoria de una terminal inactiva: su almacenamiento se
+    cuenta de nuevo solo si su firma cambió desde el último conteo.
+    """
+    archivo_dataset, archivo_diario = archivos_terminal(terminal)
+    clave = os.path.abspath(archivo_dataset)
+    estado = _estados.get(clave)
+    if estado is not None:
+        return estado.contar_sesiones() if estado.cargar().existe else None
+    almacen = crear_almacenamiento(archivo_dataset, archivo_diario)
+    firma = almacen.firma()
+    conteo = _conteos.get(clave)
+    if conteo is None or conteo[0] != firma:
+        conteo = _conteos[clave] = (firma, almacen.contar_sesiones() if almacen.existe() else None)
+    return conteo[1]
+
+
+def persistir_todo():
+    """Vuelca todos los estados pendientes y hace las compactaciones solicitadas sin
+    esperar su intervalo (al salir del proceso, o antes de borrar un directorio de datos)"""
+    _escritor.pasada(forzar=True)
+
+
+atexit.register(persistir_todo)
@@ -1,186 +1,253 @@
-import csv
 from datetime import datetime
 import os
-import pandas as pd
-from src.config import obtener_estado_adaptacion
+import threading
+from src.adaptador import evaluar_y_marcar
+from src.config import obtener_estado_adaptacion, obtener_modo_clasificacion
+from src import diario_eventos
+from src.diario_eventos import ARCHIVO_DIARIO, ARCHIVO_DATASET
+from src.estado_sesion import obtener_estado_sesion
+from src.terminales import archivos_terminal
+from src.registro import obtener_registro
+from src.metricas import tramo
 
-def generar_nueva_sesion_id():
-    """Genera un nuevo ID de sesión basado en timestamp"""
+registro = obtener_registro("logger")
+
+_ultimo_id = {"base": None, "contador": 0}
+_lock_id = threading.Lock()
+
+def generar_nueva_sesion_id(anterior=None):
+    """Genera un nuevo ID de sesión basado en timestamp
+    
+    Si se generan varias sesiones en el mismo segundo se añade un sufijo (_2, _3...),
+    porque el diario identifica las filas del dataset por SesionID. Con varios
+    procesos el contador de este proceso no basta: se continúa también después
+    de la sesión anterior (anterior) si es del mismo segundo.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"S_{timestamp}"
+    base = f"S_{timestamp}"
+    with _lock_id:
+        if base != _ultimo_id["base"]:
+            _ultimo_id["base"] = base
+            _ultimo_id["contador"] = 0
+        previo = 0
+        if anterior == base:
+            previo = 1
+        elif anterior and anterior.startswith(f"{base}_") and anterior[len(base) + 1:].isdigit():
+            previo = int(anterior[len(base) + 1:])
+        _ultimo_id["contador"] = max(_ultimo_id["contador"], previo) + 1
+        if _ultimo_id["contador"] > 1:
+            return f"{base}_{_ultimo_id['contador']}"
+    return base
 
-def registrar_evento(tipo_evento, duracion, exito=True, tiempo_activo=None):
+def iniciar_diario(archivo_sesion=ARCHIVO_DATASET, archivo_diario=ARCHIVO_DIARIO):
     """
-    Registra un evento y actualiza las métricas de sesión acumuladas.
-    Si el evento es 'compra_finalizada', finaliza la sesión actual y crea una nueva.
-    Formato compatible con Dataset_POS.csv
+    Abre el diario a partir de la última fila de dataset_pos.csv (sesión actual).
+    Solo ocurre la primera vez o después de borrar el diario.
     """
-    os.makedirs("data", exist_ok=True)
-    
-    archivo_sesion = "data/dataset_pos.csv"
-    es_compra_finalizada = (tipo_evento == "compra_finalizada")
-    
-    # Verificar si existe el archivo de sesión
-    if not os.path.exists(archivo_sesion):
-        # Crear archivo con formato del dataset
-        nueva_sesion_id = generar_nueva_sesion_id()
-        with open(archivo_sesion, "w", newline="", encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["SesionID", "TiempoPromedioAccion(s)", "ErroresSesion", "TareasCompletadas", "NivelClasificado"])
-            # Inicializar con valores por defecto (novato)
-            writer.writerow([nueva_sesion_id, 0, 0, 0, "Novato"])
-        print(f"[LOGGER] Archivo de sesión creado con nueva sesión: {nueva_sesion_id}")
-    
-    # Leer datos actuales
-    df = pd.read_csv(archivo_sesion)
-    
-    # Obtener métricas actuales de la última sesión
-    if len(df) > 0:
-        # Obtener la última fila (sesión actual)
-        ultima_fila = df.iloc[-1]
+    # Solo hacen falta las dos últimas filas: leer desde el final del CSV
+    filas = diario_eventos.leer_ultimas_filas(archivo_sesion, 2)
+    if not filas:
+        marcador = diario_eventos.marcador_sesion(generar_nueva_sesion_id(), nivel="")
+    else:
+        ultima_fila = filas[-1]
         sesion_actual = str(ultima_fila.get('SesionID', '')).strip()
-        
+
         # Si la sesión actual es vacía o no existe, crear una nueva
         if not sesion_actual or sesion_actual == '' or sesion_actual.lower() == 'nan':
             sesion_actual = generar_nueva_sesion_id()
-        
-        tiempo_actual = pd.to_numeric(ultima_fila.get('TiempoPromedioAccion(s)', 0), errors='coerce') or 0
-        errores_actual = pd.to_numeric(ultima_fila.get('ErroresSesion', 0), errors='coerce') or 0
-        tareas_actual = pd.to_numeric(ultima_fila.get('TareasCompletadas', 0), errors='coerce') or 0
-        
-        # Convertir NaN a 0
-        if pd.isna(tiempo_actual):
-            tiempo_actual = 0
-        if pd.isna(errores_actual):
-            errores_actual = 0
-        if pd.isna(tareas_actual):
-            tareas_actual = 0
-            
-        eventos_totales = int(errores_actual) + int(tareas_actual)
-    else:
-        sesion_actual = generar_nueva_sesion_id()
-        tiempo_actual = 0
-        errores_actual = 0
-        tareas_actual = 0
-        eventos_totales = 0
-    
-    # Actualizar métricas
-    if exito:
-        tareas_actual += 1
-    else:
-        errores_actual += 1
-    
-    eventos_totales += 1
-    
-    # Calcular nuevo tiempo promedio (promedio ponderado)
-    # PRIORIDAD: Si tenemos tiempo activo, usarlo para calcular mejor el tiempo promedio por acción
-    if tiempo_activo is not None and tiempo_activo > 0 and eventos_totales > 0:
-        tiempo_promedio_activo = tiempo_activo / eventos_totales
-    
-        # CAMBIO: Usar un mínimo razonable de 1 segundo
-        tiempo_nuevo = max(1.0, tiempo_promedio_activo)
-    
-        # Limitar a máximo 10 segundos
-        tiempo_nuevo = min(10.0, tiempo_nuevo)
-    
-        print(f"[LOGGER] Tiempo activo: {tiempo_activo:.2f}s / {eventos_totales} acciones = {tiempo_nuevo:.2f}s promedio")
-    else:
-        # Método tradicional con mínimo de 1 segundo
-        if eventos_totales == 1:
-            tiempo_nuevo = max(1.0, duracion)
-        else:
-            tiempo_nuevo = ((tiempo_actual * (eventos_totales - 1)) + duracion) / eventos_totales
-            tiempo_nuevo = max(1.0, tiempo_nuevo)  # Mínimo 1 segundo
-    
-        tiempo_nuevo = min(10.0, tiempo_nuevo)
-    
-    # Si es compra finalizada, guardar la sesión actual como NUEVA FILA (no sobrescribir)
-    # Si es compra finalizada, guardar la sesión actual y CREAR NUEVA SESIÓN
-    if es_compra_finalizada:
-        # Guardar los datos de la sesión completada
-        nivel_actual = str(ultima_fila.get('NivelClasificado', 'Novato')) if len(df) > 0 else 'Novato'
-        
-        # 🔥 Si la adaptación está desactivada, no actualizar el nivel en la sesión completada
+
+        anterior = filas[-2]['SesionID'] if len(filas) > 1 else None
+        marcador = diario_eventos.marcador_sesion(
+            sesion_actual,
+            nivel=ultima_fila['NivelClasificado'],
+            # Métricas y acumuladores de la fila (vacíos -> 0)
+            base=diario_eventos.base_sesion(ultima_fila),
+            anterior=anterior,
+        )
+    diario_eventos.anexar([marcador], archivo_diario)
+    return diario_eventos.plegar_sesion([marcador]), marcador
+
+def registrar_evento(tipo_evento, duracion, exito=True, tiempo_activo=None, terminal=None):
+    """
+    Registra un evento y actualiza las métricas de sesión acumuladas.
+    Si el evento es 'compra_finalizada', finaliza la sesión actual y crea una nueva.
+
+    Las métricas de la sesión actual viven en memoria (src/estado_sesion.py); el
+    evento se encola para el diario data/eventos_pos.jsonl, que se escribe en
+    segundo plano y de inmediato al completar una venta. dataset_pos.csv
+    (formato Dataset_POS.csv) se actualiza al compactar el diario.
+
+    Cada terminal (src/terminales.py) tiene su propia sesión; None es la
+    terminal principal (data/dataset_pos.csv).
+    """
+    evento = {"tipo_evento": tipo_evento, "duracion": duracion, "exito": exito, "tiempo_activo": tiempo_activo}
+    return registrar_eventos([evento], terminal=terminal)[0]
+
+def registrar_eventos(eventos, terminal=None):
+    """
+    Registra una lista ordenada de eventos (dicts con tipo_evento, duracion, exito
+    y tiempo_activo) con una sola toma del lock de la terminal y una sola
+    escritura en el almacenamiento.
+
+    Devuelve, para cada evento, la misma tupla que registrar_evento():
+    (es_compra_finalizada, sesion_id, datos_sesion_completada o None).
+    """
+    estado_sesion = _estado_de(terminal)
+
+    # Leer, modificar y encolar como una sola operación (también entre procesos)
+    with estado_sesion.transaccion():
+        registros, resultados = _aplicar_lote(estado_sesion, eventos, terminal)
+        # La venta (evento y marcador de la sesión nueva) se escribe como un lote
+        estado_sesion.encolar(registros, atomico=any(es_compra for es_compra, _, _ in resultados))
+
+    if any(es_compra for es_compra, _, _ in resultados):
+        # Venta completada: escribir el diario ahora, sin esperar al escritor diferido
+        estado_sesion.persistir()
+
+    return resultados
+
+def finalizar_venta(eventos, terminal=None, adaptacion_activa=None, modo=None):
+    """
+    Unidad de trabajo de una venta: registra los eventos del lote (el último es
+    compra_finalizada), clasifica la sesión completada, marca su
+    NivelClasificado y abre la sesión siguiente con una sola toma del lock de la
+    terminal y una sola escritura en el almacenamiento (eventos, marcador de la
+    sesión nueva y nivel en el mismo anexado).
+
+    La adaptación y el modo de clasificación se leen una sola vez (o los pasa
+    quien llama). Sin adaptación no se clasifica, como en /api/evento.
+
+    Devuelve (resultados, evaluacion): resultados como registrar_eventos() y
+    evaluacion = (interfaz, nivel), o None si la adaptación está desactivada.
+    """
+    if not eventos or eventos[-1].get("tipo_evento") != "compra_finalizada":
+        raise ValueError("finalizar_venta: el lote debe terminar con compra_finalizada")
+    if adaptacion_activa is None:
         adaptacion_activa = obtener_estado_adaptacion()
-        if not adaptacion_activa:
-            # Mantener el nivel que ya tenía (no modificarlo)
-            nivel_actual = str(ultima_fila.get('NivelClasificado', '')) if len(df) > 0 else ''
-        
-        datos_sesion_completada = {
-            'SesionID': sesion_actual,
-            'TiempoPromedioAccion(s)': round(tiempo_nuevo, 2),
-            'ErroresSesion': errores_actual,
-            'TareasCompletadas': tareas_actual,
-            'NivelClasificado': nivel_actual
-        }
-    
-        # Verificar si la última fila tiene eventos o está vacía
-        eventos_ultima = int(ultima_fila.get('ErroresSesion', 0) or 0) + int(ultima_fila.get('TareasCompletadas', 0) or 0)
-    
-        if eventos_ultima == 0:
-            # La última fila está vacía, reemplazarla con la sesión completada
-            df.iloc[-1] = pd.Series(datos_sesion_completada)
-        else:
-            # La última fila tiene eventos, actualizarla con los datos finales
-            df.iloc[-1] = pd.Series(datos_sesion_completada)
-    
-        # Guardar para que evaluar_y_asignar pueda leerla
-        df.to_csv(archivo_sesion, index=False)
-    
-        print(f"[LOGGER] ✅ Venta completada - Sesión {sesion_actual} finalizada")
-        print(f"[LOGGER]   Datos guardados para evaluación")
-    
-        # AHORA SÍ CREAR NUEVA SESIÓN (nueva fila)
+    if adaptacion_activa and modo is None:
+        modo = obtener_modo_clasificacion()
+
+    estado_sesion = _estado_de(terminal)
+    evaluacion = None
+    with estado_sesion.transaccion():
+        with tramo("registro_eventos"):
+            registros, resultados = _aplicar_lote(estado_sesion, eventos, terminal, adaptacion_activa)
+        if adaptacion_activa:
+            # La sesión nueva está vacía: se evalúa y marca la completada (penúltima fila)
+            with tramo("evaluacion"):
+                interfaz, nivel, registros_nivel = evaluar_y_marcar(estado_sesion, modo)
+            registros.extend(registros_nivel)
+            evaluacion = (interfaz, nivel)
+        estado_sesion.encolar(registros, atomico=True)
+
+    # Una sola escritura: la venta queda completa en el diario o no queda
+    estado_sesion.persistir()
+    if adaptacion_activa:
+        # Llevar el nivel al CSV en segundo plano (agrupado con otras ventas)
+        estado_sesion.solicitar_compactacion()
+    return resultados, evaluacion
+
+def _estado_de(terminal):
+    archivo_sesion, archivo_diario = archivos_terminal(terminal)
+    os.makedirs(os.path.dirname(archivo_sesion), exist_ok=True)
+    return obtener_estado_sesion(archivo_sesion, archivo_diario)
+
+def _aplicar_lote(estado_sesion, eventos, terminal, adaptacion_activa=None):
+    """Aplica los eventos al estado en memoria (con la transacción abierta); devuelve (registros, resultados)"""
+    estado_sesion.cargar()
+
+    # Verificar si existe el archivo de sesión
+    if not estado_sesion.existe:
+        # Crear el historial con formato del dataset
         nueva_sesion_id = generar_nueva_sesion_id()
-        
-        # 🔥 Si la adaptación está desactivada, no usar el nivel anterior
+        # Inicializar con valores por defecto (novato)
+        estado_sesion.crear(nueva_sesion_id)
+        registro.info("Historial creado", extra={"campos": {"terminal": terminal, "sesion": nueva_sesion_id}})
+
+    registros = []
+    resultados = []
+    for evento in eventos:
+        registros_evento, resultado = _aplicar_evento(
+            estado_sesion,
+            evento.get("tipo_evento", "accion_generica"),
+            evento.get("duracion", 0),
+            evento.get("exito", True),
+            evento.get("tiempo_activo"),
+            adaptacion_activa,
+        )
+        registros.extend(registros_evento)
+        resultados.append(resultado)
+
+    if eventos:
+        estado_sesion.hay_eventos = True
+    return registros, resultados
+
+def _aplicar_evento(estado_sesion, tipo_evento, duracion, exito, tiempo_activo, adaptacion_activa=None):
+    """Aplica un evento al estado en memoria (con su lock tomado); devuelve (registros, resultado)"""
+    es_compra_finalizada = (tipo_evento == "compra_finalizada")
+
+    # Métricas actuales de la sesión en curso (en memoria)
+    estado = estado_sesion.actual
+    sesion_actual = estado["SesionID"]
+
+    # Actualizar métricas
+    estado_nuevo, tiempo_nuevo = diario_eventos.aplicar_evento(estado, duracion, exito, tiempo_activo)
+    errores_actual = estado_nuevo["ErroresSesion"]
+    tareas_actual = estado_nuevo["TareasCompletadas"]
+
+    if tiempo_activo is not None and tiempo_activo > 0:
+        eventos_totales = errores_actual + tareas_actual
+        registro.debug("[LOGGER] Tiempo activo: %.2fs / %d acciones = %.2fs promedio",
+                       tiempo_activo, eventos_totales, tiempo_nuevo)
+
+    registros = [{
+        "tipo": "evento",
+        "sesion": sesion_actual,
+        "evento": tipo_evento,
+        "duracion": duracion,
+        "exito": bool(exito),
+        "tiempo_activo": tiempo_activo,
+        "ts": datetime.now().timestamp(),
+    }]
+
+    if not es_compra_finalizada:
+        estado_sesion.actual = estado_nuevo
+        registro.debug("[LOG] %s | Sesión: %s | Tiempo: %.2fs | Errores: %s | Tareas: %s | %s",
+                       tipo_evento, sesion_actual, tiempo_nuevo, errores_actual, tareas_actual, '✓' if exito else '✗')
+
+        # Si no es compra finalizada, retornar sin datos de sesión completada
+        return registros, (es_compra_finalizada, sesion_actual, None)
+
+    # Guardar los datos de la sesión completada
+    nivel_actual = estado["NivelClasificado"]
+    datos_sesion_completada = dict(estado_nuevo)
+    datos_sesion_completada['NivelClasificado'] = nivel_actual
+
+    # AHORA SÍ CREAR NUEVA SESIÓN (nuevo marcador en el diario)
+    nueva_sesion_id = generar_nueva_sesion_id(sesion_actual)
+
+    # 🔥 Si la adaptación está desactivada, no usar el nivel anterior
+    if adaptacion_activa is None:
         adaptacion_activa = obtener_estado_adaptacion()
-        if adaptacion_activa:
-            nivel_nueva_sesion = nivel_actual  # Usar el nivel de la sesión anterior solo si adaptación está activa
-        else:
-            nivel_nueva_sesion = ""  # Vacío si adaptación está desactivada
-        
-        nueva_fila = pd.DataFrame([{
-            'SesionID': nueva_sesion_id,
-            'TiempoPromedioAccion(s)': 0,
-            'ErroresSesion': 0,
-            'TareasCompletadas': 0,
-            'NivelClasificado': nivel_nueva_sesion
-        }])
-    
-        # AGREGAR como nueva fila
-        df = pd.concat([df, nueva_fila], ignore_index=True)
-        df.to_csv(archivo_sesion, index=False)
-    
-        print(f"[LOGGER] 🆕 Nueva sesión creada: {nueva_sesion_id}")
-        print(f"[LOGGER] 📊 Total de sesiones en CSV: {len(df)}")
-    
-        # Retornar los datos de la sesión completada
-        return es_compra_finalizada, sesion_actual, datos_sesion_completada
+    if adaptacion_activa:
+        nivel_nueva_sesion = nivel_actual  # Usar el nivel de la sesión anterior solo si adaptación está activa
     else:
-        # Solo actualizar la última fila (sesión actual)
-        if len(df) > 0:
-            df.loc[df.index[-1], 'SesionID'] = sesion_actual
-            df.loc[df.index[-1], 'TiempoPromedioAccion(s)'] = round(tiempo_nuevo, 2)
-            df.loc[df.index[-1], 'ErroresSesion'] = errores_actual
-            df.loc[df.index[-1], 'TareasCompletadas'] = tareas_actual
-            # No actualizar NivelClasificado durante el proceso, solo al finalizar
-        else:
-            # Si no hay filas, crear una nueva
-            nueva_fila = pd.DataFrame([{
-                'SesionID': sesion_actual,
-                'TiempoPromedioAccion(s)': round(tiempo_nuevo, 2),
-                'ErroresSesion': errores_actual,
-                'TareasCompletadas': tareas_actual,
-                'NivelClasificado': ""
-            }])
-            df = pd.concat([df, nueva_fila], ignore_index=True)
-    
-    # Guardar el archivo
-    df.to_csv(archivo_sesion, index=False)
-    
-    print(f"[LOG] {tipo_evento} | Sesión: {sesion_actual} | Tiempo: {tiempo_nuevo:.2f}s | Errores: {errores_actual} | Tareas: {tareas_actual} | {'✓' if exito else '✗'}")
-    
-    # Si no es compra finalizada, retornar sin datos de sesión completada
-    if not es_compra_finalizada:
-        return es_compra_finalizada, sesion_actual, None
\ No newline at end of file
+        nivel_nueva_sesion = ""  # Vacío si adaptación está desactivada
+
+    marcador = diario_eventos.marcador_sesion(
+        nueva_sesion_id, nivel=nivel_nueva_sesion, anterior=sesion_actual
+    )
+    registros.append(marcador)
+
+    # La sesión completada pasa a ser la penúltima fila y la nueva la última
+    estado_sesion.anterior = dict(datos_sesion_completada)
+    estado_sesion.actual = diario_eventos.estado_inicial(marcador)
+    estado_sesion.marcador = marcador
+
+    registro.info("Sesión finalizada", extra={"campos": {
+        "sesion": sesion_actual, "nueva_sesion": nueva_sesion_id,
+        "tareas": tareas_actual, "errores": errores_actual, "tiempo": round(tiempo_nuevo, 2),
+    }})
+
+    # Retornar los datos de la sesión completada
+    return registros, (es_compra_finalizada, sesion_actual, datos_sesion_completada)
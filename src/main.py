@@ -1,24 +1,18 @@
+import sys
+import os
 import pandas as pd
-from motor_difuso import crear_motor_difuso
-from asignador_interfaz import asignar_interfaz
 
-df = pd.read_csv("data/Dataset_POS.csv")
+# Permite ejecutar como script (python src/main.py) desde la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-motor = crear_motor_difuso()
+from src.clasificacion_lote import clasificar_lote
 
-# Clasificar cada sesión
-resultados = []
-for i, row in df.iterrows():
-    motor.input['TiempoPromedioAccion'] = row['TiempoPromedioAccion(s)']
-    motor.input['ErroresSesion'] = row['ErroresSesion']
-    motor.input['TareasCompletadas'] = row['TareasCompletadas']
-    
-    motor.compute()
-    nivel = motor.output['NivelUsuario']
-    interfaz = asignar_interfaz(nivel)
-    
-    resultados.append((row['SesionID'], nivel, interfaz))
+archivo = sys.argv[1] if len(sys.argv) > 1 else "data/Dataset_POS.csv"
+df = pd.read_csv(archivo)
+
+# Clasificar todas las sesiones en una sola pasada vectorizada
+resultados = clasificar_lote(df)
 
 # Mostrar resultados
-for r in resultados[:10]:
-    print(f"Sesion {r[0]} → Nivel: {r[1]:.2f} → {r[2]}")
+for r in resultados.head(10).itertuples(index=False):
+    print(f"Sesion {r.SesionID} → Nivel: {r.NivelUsuario:.2f} → {r.Interfaz}")
@@ -0,0 +1,287 @@
+"""
+Métricas del servidor en formato de texto de Prometheus (GET /metrics).
+
+Registrar una medición no toma ningún lock: cada hilo acumula en su propio
+fragmento (un dict por hilo y métrica) y exponer() suma los fragmentos al
+leerlos. El lock de cada métrica solo se toma la primera vez que un hilo
+registra algo; en ese momento también se pliegan los fragmentos de los hilos
+que ya terminaron (el servidor de desarrollo crea un hilo por petición).
+
+Métricas:
+  pos_peticiones_total{ruta,metodo,estado}     peticiones atendidas
+  pos_peticion_segundos{ruta,metodo}           latencia por ruta (histograma)
+  pos_etapa_segundos{etapa}                    latencia de cada etapa interna:
+      lectura_almacenamiento, escritura_almacenamiento, compactacion,
+      construccion_motor, calculo_nivel, actualizar_nivel_clasificado, calentamiento
+  pos_transiciones_interfaz_total{desde,hacia} resultado de cada evaluación de venta
+  pos_sesiones_almacenadas{terminal}           sesiones en el historial (al leer /metrics)
+  pos_listo                                    1 cuando terminó el calentamiento (src/calentamiento.py)
+
+Con varios procesos (src/bloqueo.py) cada proceso tiene sus propias métricas.
+
+Tramos de la petición (cabecera Server-Timing)
+----------------------------------------------
+Con "server_timing": true en data/config.json cada petición junta en un dict
+propio del hilo (iniciar_tramos) la duración de sus etapas: las de
+cronometrar() y los tramos explícitos de tramo(nombre). La cola de eventos
+pasa ese dict al hilo trabajador que procesa el lote (tramos_activos). Si el
+modo está desactivado no hay dict y anotar un tramo es un getattr.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Límites de las cubetas de latencia, en segundos
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_metricas = []
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica(ABC):
+    """Base de contadores e histogramas: un fragmento de valores por hilo"""
+
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._fragmentos = []      # (hilo, {valores de etiquetas: lista de valores})
+        self._retirados = {}       # fragmentos plegados de hilos terminados
+        _metricas.append(self)
+
+    @abstractmethod
+    def _nueva_serie(self):
+        """Valores iniciales de una serie (una lista que _sumar suma posición a posición)"""
+
+    @abstractmethod
+    def _lineas(self, etiquetas, serie):
+        """Líneas de texto de Prometheus de una serie"""
+
+    def _serie(self, etiquetas):
+        """Valores de la serie en el fragmento de este hilo (sin lock salvo la primera vez)"""
+        fragmento = getattr(self._local, "fragmento", None)
+        if fragmento is None:
+            fragmento = {}
+            with self._lock:
+                self._plegar_terminados()
+                self._fragmentos.append((threading.current_thread(), fragmento))
+            self._local.fragmento = fragmento
+        serie = fragmento.get(etiquetas)
+        if serie is None:
+            serie = fragmento[etiquetas] = self._nueva_serie()
+        return serie
+
+    def _plegar_terminados(self):
+        """Suma en _retirados los fragmentos de hilos que terminaron (con _lock tomado)"""
+        vivos = []
+        for hilo, fragmento in self._fragmentos:
+            if hilo.is_alive():
+                vivos.append((hilo, fragmento))
+            else:
+                self._sumar(self._retirados, fragmento)
+        self._fragmentos = vivos
+
+    def _sumar(self, destino, fragmento):
+        for etiquetas, serie in list(fragmento.items()):
+            acumulada = destino.get(etiquetas)
+            if acumulada is None:
+                destino[etiquetas] = list(serie)
+            else:
+                for i, valor in enumerate(serie):
+                    acumulada[i] += valor
+
+    def series(self):
+        """{valores de etiquetas: valores sumados de todos los hilos}"""
+        with self._lock:
+            self._plegar_terminados()
+            total = {etiquetas: list(serie) for etiquetas, serie in self._retirados.items()}
+            for _, fragmento in self._fragmentos:
+                self._sumar(total, fragmento)
+        return total
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for etiquetas, serie in sorted(self.series().items()):
+            lineas.extend(self._lineas(etiquetas, serie))
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def _nueva_serie(self):
+        return [0]
+
+    def incrementar(self, *etiquetas, cantidad=1):
+        self._serie(etiquetas)[0] += cantidad
+
+    def valor(self, *etiquetas):
+        return self.series().get(etiquetas, [0])[0]
+
+    def _lineas(self, etiquetas, serie):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(serie[0])}"]
+
+
+class Histograma(_Metrica):
+    """Cubetas no acumuladas + suma por serie; exponer() las acumula (le=...)"""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(limites)
+
+    def _nueva_serie(self):
+        # Una cubeta por límite, la de +Inf y la suma
+        return [0] * (len(self.limites) + 1) + [0.0]
+
+    def observar(self, valor, *etiquetas):
+        serie = self._serie(etiquetas)
+        serie[bisect_left(self.limites, valor)] += 1
+        serie[-1] += valor
+
+    def contador(self, *etiquetas):
+        serie = self.series().get(etiquetas)
+        return sum(serie[:-1]) if serie else 0
+
+    def _lineas(self, etiquetas, serie):
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (float("inf"),), serie[:-1]):
+            acumulado += cuenta
+            le = 'le="' + _numero(limite) + '"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(serie[-1])}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """Valor calculado al leer /metrics: obtener() -> número o {valores de etiquetas: número}"""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, obtener, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.obtener = obtener
+        self.etiquetas = tuple(etiquetas)
+        _metricas.append(self)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        valores = self.obtener()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        for etiquetas, valor in sorted(valores.items()):
+            if not isinstance(etiquetas, tuple):
+                etiquetas = (etiquetas,)
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}")
+        return lineas
+
+
+_tramos = threading.local()
+
+
+def iniciar_tramos():
+    """Empieza a juntar los tramos de la petición en curso en este hilo"""
+    _tramos.actuales = {}
+    return _tramos.actuales
+
+
+def terminar_tramos():
+    """Deja de juntar tramos en este hilo; devuelve los juntados (o None)"""
+    actuales = getattr(_tramos, "actuales", None)
+    _tramos.actuales = None
+    return actuales
+
+
+@contextmanager
+def tramos_activos(actuales):
+    """Junta en actuales los tramos medidos en este hilo durante el bloque (hilos trabajadores)"""
+    anteriores = getattr(_tramos, "actuales", None)
+    _tramos.actuales = actuales
+    try:
+        yield
+    finally:
+        _tramos.actuales = anteriores
+
+
+def anotar_tramo(nombre, segundos):
+    actuales = getattr(_tramos, "actuales", None)
+    if actuales is not None:
+        actuales[nombre] = actuales.get(nombre, 0.0) + segundos
+
+
+@contextmanager
+def tramo(nombre):
+    """Duración del bloque como tramo de la petición (sin histograma)"""
+    if getattr(_tramos, "actuales", None) is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        anotar_tramo(nombre, time.perf_counter() - inicio)
+
+
+def cabecera_server_timing(actuales, total=None):
+    """Valor de Server-Timing: "etapa;dur=1.23, ..." en milisegundos"""
+    partes = [f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in list(actuales.items())]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes)
+
+
+@contextmanager
+def cronometrar(histograma, *etiquetas):
+    """Observa la duración del bloque (también sirve como decorador)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        histograma.observar(duracion, *etiquetas)
+        anotar_tramo(etiquetas[0] if etiquetas else histograma.nombre, duracion)
+
+
+def exponer():
+    """Todas las métricas en formato de texto de Prometheus (0.0.4)"""
+    lineas = []
+    for metrica in list(_metricas):
+        try:
+            lineas.extend(metrica.exponer())
+        except Exception as e:
+            lineas.append(f"# {metrica.nombre}: error al leer ({_escapar(e)})")
+    return "\n".join(lineas) + "\n"
+
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+PETICIONES = Contador("pos_peticiones_total", "Peticiones HTTP atendidas", ("ruta", "metodo", "estado"))
+LATENCIA_PETICIONES = Histograma("pos_peticion_segundos", "Latencia de las peticiones por ruta", ("ruta", "metodo"))
+ETAPAS = Histograma("pos_etapa_segundos", "Latencia de cada etapa interna", ("etapa",))
+TRANSICIONES = Contador("pos_transiciones_interfaz_total", "Interfaz antes y después de cada evaluación de venta", ("desde", "hacia"))
@@ -0,0 +1,181 @@
+"""
+Motor de inferencia difusa compilado.
+
+Convierte las funciones de pertenencia y las reglas de src/motor_difuso.py en
+arreglos NumPy una sola vez por proceso. La inferencia Mamdani (mínimo para Y,
+máximo para O, implicación por recorte y agregación por máximo) y la
+defuzzificación por centroide se resuelven con operaciones vectorizadas, sin
+construir Antecedents, Rules ni ControlSystemSimulation en cada evaluación.
+
+Diferencias con skfuzzy:
+    skfuzzy sobremuestrea el universo de salida insertando los puntos exactos
+    donde cada término se recorta. Aquí se usa una malla fija de paso
+    `resolucion_salida` (0.1 por defecto), de modo que el centroide difiere
+    del de skfuzzy en menos de TOLERANCIA_NIVEL puntos sobre 100. La frontera
+    entre niveles (40 y 70) solo puede cambiar si el nivel cae dentro de esa
+    tolerancia alrededor del umbral.
+
+El objeto es inmutable después de construirse (todos sus arreglos son de solo
+lectura), por lo que una única instancia se comparte entre hilos sin bloqueos.
+"""
+import hashlib
+import json
+import threading
+import numpy as np
+from src import motor_difuso
+from src.metricas import ETAPAS, cronometrar
+
+# Diferencia máxima garantizada respecto al motor de skfuzzy (puntos de NivelUsuario)
+TOLERANCIA_NIVEL = 0.05
+
+# Filas procesadas por bloque en calcular_lote (acota la memoria a ~N x malla)
+TAMANO_BLOQUE = 4096
+
+
+def huella_reglas():
+    """Huella SHA-256 de la definición del sistema difuso (universos, funciones y reglas)"""
+    definicion = {
+        'universos': motor_difuso.UNIVERSOS,
+        'entradas': motor_difuso.VARIABLES_ENTRADA,
+        'salida': motor_difuso.VARIABLE_SALIDA,
+        'pertenencia': motor_difuso.FUNCIONES_PERTENENCIA,
+        'reglas': motor_difuso.REGLAS,
+    }
+    texto = json.dumps(definicion, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _solo_lectura(arreglo):
+    arreglo.setflags(write=False)
+    return arreglo
+
+
+class MotorCompilado:
+    """Sistema difuso Mamdani precompilado en arreglos NumPy"""
+
+    def __init__(self, resolucion_salida=0.1):
+        # skfuzzy solo hace falta para muestrear las pertenencias al construir
+        import skfuzzy as fuzz
+
+        self.huella = huella_reglas()
+        self.resolucion_salida = resolucion_salida
+
+        # ---- Entradas: universo y pertenencias muestreadas (igual que skfuzzy) ----
+        self.entradas = motor_difuso.VARIABLES_ENTRADA
+        self._universos = {}
+        self._columnas = {}        # (variable, término) -> columna en la matriz de pertenencias
+        self._pertenencias = []    # [(variable, universo, mf muestreada)]
+        for nombre in self.entradas:
+            universo = motor_difuso.universo(nombre).astype(np.float64)
+            self._universos[nombre] = _solo_lectura(universo)
+            for termino, puntos in motor_difuso.FUNCIONES_PERTENENCIA[nombre].items():
+                self._columnas[(nombre, termino)] = len(self._pertenencias)
+                mf = _solo_lectura(fuzz.trimf(universo, puntos))
+                self._pertenencias.append((nombre, self._universos[nombre], mf))
+
+        # ---- Reglas: índices de columnas por regla y término de salida ----
+        salida = motor_difuso.VARIABLE_SALIDA
+        self.terminos_salida = tuple(motor_difuso.FUNCIONES_PERTENENCIA[salida])
+        self._reglas = []
+        for op, antecedentes, consecuente in motor_difuso.REGLAS:
+            columnas = _solo_lectura(np.array(
+                [self._columnas[(var, termino)] for var, termino in antecedentes], dtype=np.intp
+            ))
+            reduccion = np.min if op == '&' else np.max
+            self._reglas.append((reduccion, columnas, self.terminos_salida.index(consecuente)))
+
+        # ---- Salida: malla fina y pertenencias interpoladas desde el universo discreto ----
+        universo_salida = motor_difuso.universo(salida).astype(np.float64)
+        inicio, fin = universo_salida[0], universo_salida[-1]
+        puntos = int(round((fin - inicio) / resolucion_salida)) + 1
+        self.malla = _solo_lectura(np.linspace(inicio, fin, puntos))
+        self._mf_salida = _solo_lectura(np.stack([
+            np.interp(self.malla, universo_salida,
+                      fuzz.trimf(universo_salida, motor_difuso.FUNCIONES_PERTENENCIA[salida][t]))
+            for t in self.terminos_salida
+        ]))
+
+        # ---- Centroide exacto de la función lineal a trozos sobre la malla ----
+        # Para cada segmento [x1, x2] con alturas y1, y2:
+        #   área    = h * (y1 + y2) / 2
+        #   momento = h * (x1 * (2*y1 + y2) + x2 * (y1 + 2*y2)) / 6
+        # Se agrupan por punto para que centroide = (Y @ momento) / (Y @ area)
+        x = self.malla
+        h = np.diff(x)
+        coef_area = np.zeros_like(x)
+        coef_area[:-1] += h / 2
+        coef_area[1:] += h / 2
+        coef_momento = np.zeros_like(x)
+        coef_momento[:-1] += h * (2 * x[:-1] + x[1:]) / 6
+        coef_momento[1:] += h * (x[:-1] + 2 * x[1:]) / 6
+        self._coef_area = _solo_lectura(coef_area)
+        self._coef_momento = _solo_lectura(coef_momento)
+
+    def _fuzzificar(self, valores):
+        """Matriz (N x términos de entrada) con el grado de pertenencia de cada fila"""
+        n = len(valores[self.entradas[0]])
+        grados = np.empty((n, len(self._pertenencias)), dtype=np.float64)
+        for columna, (nombre, universo, mf) in enumerate(self._pertenencias):
+            # np.interp recorta a los extremos del universo, igual que skfuzzy
+            grados[:, columna] = np.interp(valores[nombre], universo, mf)
+        return grados
+
+    def _cortes(self, grados):
+        """Matriz (N x términos de salida) con la activación acumulada de cada término"""
+        cortes = np.zeros((grados.shape[0], len(self.terminos_salida)), dtype=np.float64)
+        for reduccion, columnas, termino in self._reglas:
+            activacion = reduccion(grados[:, columnas], axis=1)
+            np.maximum(cortes[:, termino], activacion, out=cortes[:, termino])
+        return cortes
+
+    def _defuzzificar(self, cortes):
+        """Centroide de la agregación (máximo de los términos recortados) por fila"""
+        agregada = np.minimum(cortes[:, 0, None], self._mf_salida[0])
+        for termino in range(1, len(self.terminos_salida)):
+            np.maximum(agregada, np.minimum(cortes[:, termino, None], self._mf_salida[termino]), out=agregada)
+        area = agregada @ self._coef_area
+        momento = agregada @ self._coef_momento
+        niveles = np.full(area.shape, np.nan)
+        con_area = area > 0
+        niveles[con_area] = momento[con_area] / area[con_area]
+        return niveles
+
+    def calcular_lote(self, tiempo, errores, tareas):
+        """
+        Calcula NivelUsuario para arreglos de entradas.
+
+        Returns:
+            np.ndarray de float64; NaN en las filas donde ninguna regla se activa
+            (el mismo caso en que skfuzzy lanza una excepción).
+        """
+        columnas = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (tiempo, errores, tareas)]
+        columnas = np.broadcast_arrays(*columnas)
+        n = columnas[0].shape[0]
+        niveles = np.empty(n, dtype=np.float64)
+        for inicio in range(0, n, TAMANO_BLOQUE):
+            fin = min(inicio + TAMANO_BLOQUE, n)
+            valores = {nombre: col[inicio:fin] for nombre, col in zip(self.entradas, columnas)}
+            niveles[inicio:fin] = self._defuzzificar(self._cortes(self._fuzzificar(valores)))
+        return niveles
+
+    def calcular(self, tiempo, errores, tareas):
+        """Calcula NivelUsuario para una sola sesión (lanza ValueError si ninguna regla se activa)"""
+        nivel = self.calcular_lote(tiempo, errores, tareas)[0]
+        if np.isnan(nivel):
+            raise ValueError("Ninguna regla difusa se activó: no se puede calcular NivelUsuario")
+        return float(nivel)
+
+
+_motor = None
+_lock_motor = threading.Lock()
+
+
+def obtener_motor_compilado():
+    """Devuelve la instancia compartida del motor compilado (se construye una vez por proceso)"""
+    global _motor
+    if _motor is None:
+        with _lock_motor:
+            if _motor is None:
+                with cronometrar(ETAPAS, "construccion_motor"):
+                    _motor = MotorCompilado()
+    return _motor
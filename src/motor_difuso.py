@@ -1,78 +1,131 @@
+from functools import reduce
+import operator
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
 
-def crear_motor_difuso():
-    # Variables de entrada
-    tiempo = ctrl.Antecedent(np.arange(0, 11, 1), 'TiempoPromedioAccion')
-    errores = ctrl.Antecedent(np.arange(0, 11, 1), 'ErroresSesion')
-    tareas = ctrl.Antecedent(np.arange(0, 31, 1), 'TareasCompletadas')
-
-    # Variable de salida
-    nivel = ctrl.Consequent(np.arange(0, 101, 1), 'NivelUsuario')
+# ========== DEFINICIÓN DEL SISTEMA DIFUSO ==========
+# Estas tablas son la única fuente de verdad del sistema: crear_motor_difuso()
+# construye el motor de skfuzzy a partir de ellas y src/motor_compilado.py las
+# compila en arreglos NumPy. Cualquier cambio aquí se refleja en ambos motores.
 
-    # Funciones de pertenencia
-    tiempo['bajo'] = fuzz.trimf(tiempo.universe, [0, 0, 3])
-    tiempo['medio'] = fuzz.trimf(tiempo.universe, [2, 5, 8])
-    tiempo['alto'] = fuzz.trimf(tiempo.universe, [6, 10, 10])
-
-    errores['bajo'] = fuzz.trimf(errores.universe, [0, 0, 1])
-    errores['medio'] = fuzz.trimf(errores.universe, [1, 3, 5])
-    errores['alto'] = fuzz.trimf(errores.universe, [4, 8, 10])
+# Universos de discurso: (inicio, fin, paso) para np.arange
+UNIVERSOS = {
+    'TiempoPromedioAccion': (0, 11, 1),
+    'ErroresSesion': (0, 11, 1),
+    'TareasCompletadas': (0, 31, 1),
+    'NivelUsuario': (0, 101, 1),
+}
 
-    tareas['bajo'] = fuzz.trimf(tareas.universe, [0, 0, 10])
-    tareas['medio'] = fuzz.trimf(tareas.universe, [8, 15, 20])
-    tareas['alto'] = fuzz.trimf(tareas.universe, [18, 25, 30])
+VARIABLES_ENTRADA = ('TiempoPromedioAccion', 'ErroresSesion', 'TareasCompletadas')
+VARIABLE_SALIDA = 'NivelUsuario'
 
-    nivel['novato'] = fuzz.trimf(nivel.universe, [0, 0, 40])
-    nivel['intermedio'] = fuzz.trimf(nivel.universe, [30, 50, 70])
-    nivel['experto'] = fuzz.trimf(nivel.universe, [60, 100, 100])
+# Funciones de pertenencia triangulares (trimf)
+FUNCIONES_PERTENENCIA = {
+    'TiempoPromedioAccion': {
+        'bajo': [0, 0, 3],
+        'medio': [2, 5, 8],
+        'alto': [6, 10, 10],
+    },
+    'ErroresSesion': {
+        'bajo': [0, 0, 1],
+        'medio': [1, 3, 5],
+        'alto': [4, 8, 10],
+    },
+    'TareasCompletadas': {
+        'bajo': [0, 0, 10],
+        'medio': [8, 15, 20],
+        'alto': [18, 25, 30],
+    },
+    'NivelUsuario': {
+        'novato': [0, 0, 40],
+        'intermedio': [30, 50, 70],
+        'experto': [60, 100, 100],
+    },
+}
 
+# Reglas: (operador, [(variable, término), ...], término de salida)
+# operador '&' = Y (mínimo), '|' = O (máximo)
+REGLAS = [
     # ========== REGLAS DIFUSAS ORIGINALES (MANTENIDAS) ==========
     # Regla 1: Tiempo alto O errores altos → Novato
-    rule1 = ctrl.Rule(tiempo['alto'] | errores['alto'], nivel['novato'])
-    
+    ('|', [('TiempoPromedioAccion', 'alto'), ('ErroresSesion', 'alto')], 'novato'),
+
     # Regla 2: Tiempo medio Y errores medios → Intermedio
-    rule2 = ctrl.Rule(tiempo['medio'] & errores['medio'], nivel['intermedio'])
-    
+    ('&', [('TiempoPromedioAccion', 'medio'), ('ErroresSesion', 'medio')], 'intermedio'),
+
     # Regla 3: Tiempo bajo Y errores bajos Y tareas altas → Experto
-    rule3 = ctrl.Rule(tiempo['bajo'] & errores['bajo'] & tareas['alto'], nivel['experto'])
-    
+    ('&', [('TiempoPromedioAccion', 'bajo'), ('ErroresSesion', 'bajo'), ('TareasCompletadas', 'alto')], 'experto'),
+
     # ========== REGLAS ADICIONALES PARA MEJORAR CLASIFICACIÓN ==========
     # Estas reglas complementan las originales para casos más específicos
-    
+
     # Regla 4: Tiempo bajo + pocos errores + muchas tareas medias = Experto
-    rule4 = ctrl.Rule(tiempo['bajo'] & errores['bajo'] & tareas['medio'], nivel['experto'])
-    
+    ('&', [('TiempoPromedioAccion', 'bajo'), ('ErroresSesion', 'bajo'), ('TareasCompletadas', 'medio')], 'experto'),
+
     # Regla 5: Tiempo medio + pocos errores + tareas medias = Intermedio
-    rule5 = ctrl.Rule(tiempo['medio'] & errores['bajo'] & tareas['medio'], nivel['intermedio'])
-    
+    ('&', [('TiempoPromedioAccion', 'medio'), ('ErroresSesion', 'bajo'), ('TareasCompletadas', 'medio')], 'intermedio'),
+
     # Regla 6: Tiempo bajo + errores medios + tareas altas = Intermedio
-    rule6 = ctrl.Rule(tiempo['bajo'] & errores['medio'] & tareas['alto'], nivel['intermedio'])
-    
+    ('&', [('TiempoPromedioAccion', 'bajo'), ('ErroresSesion', 'medio'), ('TareasCompletadas', 'alto')], 'intermedio'),
+
     # Regla 7: Tiempo alto + errores bajos = Novato (lento pero preciso, aún novato)
-    rule7 = ctrl.Rule(tiempo['alto'] & errores['bajo'], nivel['novato'])
-    
+    ('&', [('TiempoPromedioAccion', 'alto'), ('ErroresSesion', 'bajo')], 'novato'),
+
     # Regla 8: Tiempo medio + errores altos = Novato (promedio pero muchos errores)
-    rule8 = ctrl.Rule(tiempo['medio'] & errores['alto'], nivel['novato'])
-    
+    ('&', [('TiempoPromedioAccion', 'medio'), ('ErroresSesion', 'alto')], 'novato'),
+
     # Regla 9: Tiempo bajo + errores bajos + pocas tareas = Experto (rápido y preciso, incluso con pocas tareas)
     # Cambiado de Intermedio a Experto para usuarios muy rápidos y precisos
-    rule9 = ctrl.Rule(tiempo['bajo'] & errores['bajo'] & tareas['bajo'], nivel['experto'])
-    
+    ('&', [('TiempoPromedioAccion', 'bajo'), ('ErroresSesion', 'bajo'), ('TareasCompletadas', 'bajo')], 'experto'),
+
     # Regla 10: Tiempo medio + errores bajos + muchas tareas = Intermedio-Experto
-    rule10 = ctrl.Rule(tiempo['medio'] & errores['bajo'] & tareas['alto'], nivel['intermedio'])
-    
+    ('&', [('TiempoPromedioAccion', 'medio'), ('ErroresSesion', 'bajo'), ('TareasCompletadas', 'alto')], 'intermedio'),
+
     # Regla 11: Tiempo bajo + errores medios + tareas medias = Intermedio
-    rule11 = ctrl.Rule(tiempo['bajo'] & errores['medio'] & tareas['medio'], nivel['intermedio'])
-    
+    ('&', [('TiempoPromedioAccion', 'bajo'), ('ErroresSesion', 'medio'), ('TareasCompletadas', 'medio')], 'intermedio'),
+
     # Regla 12: Tiempo alto + errores medios = Novato (lento y con errores)
-    rule12 = ctrl.Rule(tiempo['alto'] & errores['medio'], nivel['novato'])
+    ('&', [('TiempoPromedioAccion', 'alto'), ('ErroresSesion', 'medio')], 'novato'),
+]
+
+OPERADORES = {'&': operator.and_, '|': operator.or_}
+
+
+def universo(variable):
+    """Devuelve el universo de discurso discreto de una variable"""
+    return np.arange(*UNIVERSOS[variable])
+
+
+def crear_motor_difuso():
+    # skfuzzy (con scipy y networkx) solo se importa al construir el motor original
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    # Variables de entrada
+    variables = {
+        nombre: ctrl.Antecedent(universo(nombre), nombre)
+        for nombre in VARIABLES_ENTRADA
+    }
+
+    # Variable de salida
+    variables[VARIABLE_SALIDA] = ctrl.Consequent(universo(VARIABLE_SALIDA), VARIABLE_SALIDA)
+
+    # Funciones de pertenencia
+    for nombre, terminos in FUNCIONES_PERTENENCIA.items():
+        variable = variables[nombre]
+        for termino, puntos in terminos.items():
+            variable[termino] = fuzz.trimf(variable.universe, puntos)
+
+    # Reglas
+    nivel = variables[VARIABLE_SALIDA]
+    reglas = [
+        ctrl.Rule(
+            reduce(OPERADORES[op], [variables[var][termino] for var, termino in antecedentes]),
+            nivel[consecuente]
+        )
+        for op, antecedentes, consecuente in REGLAS
+    ]
 
     # Crear controlador con todas las reglas
     # Las 3 reglas originales son prioritarias, las adicionales refinan la clasificación
-    nivel_ctrl = ctrl.ControlSystem([
-        rule1, rule2, rule3,  # Reglas originales (mantenidas)
-        rule4, rule5, rule6, rule7, rule8, rule9, rule10, rule11, rule12  # Reglas adicionales
-    ])
+    nivel_ctrl = ctrl.ControlSystem(reglas)
     return ctrl.ControlSystemSimulation(nivel_ctrl)
@@ -0,0 +1,119 @@
+"""
+Notificaciones en vivo a las terminales (Server-Sent Events).
+
+Cada página del POS abre /api/stream; el servidor le empuja los cambios en
+cuanto ocurren, en lugar de que cada terminal consulte /api/estado cada 30 s:
+
+    nivel       nueva clasificación de la terminal al completar una venta
+    adaptacion  la adaptación se activó o desactivó (para todas las terminales)
+    estado      estado inicial al conectarse
+
+Las suscripciones son colas en memoria del proceso. Los cambios de la
+adaptación hechos por otro worker se detectan comparando la configuración
+(en caché, src/config.py) cada INTERVALO_REVISION_S segundos.
+"""
+import json
+import queue
+import threading
+from src.config import obtener_estado_adaptacion
+
+# Cada cuánto despierta un flujo sin mensajes (revisa la configuración)
+INTERVALO_REVISION_S = 2.0
+
+# Comentario de latido para que proxies y navegador no cierren la conexión
+INTERVALO_LATIDO_S = 15.0
+
+# Milisegundos que espera el navegador antes de reconectar
+REINTENTO_MS = 5000
+
+# Mensajes pendientes por suscriptor; si un cliente no lee, se descartan
+MAX_PENDIENTES = 100
+
+_suscriptores = {}  # terminal -> set de colas
+_lock_suscriptores = threading.Lock()
+
+
+def suscribir(terminal):
+    """Registra un suscriptor de la terminal y devuelve su cola de mensajes"""
+    cola = queue.Queue(maxsize=MAX_PENDIENTES)
+    with _lock_suscriptores:
+        _suscriptores.setdefault(terminal, set()).add(cola)
+    return cola
+
+
+def cancelar(terminal, cola):
+    with _lock_suscriptores:
+        colas = _suscriptores.get(terminal)
+        if colas is not None:
+            colas.discard(cola)
+            if not colas:
+                del _suscriptores[terminal]
+
+
+def total_suscriptores():
+    with _lock_suscriptores:
+        return sum(len(colas) for colas in _suscriptores.values())
+
+
+def _entregar(colas, tipo, datos):
+    for cola in colas:
+        try:
+            cola.put_nowait((tipo, datos))
+        except queue.Full:
+            # Cliente que no lee: se pierde el mensaje, no se bloquea al que publica
+            pass
+
+
+def publicar(terminal, tipo, datos):
+    """Envía un mensaje a los suscriptores de una terminal"""
+    with _lock_suscriptores:
+        colas = list(_suscriptores.get(terminal, ()))
+    _entregar(colas, tipo, datos)
+
+
+def publicar_todos(tipo, datos):
+    """Envía un mensaje a todas las terminales suscritas"""
+    with _lock_suscriptores:
+        colas = [cola for colas in _suscriptores.values() for cola in colas]
+    _entregar(colas, tipo, datos)
+
+
+def formatear(tipo, datos):
+    """Mensaje en formato text/event-stream"""
+    return f"event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+def flujo(terminal, obtener_estado_inicial):
+    """Generador del flujo SSE de una terminal (se suscribe al empezar a iterar)
+
+    El estado inicial se arma después de suscribirse: lo que se publique antes
+    ya está en el estado y lo que se publique después llega por la cola.
+    """
+    cola = suscribir(terminal)
+    estado_inicial = obtener_estado_inicial()
+    adaptacion = estado_inicial.get("adaptacion_activa")
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n"
+        yield formatear("estado", estado_inicial)
+        sin_mensajes = 0.0
+        while True:
+            try:
+                tipo, datos = cola.get(timeout=INTERVALO_REVISION_S)
+            except queue.Empty:
+                sin_mensajes += INTERVALO_REVISION_S
+                # Cambio hecho por otro worker (config.json en disco)
+                actual = obtener_estado_adaptacion()
+                if actual != adaptacion:
+                    adaptacion = actual
+                    yield formatear("adaptacion", {"adaptacion_activa": actual})
+                    sin_mensajes = 0.0
+                elif sin_mensajes >= INTERVALO_LATIDO_S:
+                    yield ": latido\n\n"
+                    sin_mensajes = 0.0
+                continue
+            if tipo == "adaptacion":
+                adaptacion = datos.get("adaptacion_activa")
+            sin_mensajes = 0.0
+            yield formatear(tipo, datos)
+    finally:
+        cancelar(terminal, cola)
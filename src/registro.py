@@ -0,0 +1,154 @@
+"""
+Registro (logging) del sistema sin bloquear las peticiones.
+
+Los módulos registran con obtener_registro(nombre) (logger "pos.<nombre>").
+Los registros se encolan con un QueueHandler: el hilo de la petición solo
+pone el registro en una cola, y un QueueListener en su propio hilo le da
+formato y lo escribe en la salida estándar. Así la salida de hilos distintos
+no se mezcla y el tiempo de escritura en la terminal no se suma a la latencia.
+
+Niveles:
+  - INFO: una línea compacta por hecho relevante (venta, cambio de interfaz,
+    sesión nueva...), con sus datos como campos
+  - DEBUG: además, los banners con emojis (evaluación paso a paso, cada evento)
+  - WARNING/ERROR: fallos recuperables y errores
+
+Configuración (data/config.json, o variables de entorno que tienen prioridad):
+  "nivel_registro": "DEBUG" | "INFO" | "WARNING" | "ERROR"   (POS_NIVEL_REGISTRO)
+  "formato_registro": "texto" | "json"                       (POS_FORMATO_REGISTRO)
+
+Con "json" cada registro es una línea JSON:
+  {"ts": "...", "nivel": "INFO", "origen": "pos.app", "mensaje": "...", <campos>}
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+RAIZ = "pos"
+
+NIVEL_POR_DEFECTO = "INFO"
+FORMATOS = ("texto", "json")
+
+_listener = None
+_lock_configuracion = threading.Lock()
+
+
+def obtener_registro(nombre):
+    """Logger del módulo indicado (hijo de "pos")"""
+    return logging.getLogger(f"{RAIZ}.{nombre}")
+
+
+def banner(registro, titulo, *lineas):
+    """Banner con emojis en un solo registro DEBUG (no se arma si DEBUG está desactivado)"""
+    if not registro.isEnabledFor(logging.DEBUG):
+        return
+    separador = "=" * 60
+    registro.debug("\n".join([separador, titulo, *lineas, separador]))
+
+
+class FormatoTexto(logging.Formatter):
+    """Hora, nivel, origen y mensaje; los campos se agregan como clave=valor"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = getattr(record, "campos", None)
+        if campos:
+            texto += " | " + " ".join(f"{clave}={valor}" for clave, valor in campos.items())
+        return texto
+
+
+class FormatoJSON(logging.Formatter):
+    """Un objeto JSON compacto por línea"""
+
+    def format(self, record):
+        linea = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "origen": record.name,
+            "mensaje": record.getMessage(),
+        }
+        campos = getattr(record, "campos", None)
+        if campos:
+            linea.update(campos)
+        if record.exc_info:
+            linea["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(linea, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SalidaEstandar(logging.StreamHandler):
+    """StreamHandler que escribe en el sys.stdout vigente (las pruebas lo reemplazan)"""
+
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class ColaRegistro(logging.handlers.QueueHandler):
+    """QueueHandler que encola el registro sin formatear (QueueHandler.prepare arma
+    el mensaje y la traza en el hilo que registra); el formato lo da el QueueListener"""
+
+    def prepare(self, record):
+        # La cola no sale del proceso: no hace falta volver el registro serializable
+        return record
+
+
+def _nivel(nivel):
+    nivel = str(nivel or NIVEL_POR_DEFECTO).upper()
+    return nivel if isinstance(logging.getLevelName(nivel), int) else NIVEL_POR_DEFECTO
+
+
+def _preferencias(nivel, formato):
+    """Nivel y formato: argumentos, luego variables de entorno, luego config.json"""
+    if nivel is None or formato is None:
+        from src.config import obtener_nivel_registro, obtener_formato_registro
+        if nivel is None:
+            nivel = os.environ.get("POS_NIVEL_REGISTRO") or obtener_nivel_registro()
+        if formato is None:
+            formato = os.environ.get("POS_FORMATO_REGISTRO") or obtener_formato_registro()
+    return _nivel(nivel), formato if formato in FORMATOS else "texto"
+
+
+def configurar_registro(nivel=None, formato=None, manejador=None):
+    """
+    Instala la cola de registro en el logger "pos" (se puede volver a llamar para
+    cambiar nivel o formato). manejador reemplaza la salida estándar (p. ej. en pruebas).
+    """
+    global _listener
+    nivel, formato = _preferencias(nivel, formato)
+    with _lock_configuracion:
+        detener_registro()
+
+        salida = manejador if manejador is not None else SalidaEstandar()
+        salida.setFormatter(FormatoJSON() if formato == "json" else FormatoTexto())
+
+        cola = queue.SimpleQueue()
+        raiz = logging.getLogger(RAIZ)
+        for anterior in list(raiz.handlers):
+            raiz.removeHandler(anterior)
+        raiz.addHandler(ColaRegistro(cola))
+        raiz.setLevel(nivel)
+        raiz.propagate = False
+
+        _listener = logging.handlers.QueueListener(cola, salida)
+        _listener.start()
+    return nivel, formato
+
+
+def detener_registro():
+    """Escribe lo que quede en la cola y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(detener_registro)
@@ -0,0 +1,68 @@
+"""
+Terminales (cajas) del punto de venta.
+
+Cada terminal tiene su propio historial de sesiones, diario y estado en
+memoria, en un directorio propio, para que varias cajas en el mismo servidor
+no compartan contadores, nivel ni interfaz ni compitan por un mismo archivo:
+
+    principal (por defecto)  data/dataset_pos.csv, data/eventos_pos.jsonl
+    <terminal>               data/terminales/<terminal>/dataset_pos.csv, ...
+
+El identificador lo envía static/scripts.js (cabecera X-Terminal-ID y cookie
+terminal_id); sin identificador se usa la terminal principal, que conserva
+las rutas de una instalación de una sola caja.
+"""
+import os
+import re
+
+TERMINAL_POR_DEFECTO = "principal"
+DIRECTORIO_DATOS = "data"
+DIRECTORIO_TERMINALES = os.path.join(DIRECTORIO_DATOS, "terminales")
+
+CABECERA_TERMINAL = "X-Terminal-ID"
+COOKIE_TERMINAL = "terminal_id"
+
+# Se usa como nombre de directorio: solo caracteres seguros
+_PATRON_TERMINAL = re.compile(r"^[A-Za-z0-9_-]{1,40}$")
+
+
+def normalizar_terminal(terminal):
+    """Identificador de terminal válido, o la terminal principal si no lo es"""
+    terminal = str(terminal or "").strip()
+    if not _PATRON_TERMINAL.match(terminal):
+        return TERMINAL_POR_DEFECTO
+    return terminal
+
+
+def directorio_terminal(terminal=None):
+    """Directorio de datos de la terminal"""
+    terminal = normalizar_terminal(terminal)
+    if terminal == TERMINAL_POR_DEFECTO:
+        return DIRECTORIO_DATOS
+    return os.path.join(DIRECTORIO_TERMINALES, terminal)
+
+
+def archivos_terminal(terminal=None):
+    """(dataset, diario) de la terminal"""
+    directorio = directorio_terminal(terminal)
+    return os.path.join(directorio, "dataset_pos.csv"), os.path.join(directorio, "eventos_pos.jsonl")
+
+
+def terminal_de_peticion(peticion):
+    """Terminal de una petición Flask: cabecera, parámetro ?terminal= o cookie"""
+    return normalizar_terminal(
+        peticion.headers.get(CABECERA_TERMINAL)
+        or peticion.args.get("terminal")
+        or peticion.cookies.get(COOKIE_TERMINAL)
+    )
+
+
+def listar_terminales():
+    """La terminal principal y las que tienen directorio en data/terminales/"""
+    terminales = [TERMINAL_POR_DEFECTO]
+    if os.path.isdir(DIRECTORIO_TERMINALES):
+        terminales.extend(sorted(
+            nombre for nombre in os.listdir(DIRECTORIO_TERMINALES)
+            if _PATRON_TERMINAL.match(nombre) and os.path.isdir(os.path.join(DIRECTORIO_TERMINALES, nombre))
+        ))
+    return terminales
@@ -1,5 +1,34 @@
+// Identificador de la terminal (caja). Se configura una vez abriendo el POS con
+// ?terminal=<id>; se guarda en localStorage y en la cookie terminal_id para que
+// también lo lleven las navegaciones entre interfaces. Sin identificador el
+// servidor usa la terminal principal.
+function obtenerTerminalId() {
+    const parametro = new URLSearchParams(window.location.search).get('terminal');
+    if (parametro) {
+        localStorage.setItem('posTerminalId', parametro);
+    }
+    const terminal = parametro || localStorage.getItem('posTerminalId');
+    if (terminal) {
+        document.cookie = `terminal_id=${encodeURIComponent(terminal)}; path=/; max-age=31536000; SameSite=Lax`;
+    }
+    return terminal;
+}
+
 class POSTracker {
     constructor() {
+        this.terminalId = obtenerTerminalId();
+        
+        // Buffer de eventos: se envían en lote a /api/eventos
+        this.bufferEventos = [];
+        this.maxBufferEventos = 20; // Enviar al juntar 20 eventos...
+        this.intervaloEnvio = 3000; // ...o 3 segundos después del primero
+        this.temporizadorEnvio = null;
+        this.envioEnCurso = Promise.resolve(); // Los lotes se envían en orden, uno tras otro
+        
+        this.fuenteNotificaciones = null;
+        this.temporizadorRespaldo = null; // Consulta periódica si no hay flujo SSE
+        this.redirigiendo = false;
+        this.ultimoEtagEstado = null; // Validador de la última respuesta de /api/estado
         this.inicioAccion = null;
         this.contadorErrores = 0;
         this.ultimaEvaluacion = Date.now();
@@ -17,8 +46,16 @@ class POSTracker {
         this.inicializar();
     }
 
+    cabeceras() {
+        const cabeceras = { 'Content-Type': 'application/json' };
+        if (this.terminalId) {
+            cabeceras['X-Terminal-ID'] = this.terminalId;
+        }
+        return cabeceras;
+    }
+
     inicializar() {
-        console.log('[TRACKER] Sistema de tracking inicializado');
+        console.log(`[TRACKER] Sistema de tracking inicializado${this.terminalId ? ` (terminal: ${this.terminalId})` : ''}`);
         
         // Rastrear TODOS los clicks (no solo elementos específicos)
         // Esto permite detectar clicks incorrectos en áreas vacías
@@ -55,8 +92,17 @@ class POSTracker {
             });
         });
 
-        // Evaluar periódicamente si necesita cambiar interfaz
-        setInterval(() => this.verificarCambioInterfaz(), this.intervaloEvaluacion);
+        // Al salir de la página, enviar lo pendiente con sendBeacon (sobrevive a la navegación)
+        window.addEventListener('pagehide', () => this.enviarConBeacon());
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                this.enviarConBeacon();
+            }
+        });
+
+        // Cambios de nivel, interfaz y adaptación empujados por el servidor (/api/stream).
+        // La consulta periódica a /api/estado queda solo como respaldo.
+        this.conectarNotificaciones();
 
         // Registrar evento de carga de página (solo si hay datos, no en interfaz original)
         const ruta = window.location.pathname;
@@ -223,72 +269,241 @@ class POSTracker {
         // Aquí solo enviamos la duración de la acción individual
         let duracionFinal = Math.max(0.1, duracion);
         
-        // Usar fetch para envío asíncrono
-        fetch('/api/evento', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                tipo_evento: tipo,
-                duracion: duracionFinal,
-                exito: exito,
-                tiempo_activo: tiempoActivoSesion // Enviar tiempo activo para referencia
-            })
+        this.bufferEventos.push({
+            tipo_evento: tipo,
+            duracion: duracionFinal,
+            exito: exito,
+            tiempo_activo: tiempoActivoSesion // Enviar tiempo activo para referencia
+        });
+        
+        if (tipo === 'compra_finalizada' || this.bufferEventos.length >= this.maxBufferEventos) {
+            // La venta se evalúa en el servidor: enviar ya, junto con lo pendiente
+            this.vaciarBuffer()
+                .then(data => this.procesarRespuesta(data))
+                .catch(error => {
+                    console.error('[ERROR] No se pudo registrar evento:', error);
+                });
+        } else if (this.temporizadorEnvio === null) {
+            this.temporizadorEnvio = setTimeout(() => {
+                this.vaciarBuffer().catch(error => {
+                    console.error('[ERROR] No se pudo registrar evento:', error);
+                });
+            }, this.intervaloEnvio);
+        }
+    }
+
+    vaciarBuffer() {
+        // Envía los eventos pendientes en un solo POST; devuelve la respuesta del servidor
+        clearTimeout(this.temporizadorEnvio);
+        this.temporizadorEnvio = null;
+        if (this.bufferEventos.length === 0) {
+            return this.envioEnCurso.then(() => null);
+        }
+        const lote = this.bufferEventos;
+        this.bufferEventos = [];
+        
+        let inicio = 0;
+        const envio = this.envioEnCurso.then(() => {
+            inicio = performance.now();
+            return fetch('/api/eventos', {
+                method: 'POST',
+                headers: this.cabeceras(),
+                body: JSON.stringify({ eventos: lote }),
+                keepalive: true
+            });
         })
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'ok') {
-                // Solo mostrar información si se completó una venta
-                if (data.nivel !== null && data.nivel !== undefined) {
-                    console.log(`[TRACKER] ✅ Venta completada. Nivel: ${data.nivel}, Interfaz: ${data.interfaz}`);
-                    
-                    // Si se completó una venta, SIEMPRE redirigir a la interfaz correcta
-                    if (tipo === 'compra_finalizada') {
-                        if (data.cambio_interfaz) {
-                            console.log(`[CAMBIO DETECTADO] Cambiando a interfaz: ${data.interfaz}`);
-                            this.mostrarNotificacionCambio(data.interfaz);
-                        } else {
-                            console.log(`[TRACKER] Sin cambio de interfaz. Nivel actual: ${data.nivel}, Interfaz: ${data.interfaz}`);
-                        }
-                        
-                        // Resetear tracking para nueva sesión
-                        this.resetTracking();
-                        
-                        // Redirigir a la interfaz correcta (siempre después de completar venta)
-                        if (data.redirigir && data.url_redireccion) {
-                            setTimeout(() => {
-                                window.location.href = data.url_redireccion;
-                            }, data.cambio_interfaz ? 600 : 300); // Más rápido si no hay cambio
-                        } else if (data.interfaz) {
-                            setTimeout(() => {
-                                window.location.href = `/${data.interfaz}`;
-                            }, data.cambio_interfaz ? 2000 : 1000);
-                        }
-                    }
+        .then(response => {
+            this.registrarTiempos('/api/eventos', response, inicio);
+            return response.json();
+        });
+        this.envioEnCurso = envio.catch(() => null);
+        return envio;
+    }
+
+    registrarTiempos(ruta, response, inicio) {
+        // Con "server_timing": true en config.json el servidor desglosa su tiempo
+        // (cola, lectura, evaluación, escritura...) en la cabecera Server-Timing
+        const cabecera = response.headers.get('Server-Timing');
+        if (!cabecera) {
+            return;
+        }
+        const tramos = cabecera.split(',').map(parte => {
+            const [nombre, ...parametros] = parte.trim().split(';');
+            const dur = parametros.map(p => p.trim()).find(p => p.startsWith('dur='));
+            return `${nombre} ${dur ? parseFloat(dur.slice(4)).toFixed(1) : '?'}ms`;
+        });
+        console.log(`[TIEMPOS] ${ruta} - cliente: ${(performance.now() - inicio).toFixed(1)}ms - servidor: ${tramos.join(', ')}`);
+    }
+
+    enviarConBeacon() {
+        if (this.bufferEventos.length === 0) {
+            return;
+        }
+        clearTimeout(this.temporizadorEnvio);
+        this.temporizadorEnvio = null;
+        const lote = this.bufferEventos;
+        this.bufferEventos = [];
+        
+        // sendBeacon no admite cabeceras: la terminal va en la URL (y en la cookie)
+        const url = this.terminalId ? `/api/eventos?terminal=${encodeURIComponent(this.terminalId)}` : '/api/eventos';
+        const cuerpo = JSON.stringify({ eventos: lote });
+        const enviado = navigator.sendBeacon && navigator.sendBeacon(url, new Blob([cuerpo], { type: 'application/json' }));
+        if (!enviado) {
+            fetch(url, { method: 'POST', headers: this.cabeceras(), body: cuerpo, keepalive: true });
+        }
+        console.log(`[TRACKER] ${lote.length} eventos enviados al salir de la página`);
+    }
+
+    finalizarVenta(duracion = 0) {
+        // Usado por las pantallas de pago: la venta viaja en el mismo lote que los eventos pendientes
+        this.bufferEventos.push({ tipo_evento: 'compra_finalizada', duracion: duracion, exito: true, tiempo_activo: null });
+        return this.vaciarBuffer().then(data => {
+            this.resetTracking();
+            if (data && data.evaluacion_pendiente) {
+                // La cola del servidor va atrasada: la página siguiente recibe la interfaz asignada por /api/stream
+                console.log('[TRACKER] Venta registrada, evaluación en curso');
+                sessionStorage.setItem('posEvaluacionPendiente', '1');
+            }
+            return data;
+        });
+    }
+
+    procesarRespuesta(data) {
+        if (!data) {
+            return;
+        }
+        if (data.status === 'ok') {
+            // Solo mostrar información si se completó una venta
+            if (data.redirigir) {
+                console.log(`[TRACKER] ✅ Venta completada. Nivel: ${data.nivel}, Interfaz: ${data.interfaz}`);
+                
+                // Si se completó una venta, SIEMPRE redirigir a la interfaz correcta
+                if (data.cambio_interfaz) {
+                    console.log(`[CAMBIO DETECTADO] Cambiando a interfaz: ${data.interfaz}`);
+                    this.mostrarNotificacionCambio(data.interfaz);
                 } else {
-                    // Evento normal (durante el proceso) - solo registrar sin evaluar
-                    console.log(`[TRACKER] Evento registrado: ${tipo} (esperando finalizar venta para evaluar)`);
+                    console.log(`[TRACKER] Sin cambio de interfaz. Nivel actual: ${data.nivel}, Interfaz: ${data.interfaz}`);
                 }
+                
+                // Resetear tracking para nueva sesión
+                this.resetTracking();
+                this.redirigiendo = true;
+                
+                // Redirigir a la interfaz correcta (siempre después de completar venta)
+                if (data.url_redireccion) {
+                    setTimeout(() => {
+                        window.location.href = data.url_redireccion;
+                    }, data.cambio_interfaz ? 600 : 300); // Más rápido si no hay cambio
+                } else if (data.interfaz) {
+                    setTimeout(() => {
+                        window.location.href = `/${data.interfaz}`;
+                    }, data.cambio_interfaz ? 2000 : 1000);
+                }
+            } else if (data.evaluacion_pendiente) {
+                // La cola del servidor va atrasada: la interfaz asignada llega por /api/stream
+                console.log('[TRACKER] Venta registrada, evaluación en curso');
+                sessionStorage.setItem('posEvaluacionPendiente', '1');
             } else {
-                console.error('[TRACKER] Error al registrar evento:', data.mensaje);
+                // Eventos normales (durante el proceso) - solo registrar sin evaluar
+                console.log(`[TRACKER] ${data.procesados} eventos registrados (esperando finalizar venta para evaluar)`);
+            }
+        } else {
+            console.error('[TRACKER] Error al registrar eventos:', data.mensaje);
+        }
+    }
+
+    conectarNotificaciones() {
+        if (!window.EventSource) {
+            this.activarRespaldo();
+            return;
+        }
+        const url = this.terminalId ? `/api/stream?terminal=${encodeURIComponent(this.terminalId)}` : '/api/stream';
+        this.fuenteNotificaciones = new EventSource(url);
+        
+        this.fuenteNotificaciones.onopen = () => this.desactivarRespaldo();
+        // El navegador reconecta solo; mientras tanto, consultar como antes
+        this.fuenteNotificaciones.onerror = () => this.activarRespaldo();
+        
+        this.fuenteNotificaciones.addEventListener('nivel', (e) => this.recibirNivel(JSON.parse(e.data)));
+        this.fuenteNotificaciones.addEventListener('estado', (e) => {
+            // Venta evaluada mientras se cambiaba de página: el estado inicial trae la interfaz asignada
+            if (sessionStorage.getItem('posEvaluacionPendiente')) {
+                sessionStorage.removeItem('posEvaluacionPendiente');
+                this.recibirNivel(JSON.parse(e.data));
             }
-        })
-        .catch(error => {
-            console.error('[ERROR] No se pudo registrar evento:', error);
         });
+        this.fuenteNotificaciones.addEventListener('adaptacion', (e) => this.recibirAdaptacion(JSON.parse(e.data)));
+        
+        // Cerrar el flujo al salir para liberar la conexión en el servidor
+        window.addEventListener('pagehide', () => this.fuenteNotificaciones.close());
+    }
+
+    activarRespaldo() {
+        if (this.temporizadorRespaldo === null) {
+            this.temporizadorRespaldo = setInterval(() => this.verificarCambioInterfaz(), this.intervaloEvaluacion);
+        }
+    }
+
+    desactivarRespaldo() {
+        clearInterval(this.temporizadorRespaldo);
+        this.temporizadorRespaldo = null;
+    }
+
+    recibirNivel(data) {
+        // Venta completada en esta terminal: si esta página no es la interfaz asignada, cambiar
+        const ruta = window.location.pathname;
+        const interfazPagina = ruta.split('/')[1];
+        console.log(`[NOTIFICACIÓN] Nivel: ${data.nivel}, Interfaz: ${data.interfaz}`);
+        if (this.redirigiendo || ruta.includes('pago') || !data.interfaz || data.interfaz === interfazPagina) {
+            return;
+        }
+        this.redirigiendo = true;
+        this.mostrarNotificacionCambio(data.interfaz);
+        setTimeout(() => {
+            window.location.href = `/${data.interfaz}`;
+        }, 600);
+    }
+
+    recibirAdaptacion(data) {
+        console.log(`[NOTIFICACIÓN] Adaptación ${data.adaptacion_activa ? 'activada' : 'desactivada'}`);
+        if (typeof window.actualizarBotonAdaptacion === 'function') {
+            window.actualizarBotonAdaptacion(data.adaptacion_activa);
+        }
+        // Si se desactiva, todas las terminales vuelven a la interfaz original
+        const ruta = window.location.pathname;
+        if (!data.adaptacion_activa && !ruta.includes('original') && !ruta.includes('pago') && !this.redirigiendo) {
+            this.redirigiendo = true;
+            setTimeout(() => {
+                window.location.href = '/original';
+            }, 500);
+        }
     }
 
     verificarCambioInterfaz() {
-        // Verificación periódica - usar /api/estado para no crear eventos
+        // Verificación periódica - usar /api/estado para no crear eventos.
+        // Con el ETag de la última respuesta el servidor contesta 304 si nada cambió.
+        const cabeceras = this.cabeceras();
+        if (this.ultimoEtagEstado) {
+            cabeceras['If-None-Match'] = this.ultimoEtagEstado;
+        }
+        const inicio = performance.now();
         fetch('/api/estado', {
             method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
+            headers: cabeceras,
+            cache: 'no-store'
+        })
+        .then(response => {
+            this.registrarTiempos('/api/estado', response, inicio);
+            if (response.status === 304) {
+                return null;
             }
+            this.ultimoEtagEstado = response.headers.get('ETag');
+            return response.json();
         })
-        .then(response => response.json())
         .then(data => {
+            if (data === null) {
+                return; // Sin cambios desde la última verificación
+            }
             // Solo verificar si no estamos en la interfaz original o de pago
             const rutaActual = window.location.pathname;
             if (!rutaActual.includes('original') && !rutaActual.includes('pago')) {
@@ -362,6 +577,25 @@ window.registrarExito = function(accion, duracion = 1) {
     }
 };
 
+// Helper para las pantallas de pago: registra compra_finalizada (con los eventos
+// pendientes) y devuelve la respuesta del servidor con la interfaz a la que redirigir
+window.registrarCompraFinalizada = function() {
+    if (window.tracker) {
+        return window.tracker.finalizarVenta(0);
+    }
+    return fetch('/api/evento', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ tipo_evento: 'compra_finalizada', duracion: 0, exito: true })
+    }).then(response => response.json())
+    .then(data => {
+        if (data.evaluacion_pendiente) {
+            sessionStorage.setItem('posEvaluacionPendiente', '1');
+        }
+        return data;
+    });
+};
+
 // Helper para registrar acciones específicas con tiempo real
 window.registrarAccionConTiempo = function(tipo, inicioTiempo, exito = true) {
     if (window.tracker) {